@@ -0,0 +1,392 @@
+"""Núcleo de análise do sistema, sem Streamlit.
+
+Funções puras sobre os DataFrames de produção e insumos: KPIs, receitas com preço
+por cultura, rentabilidade, tendências mensais e insights. Os preços entram como
+parâmetro (dict cultura -> {'preco_primeira', 'preco_segunda'} e o par de preços
+padrão), então o mesmo cálculo serve às páginas do app.py, ao benchmark e ao
+precalcular.py.
+"""
+import numpy as np
+import pandas as pd
+
+PRECOS_PADRAO = (30.0, 15.0)
+LIMITE_PCT_SEGUNDA_PADRAO = 25.0
+COLUNAS_RECEITA = ['receita_primeira', 'receita_segunda', 'receita_total']
+COLUNAS_CLIMA = ['caixas', 'temperatura', 'umidade', 'chuva']
+DEFASAGENS_CLIMA = (7, 14)
+ESTATISTICAS_PARES = ('n', 'sx', 'sy', 'sxx', 'syy', 'sxy')
+
+
+def _cultura_valida(cultura):
+    """Culturas em branco ou nulas não geram receita"""
+    return isinstance(cultura, str) and bool(cultura.strip())
+
+
+# ===============================
+# RECEITAS E RENTABILIDADE
+# ===============================
+def precos_por_linha(culturas, precos, padrao=PRECOS_PADRAO):
+    """Mapeia os preços de 1ª e 2ª para cada linha em uma única passada pela coluna cultura"""
+    codigos, unicas = pd.factorize(culturas)
+    padrao_primeira, padrao_segunda = padrao
+
+    # O preço extra no fim cobre o código -1 (cultura nula)
+    validas = [_cultura_valida(c) for c in unicas]
+    precos_primeira = [precos[c]['preco_primeira'] if c in precos else padrao_primeira for c in unicas]
+    precos_segunda = [precos[c]['preco_segunda'] if c in precos else padrao_segunda for c in unicas]
+    precos_primeira = np.append(np.where(validas, precos_primeira, 0.0), 0.0).astype(float)
+    precos_segunda = np.append(np.where(validas, precos_segunda, 0.0), 0.0).astype(float)
+
+    return precos_primeira[codigos], precos_segunda[codigos]
+
+
+def receita_linhas(df_prod, precos, padrao=PRECOS_PADRAO):
+    """Receita de 1ª, 2ª e total de cada linha de produção"""
+    if df_prod.empty:
+        return pd.DataFrame(columns=COLUNAS_RECEITA, dtype=float)
+
+    preco_primeira, preco_segunda = precos_por_linha(df_prod['cultura'], precos, padrao)
+    caixas = pd.to_numeric(df_prod['caixas'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    caixas_segunda = pd.to_numeric(df_prod['caixas_segunda'], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    receitas = pd.DataFrame({
+        'receita_primeira': caixas * preco_primeira,
+        'receita_segunda': caixas_segunda * preco_segunda
+    }, index=df_prod.index)
+    receitas['receita_total'] = receitas['receita_primeira'] + receitas['receita_segunda']
+    return receitas
+
+
+def receitas(df_prod, precos, padrao=PRECOS_PADRAO):
+    """Receita por linha, por cultura, por área e os totais de uma vez"""
+    linhas = receita_linhas(df_prod, precos, padrao)
+
+    if linhas.empty:
+        vazio = pd.DataFrame(columns=COLUNAS_RECEITA, dtype=float)
+        return {'linhas': linhas, 'por_cultura': vazio, 'por_area': vazio,
+                'primeira': 0, 'segunda': 0, 'total': 0}
+
+    # Agrega pela cultura e descarta os grupos em branco (O(culturas), não O(linhas))
+    por_cultura = linhas.groupby(df_prod['cultura'], sort=True, observed=True)[COLUNAS_RECEITA].sum()
+    por_cultura = por_cultura[[_cultura_valida(c) for c in por_cultura.index]]
+    por_area = linhas.groupby(df_prod['area'], sort=True, observed=True)[COLUNAS_RECEITA].sum()
+    totais = linhas[COLUNAS_RECEITA].sum()
+
+    return {
+        'linhas': linhas, 'por_cultura': por_cultura, 'por_area': por_area,
+        'primeira': float(totais['receita_primeira']),
+        'segunda': float(totais['receita_segunda']),
+        'total': float(totais['receita_total'])
+    }
+
+
+def receita_por_cultura_grafico(resultado_receitas):
+    """Formata a receita por cultura para os gráficos de barras empilhadas"""
+    return resultado_receitas['por_cultura'].reset_index().rename(columns={
+        'cultura': 'Cultura', 'receita_primeira': 'Receita 1ª',
+        'receita_segunda': 'Receita 2ª', 'receita_total': 'Receita Total'
+    })
+
+
+def rentabilidade(df_prod, df_ins, precos, padrao=PRECOS_PADRAO, chaves='cultura'):
+    """Receita, custo, lucro e ROI por cultura (ou área / área×cultura) em um único groupby"""
+    chaves = [chaves] if isinstance(chaves, str) else list(chaves)
+    colunas = ['receita', 'custo', 'lucro', 'roi']
+
+    if df_prod.empty:
+        return pd.DataFrame(columns=chaves + colunas)
+
+    receita = receita_linhas(df_prod, precos, padrao)['receita_total']
+    resultado = receita.groupby([df_prod[c] for c in chaves], sort=True, observed=True).sum().to_frame('receita')
+
+    if not df_ins.empty and set(chaves) <= set(df_ins.columns):
+        custos = df_ins.groupby(chaves, sort=False, observed=True)['custo_total'].sum().rename('custo')
+        resultado = resultado.join(custos, how='left')
+    else:
+        resultado['custo'] = 0.0
+
+    resultado = resultado.reset_index()
+    resultado['custo'] = resultado['custo'].fillna(0.0)
+    resultado['lucro'] = resultado['receita'] - resultado['custo']
+    resultado['roi'] = np.where(resultado['custo'] > 0,
+                                resultado['lucro'] / resultado['custo'].where(resultado['custo'] > 0) * 100, 0.0)
+
+    # Culturas em branco ficam de fora, como no cálculo de receita
+    if 'cultura' in chaves:
+        resultado = resultado[[_cultura_valida(c) for c in resultado['cultura']]]
+
+    return resultado[chaves + colunas].reset_index(drop=True)
+
+
+# ===============================
+# KPIs E AGREGAÇÕES
+# ===============================
+def kpis(df_prod, df_ins, resultado_receitas):
+    """Totais do cabeçalho das páginas: caixas, % de 2ª, custo, receita e lucro"""
+    caixas = float(df_prod['caixas'].sum()) if not df_prod.empty else 0.0
+    caixas_segunda = float(df_prod['caixas_segunda'].sum()) if not df_prod.empty else 0.0
+    custo = float(df_ins['custo_total'].sum()) if not df_ins.empty else 0.0
+    return kpis_dos_totais(caixas, caixas_segunda, custo,
+                           resultado_receitas['primeira'], resultado_receitas['segunda'])
+
+
+def kpis_dos_totais(caixas, caixas_segunda, custo, receita_primeira, receita_segunda):
+    """Monta os KPIs a partir das somas já feitas (no pandas ou direto no SQL)"""
+    receita = receita_primeira + receita_segunda
+    lucro = receita - custo
+
+    return {
+        'caixas': caixas,
+        'caixas_segunda': caixas_segunda,
+        'pct_segunda': caixas_segunda / (caixas + caixas_segunda) * 100 if (caixas + caixas_segunda) > 0 else 0.0,
+        'custo_insumos': custo,
+        'receita_primeira': receita_primeira,
+        'receita_segunda': receita_segunda,
+        'receita_total': receita,
+        'lucro': lucro,
+        'margem_pct': lucro / receita * 100 if receita > 0 else 0.0
+    }
+
+
+def somar_por(df, chave, colunas):
+    """Soma das colunas por chave, como tabela pronta para gráfico"""
+    return df.groupby(chave, observed=True)[colunas].sum().reset_index()
+
+
+def tendencia_mensal(df, colunas):
+    """Soma das colunas por mês (AAAA-MM), a partir da coluna data já em datetime"""
+    mes = df['data'].dt.to_period('M').astype(str).rename('mes')
+    return df.groupby(mes)[colunas].sum().reset_index()
+
+
+def producao_por_cultura(df_prod):
+    """Caixas de 1ª e 2ª por cultura com o percentual de 2ª"""
+    por_cultura = somar_por(df_prod, 'cultura', ['caixas', 'caixas_segunda'])
+    por_cultura['Total'] = por_cultura['caixas'] + por_cultura['caixas_segunda']
+    por_cultura['% 2ª'] = (por_cultura['caixas_segunda'] / por_cultura['Total'] * 100).round(1)
+    return por_cultura
+
+
+def producao_por_area(df_prod):
+    """Caixas por área e a produtividade média por dia com colheita no período"""
+    por_area = somar_por(df_prod, 'area', ['caixas', 'caixas_segunda'])
+    por_area['Produtividade'] = por_area['caixas'] / df_prod['data'].nunique()
+    return por_area
+
+
+def correlacao_clima(df_prod):
+    """Correlação entre caixas e as variáveis de clima disponíveis (None se não houver par)"""
+    colunas = [c for c in COLUNAS_CLIMA if c in df_prod.columns]
+    return df_prod[colunas].corr() if len(colunas) > 1 else None
+
+
+# ===============================
+# CORRELAÇÃO POR ESTATÍSTICAS SUFICIENTES
+# ===============================
+def series_clima():
+    """Pares (x, y, defasagem em dias) guardados: todos os pares sem defasagem e caixas × clima defasado"""
+    pares = [(x, y, 0) for i, x in enumerate(COLUNAS_CLIMA) for y in COLUNAS_CLIMA[i:]]
+    defasados = [(COLUNAS_CLIMA[0], y, dias) for dias in DEFASAGENS_CLIMA for y in COLUNAS_CLIMA[1:]]
+    return pares + defasados
+
+
+def coluna_estatistica(estatistica, x, y, defasagem=0):
+    """Nome da coluna de uma soma: n_caixas_umidade, sxy_caixas_umidade_7d..."""
+    return f"{estatistica}_{x}_{y}" + (f"_{defasagem}d" if defasagem else "")
+
+
+def correlacao_das_somas(n, sx, sy, sxx, syy, sxy):
+    """Correlação de Pearson a partir das somas; NaN sem pares suficientes ou sem variância"""
+    variancia_x = n * sxx - sx * sx
+    variancia_y = n * syy - sy * sy
+    # Tolerância relativa: somas de uma série constante deixam resíduo de arredondamento
+    if n < 2 or variancia_x <= 1e-12 * n * sxx or variancia_y <= 1e-12 * n * syy:
+        return np.nan
+    return float(np.clip((n * sxy - sx * sy) / np.sqrt(variancia_x * variancia_y), -1.0, 1.0))
+
+
+def _correlacao_serie(totais, x, y, defasagem=0):
+    """Correlação de um par a partir do dict de somas"""
+    return correlacao_das_somas(*(totais[coluna_estatistica(e, x, y, defasagem)] for e in ESTATISTICAS_PARES))
+
+
+def matriz_correlacao(totais):
+    """Mesma matriz do DataFrame.corr() (pares completos), montada das somas em O(variáveis²)"""
+    matriz = pd.DataFrame(np.nan, index=COLUNAS_CLIMA, columns=COLUNAS_CLIMA)
+    for x, y, defasagem in series_clima():
+        if defasagem:
+            continue
+        valor = _correlacao_serie(totais, x, y)
+        if x == y:
+            valor = 1.0 if not np.isnan(valor) else np.nan
+        matriz.loc[x, y] = matriz.loc[y, x] = valor
+    return matriz
+
+
+def correlacao_defasada(totais):
+    """Correlação das caixas com o clima do mesmo dia e de DEFASAGENS_CLIMA dias antes"""
+    variaveis = COLUNAS_CLIMA[1:]
+    colunas = {f"{dias} dias antes" if dias else "mesmo dia": dias for dias in (0,) + DEFASAGENS_CLIMA}
+    return pd.DataFrame({
+        rotulo: [_correlacao_serie(totais, COLUNAS_CLIMA[0], y, dias) for y in variaveis]
+        for rotulo, dias in colunas.items()
+    }, index=variaveis)
+
+
+def pct_segunda_linhas(df_prod):
+    """Percentual de 2ª qualidade de cada linha (0 quando a linha não tem caixas)"""
+    total = df_prod['caixas'] + df_prod['caixas_segunda']
+    return pd.Series(np.where(total > 0, df_prod['caixas_segunda'] / total * 100, 0), index=df_prod.index)
+
+
+def gerar_insights(df_prod, resultado_kpis, resultado_rentabilidade, limite_pct_segunda=LIMITE_PCT_SEGUNDA_PADRAO):
+    """Recomendações estratégicas em texto a partir dos resultados do período"""
+    insights = []
+
+    if not df_prod.empty and not resultado_rentabilidade.empty:
+        mais_rentavel = resultado_rentabilidade.nlargest(1, 'roi').iloc[0]
+        insights.append(f"✅ **{mais_rentavel['cultura']}** é a cultura mais rentável (ROI: {mais_rentavel['roi']:.1f}%)")
+
+    if resultado_kpis['pct_segunda'] > limite_pct_segunda:
+        insights.append(f"⚠️ **Alerta**: Percentual de 2ª qualidade ({resultado_kpis['pct_segunda']:.1f}%) acima do limite recomendado")
+
+    if not df_prod.empty and 'area' in df_prod.columns:
+        media_area = df_prod.groupby('area', observed=True)['caixas'].mean()
+        if not media_area.empty:
+            insights.append(f"🔍 **Oportunidade**: Área {media_area.idxmin()} tem a menor produtividade média "
+                            f"({media_area.min():.1f} caixas/dia)")
+
+    return insights
+
+
+# ===============================
+# SÉRIES PARA GRÁFICOS
+# ===============================
+def indices_lttb(x, y, limite):
+    """Índices dos pontos que o Largest-Triangle-Three-Buckets mantém (primeiro e último sempre)"""
+    n = len(y)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    tamanho_balde = (n - 2) / (limite - 2)
+    indices = np.empty(limite, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+
+    for balde in range(limite - 2):
+        inicio = int(balde * tamanho_balde) + 1
+        fim = int((balde + 1) * tamanho_balde) + 1
+        # Vértice do próximo balde: a média dele (ou o último ponto, no balde final)
+        proximo_fim = min(int((balde + 2) * tamanho_balde) + 1, n)
+        if fim < proximo_fim and balde < limite - 3:
+            media_x, media_y = x[fim:proximo_fim].mean(), y[fim:proximo_fim].mean()
+        else:
+            media_x, media_y = x[-1], y[-1]
+
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(areas.argmax())
+        indices[balde + 1] = anterior
+
+    return indices
+
+
+def reduzir_serie(df, x, colunas, limite):
+    """Reduz a série a no máximo `limite` linhas preservando a forma de cada coluna (LTTB)"""
+    colunas = [colunas] if isinstance(colunas, str) else list(colunas)
+    if len(df) <= limite:
+        return df
+
+    eixo = df[x]
+    if pd.api.types.is_datetime64_any_dtype(eixo):
+        eixo_numerico = eixo.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    elif pd.api.types.is_numeric_dtype(eixo):
+        eixo_numerico = eixo.to_numpy(dtype=float)
+    else:
+        eixo_numerico = np.arange(len(df))
+
+    # Cada coluna escolhe seus pontos com uma parte do limite; o gráfico usa a união
+    por_coluna = max(limite // len(colunas), 3)
+    manter = np.unique(np.concatenate([indices_lttb(eixo_numerico, df[c].to_numpy(), por_coluna)
+                                       for c in colunas]))
+    return df.iloc[manter]
+
+
+# ===============================
+# ANÁLISES COMPLETAS
+# ===============================
+def _com_datas(df):
+    """Cópia com a coluna data convertida para datetime (sem reconverter se já vier assim)"""
+    df = df.copy()
+    if 'data' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['data']):
+        df['data'] = pd.to_datetime(df['data'])
+    return df
+
+
+def analise_dashboard(df_prod, df_ins, precos, padrao=PRECOS_PADRAO, limite_pct_segunda=LIMITE_PCT_SEGUNDA_PADRAO):
+    """Tudo o que o dashboard mostra, a partir dos resumos diários de produção e insumos"""
+    df_prod, df_ins = _com_datas(df_prod), _com_datas(df_ins)
+    resultado_receitas = receitas(df_prod, precos, padrao)
+    resultado = {
+        'kpis': kpis(df_prod, df_ins, resultado_receitas),
+        'receitas': resultado_receitas,
+        'receita_por_cultura': receita_por_cultura_grafico(resultado_receitas),
+        'pct_segunda_alta': None
+    }
+
+    if not df_prod.empty:
+        pct_segunda = pct_segunda_linhas(df_prod)
+        acima = pct_segunda[pct_segunda > limite_pct_segunda]
+        resultado['pct_segunda_alta'] = float(acima.mean()) if not acima.empty else None
+        resultado['producao_por_area'] = somar_por(df_prod, 'area', ['caixas', 'caixas_segunda'])
+        resultado['producao_diaria'] = somar_por(df_prod, 'data', ['caixas', 'caixas_segunda'])
+
+    if not df_ins.empty:
+        resultado['custos_por_tipo'] = somar_por(df_ins, 'tipo', 'custo_total')
+        resultado['custos_por_cultura'] = somar_por(df_ins, 'cultura', 'custo_total')
+
+    return resultado
+
+
+def analise_periodo(df_prod, df_ins, precos, padrao=PRECOS_PADRAO, limite_pct_segunda=LIMITE_PCT_SEGUNDA_PADRAO,
+                    estatisticas_clima=None):
+    """Tudo o que a página de análise mostra para a produção e os insumos já filtrados
+
+    Com estatisticas_clima (somas do período, ver series_clima) a correlação sai das
+    somas e inclui as defasagens; sem elas, é calculada sobre as linhas.
+    """
+    df_prod, df_ins = _com_datas(df_prod), _com_datas(df_ins)
+    resultado_receitas = receitas(df_prod, precos, padrao)
+    resultado_kpis = kpis(df_prod, df_ins, resultado_receitas)
+    resultado_rentabilidade = rentabilidade(df_prod, df_ins, precos, padrao)
+
+    resultado = {
+        'producao': df_prod,
+        'insumos': df_ins,
+        'kpis': resultado_kpis,
+        'receitas': resultado_receitas,
+        'receita_por_cultura': receita_por_cultura_grafico(resultado_receitas),
+        'rentabilidade': resultado_rentabilidade,
+        'insights': gerar_insights(df_prod, resultado_kpis, resultado_rentabilidade, limite_pct_segunda)
+    }
+
+    if not df_prod.empty:
+        resultado['producao_diaria'] = somar_por(df_prod, 'data', ['caixas', 'caixas_segunda'])
+        resultado['producao_por_cultura'] = producao_por_cultura(df_prod)
+        resultado['producao_por_area'] = producao_por_area(df_prod)
+        resultado['producao_mensal'] = tendencia_mensal(df_prod, ['caixas', 'caixas_segunda'])
+        if estatisticas_clima is not None:
+            resultado['correlacao'] = matriz_correlacao(estatisticas_clima)
+            resultado['correlacao_defasada'] = correlacao_defasada(estatisticas_clima)
+        else:
+            resultado['correlacao'] = correlacao_clima(df_prod)
+        resultado['top_areas'] = df_prod.groupby('area', observed=True)['caixas'].sum().nlargest(5)
+
+    if not df_ins.empty:
+        resultado['custos_por_tipo'] = somar_por(df_ins, 'tipo', 'custo_total')
+        resultado['custos_por_cultura'] = somar_por(df_ins, 'cultura', 'custo_total')
+        resultado['custos_mensais'] = tendencia_mensal(df_ins, 'custo_total')
+
+    return resultado
@@ -2,23 +2,27 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import sqlite3
-import requests
 import urllib.parse
 import json
 import os
-from io import BytesIO
+import copy
+import functools
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
+
+import analise
+
+# plotly (via graficos_medidos), openpyxl, xlsxwriter e requests são importados no primeiro uso:
+# a partida do app (ver checar_inicializacao.py) não paga por páginas que ninguém abriu
 
 # ===============================
 # CONFIGURAÇÕES INICIAIS
 # ===============================
-st.set_page_config(page_title="🌱 Gerenciador Integrado de Produção", layout="wide")
-plt.style.use("dark_background")
-sns.set_theme(style="darkgrid")
-
 # Constantes
 DB_NAME = "dados_sitio.db"
 CONFIG_FILE = "config.json"
@@ -36,31 +40,235 @@ ESTUFAS = [f"Estufa {i}" for i in range(1, 31)]
 CAMPOS = [f"Campo {i}" for i in range(1, 31)]
 AREAS_PRODUCAO = ESTUFAS + CAMPOS
 
+# ===============================
+# CONEXÃO COM O BANCO
+# ===============================
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+_conexoes_lock = threading.Lock()
+_conexoes_por_thread = {}
+_conexoes_livres = []
+_estado_thread = threading.local()
+
+def _abrir_conexao():
+    """Abre uma nova conexão SQLite já configurada (WAL + busy timeout)"""
+    conn = sqlite3.connect(DB_NAME, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def obter_conexao():
+    """Retorna a conexão da thread atual, mantida aberta entre reruns e sessões"""
+    thread = threading.current_thread()
+    with _conexoes_lock:
+        registro = _conexoes_por_thread.get(thread.ident)
+        if registro and registro[0] is thread:
+            return registro[1]
+        
+        # Cada rerun do Streamlit roda em uma thread nova: reaproveita as conexões
+        # de threads que já terminaram em vez de abrir outra
+        for ident, (t, c) in list(_conexoes_por_thread.items()):
+            if not t.is_alive():
+                del _conexoes_por_thread[ident]
+                if c.in_transaction:
+                    c.rollback()
+                _conexoes_livres.append(c)
+        
+        conn = _conexoes_livres.pop() if _conexoes_livres else _abrir_conexao()
+        _conexoes_por_thread[thread.ident] = (thread, conn)
+        return conn
+
+def fechar_conexoes():
+    """Fecha todas as conexões abertas (ex.: ao trocar de arquivo de banco)"""
+    with _conexoes_lock:
+        conexoes = [c for _, c in _conexoes_por_thread.values()] + _conexoes_livres
+        _conexoes_por_thread.clear()
+        _conexoes_livres.clear()
+    for conn in conexoes:
+        conn.close()
+
+def usar_banco(caminho):
+    """Aponta o app para outro arquivo de banco, descartando conexões e leituras do anterior"""
+    fechar_conexoes()
+    limpar_cache_leituras()
+    _indice_fenologia["chave"] = None
+    _tabelas_criadas.clear()
+    global DB_NAME
+    DB_NAME = caminho
+
+@contextmanager
+def transacao():
+    """Agrupa várias escritas em uma única transação; chamadas aninhadas viram savepoints"""
+    conn = obter_conexao()
+    profundidade = getattr(_estado_thread, "profundidade", 0)
+    
+    if profundidade == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    else:
+        conn.execute(f"SAVEPOINT sp_{profundidade}")
+    _estado_thread.profundidade = profundidade + 1
+    
+    try:
+        yield conn
+    except BaseException:
+        if profundidade == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp_{profundidade}")
+            conn.execute(f"RELEASE sp_{profundidade}")
+        raise
+    else:
+        if profundidade == 0:
+            conn.execute("COMMIT")
+        else:
+            conn.execute(f"RELEASE sp_{profundidade}")
+    finally:
+        _estado_thread.profundidade = profundidade
+
+def _linhas_para_sql(df):
+    """Converte um DataFrame em tuplas com tipos nativos aceitos pelo sqlite3"""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+# ===============================
+# PERFIL DE EXECUÇÃO
+# ===============================
+# Modo opcional (caixa na barra lateral ou SITIO_PERFIL=1): cada rerun anota o tempo da
+# página, dos helpers de dados (SQL), do clima e dos gráficos. Desligado, o custo é um getattr
+PERFIL_PADRAO = os.environ.get("SITIO_PERFIL") == "1"
+METRICAS_RETENCAO_DIAS = 90
+
+_perfil = threading.local()
+
+def iniciar_perfil():
+    """Começa a anotar as medições do rerun da thread atual"""
+    _perfil.medicoes = []
+    _perfil.abertas = set()
+
+def encerrar_perfil():
+    """Para de anotar e devolve as medições (categoria, nome, segundos) do rerun"""
+    medicoes = getattr(_perfil, "medicoes", None) or []
+    _perfil.medicoes = None
+    return medicoes
+
+@contextmanager
+def medir(categoria, nome):
+    """Cronometra o bloco se o perfil estiver ligado; chamadas aninhadas da mesma categoria não contam de novo"""
+    medicoes = getattr(_perfil, "medicoes", None)
+    if medicoes is None or categoria in _perfil.abertas:
+        yield
+        return
+    
+    _perfil.abertas.add(categoria)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _perfil.abertas.discard(categoria)
+        medicoes.append((categoria, nome, time.perf_counter() - inicio))
+
+def medido(categoria):
+    """Decorador que cronometra a função inteira com medir()"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir(categoria, funcao.__name__):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+# ===============================
+# CACHE DE LEITURAS
+# ===============================
+# Cada tabela tem uma versão no banco que sobe a cada escrita feita pelos helpers;
+# leituras guardadas com uma versão antiga deixam de valer na hora
+CACHE_LEITURAS_MAX_MB = 256
+
+_cache_leituras = OrderedDict()
+_cache_leituras_lock = threading.Lock()
+_cache_leituras_bytes = 0
+
+def incrementar_versao(conn, *tabelas):
+    """Marca as tabelas como alteradas (chamar dentro da transação da escrita)"""
+    for nome_tabela in tabelas:
+        conn.execute("""
+            INSERT INTO versoes_dados (tabela, versao) VALUES (?, 1)
+            ON CONFLICT(tabela) DO UPDATE SET versao = versao + 1
+        """, (nome_tabela,))
+
+def versoes_tabelas(*tabelas):
+    """Retorna a versão atual de cada tabela, na ordem pedida"""
+    marcadores = ", ".join("?" for _ in tabelas)
+    linhas = dict(obter_conexao().execute(
+        f"SELECT tabela, versao FROM versoes_dados WHERE tabela IN ({marcadores})", tabelas
+    ).fetchall())
+    return tuple(linhas.get(t, 0) for t in tabelas)
+
+def _tamanho_em_bytes(valor):
+    """Estimativa do espaço ocupado por um resultado em cache"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    return len(json.dumps(valor, default=str))
+
+def _copiar_resultado(valor):
+    """Cópia entregue a quem chamou, para que alterações não sujem o cache"""
+    return valor.copy() if isinstance(valor, pd.DataFrame) else copy.deepcopy(valor)
+
+def leitura_em_cache(chave, tabelas, carregar):
+    """Devolve o resultado guardado de uma leitura enquanto as tabelas envolvidas não mudarem"""
+    global _cache_leituras_bytes
+    versoes = versoes_tabelas(*tabelas)
+    
+    with _cache_leituras_lock:
+        entrada = _cache_leituras.get(chave)
+        if entrada and entrada[0] == versoes:
+            _cache_leituras.move_to_end(chave)
+            return _copiar_resultado(entrada[1])
+    
+    valor = carregar()
+    tamanho = _tamanho_em_bytes(valor)
+    limite = CACHE_LEITURAS_MAX_MB * 1024 * 1024
+    
+    with _cache_leituras_lock:
+        antiga = _cache_leituras.pop(chave, None)
+        if antiga:
+            _cache_leituras_bytes -= antiga[2]
+        if tamanho <= limite:
+            _cache_leituras[chave] = (versoes, valor, tamanho)
+            _cache_leituras_bytes += tamanho
+            while _cache_leituras_bytes > limite:
+                _, (_, _, tamanho_descartado) = _cache_leituras.popitem(last=False)
+                _cache_leituras_bytes -= tamanho_descartado
+    
+    return _copiar_resultado(valor)
+
+def limpar_cache_leituras():
+    """Esvazia o cache de leituras"""
+    global _cache_leituras_bytes
+    with _cache_leituras_lock:
+        _cache_leituras.clear()
+        _cache_leituras_bytes = 0
+
 # ===============================
 # BANCO DE DADOS
 # ===============================
+_tabelas_criadas = threading.Event()
+
+def garantir_tabelas():
+    """Cria o esquema uma vez por processo, em vez de a cada rerun de cada sessão"""
+    if not _tabelas_criadas.is_set():
+        criar_tabelas()
+        _tabelas_criadas.set()
+
 def criar_tabelas():
     """Cria todas as tabelas necessárias no banco de dados"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
     tabelas = [
-        """
-        CREATE TABLE IF NOT EXISTS producao (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT, area TEXT, cultura TEXT, caixas INTEGER,
-            caixas_segunda INTEGER, temperatura REAL, umidade REAL,
-            chuva REAL, observacao TEXT
-        )
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS insumos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT, area TEXT,
-            cultura TEXT, tipo TEXT, quantidade REAL, unidade TEXT,
-            custo_unitario REAL, custo_total REAL, fornecedor TEXT,
-            lote TEXT, observacoes TEXT
-        )
-        """,
         """
         CREATE TABLE IF NOT EXISTS custos (
             id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT, tipo TEXT,
@@ -80,111 +288,944 @@ def criar_tabelas():
             preco_primeira REAL,
             preco_segunda REAL
         )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS versoes_dados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sequencias_ids (
+            tabela TEXT PRIMARY KEY,
+            ultimo_id INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cache_clima (
+            cidade TEXT PRIMARY KEY,
+            atualizado_em REAL,
+            atual TEXT,
+            previsao TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS metricas_paginas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pagina TEXT,
+            registrado_em REAL,
+            segundos REAL
+        )
         """
     ]
     
-    for tabela in tabelas:
-        cursor.execute(tabela)
+    indices = [
+        "CREATE INDEX IF NOT EXISTS idx_metricas_paginas ON metricas_paginas (pagina, registrado_em)"
+    ]
     
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        for tabela in tabelas:
+            conn.execute(tabela)
+        for indice in indices:
+            conn.execute(indice)
+        clima_novo = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM sqlite_master "
+                                  "WHERE name = 'estatisticas_clima')").fetchone()[0]
+        for resumo in TABELAS_RESUMO + TABELAS_CLIMA:
+            conn.execute(resumo)
+        for nome_tabela in ESQUEMA_PARTICOES:
+            _preparar_particoes(conn, nome_tabela)
+        
+        # Bancos de antes das estatísticas de clima: troca os gatilhos das partições de produção
+        if clima_novo:
+            for sufixo in listar_particoes("producao", conn):
+                for evento in ("ins", "del", "upd"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS trg_producao_{sufixo}_{evento}")
+                _criar_particao(conn, "producao", sufixo)
+        
+        # Bancos criados antes dos resumos: preenche a partir do histórico uma única vez
+        resumo_vazio = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM producao_diaria) "
+                                    "AND NOT EXISTS (SELECT 1 FROM insumos_diario)").fetchone()[0]
+        if resumo_vazio or clima_novo:
+            reconstruir_resumos()
+
+# ===============================
+# RESUMOS DIÁRIOS
+# ===============================
+# Totais por dia×área×cultura (produção) e dia×tipo×cultura (insumos), mantidos por gatilhos
+# a cada insert/update/delete para que o dashboard não precise ler o histórico inteiro
+TABELAS_RESUMO = [
+    """
+    CREATE TABLE IF NOT EXISTS producao_diaria (
+        data TEXT NOT NULL, area TEXT NOT NULL, cultura TEXT NOT NULL,
+        caixas INTEGER NOT NULL DEFAULT 0, caixas_segunda INTEGER NOT NULL DEFAULT 0,
+        registros INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (data, area, cultura)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS insumos_diario (
+        data TEXT NOT NULL, tipo TEXT NOT NULL, cultura TEXT NOT NULL,
+        custo_total REAL NOT NULL DEFAULT 0, registros INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (data, tipo, cultura)
+    )
+    """
+]
+
+_SOMA_PRODUCAO = """
+    INSERT INTO producao_diaria (data, area, cultura, caixas, caixas_segunda, registros)
+    VALUES (COALESCE(substr(NEW.data, 1, 10), ''), COALESCE(NEW.area, ''), COALESCE(NEW.cultura, ''),
+            COALESCE(NEW.caixas, 0), COALESCE(NEW.caixas_segunda, 0), 1)
+    ON CONFLICT (data, area, cultura) DO UPDATE SET
+        caixas = caixas + excluded.caixas,
+        caixas_segunda = caixas_segunda + excluded.caixas_segunda,
+        registros = registros + 1;
+"""
+_SUBTRAI_PRODUCAO = """
+    UPDATE producao_diaria SET
+        caixas = caixas - COALESCE(OLD.caixas, 0),
+        caixas_segunda = caixas_segunda - COALESCE(OLD.caixas_segunda, 0),
+        registros = registros - 1
+    WHERE data = COALESCE(substr(OLD.data, 1, 10), '') AND area = COALESCE(OLD.area, '')
+      AND cultura = COALESCE(OLD.cultura, '');
+    DELETE FROM producao_diaria
+    WHERE registros <= 0 AND data = COALESCE(substr(OLD.data, 1, 10), '')
+      AND area = COALESCE(OLD.area, '') AND cultura = COALESCE(OLD.cultura, '');
+"""
+_SOMA_INSUMOS = """
+    INSERT INTO insumos_diario (data, tipo, cultura, custo_total, registros)
+    VALUES (COALESCE(substr(NEW.data, 1, 10), ''), COALESCE(NEW.tipo, ''), COALESCE(NEW.cultura, ''),
+            COALESCE(NEW.custo_total, 0), 1)
+    ON CONFLICT (data, tipo, cultura) DO UPDATE SET
+        custo_total = custo_total + excluded.custo_total,
+        registros = registros + 1;
+"""
+_SUBTRAI_INSUMOS = """
+    UPDATE insumos_diario SET
+        custo_total = custo_total - COALESCE(OLD.custo_total, 0),
+        registros = registros - 1
+    WHERE data = COALESCE(substr(OLD.data, 1, 10), '') AND tipo = COALESCE(OLD.tipo, '')
+      AND cultura = COALESCE(OLD.cultura, '');
+    DELETE FROM insumos_diario
+    WHERE registros <= 0 AND data = COALESCE(substr(OLD.data, 1, 10), '')
+      AND tipo = COALESCE(OLD.tipo, '') AND cultura = COALESCE(OLD.cultura, '');
+"""
+
+# ===============================
+# ESTATÍSTICAS DE CLIMA × PRODUÇÃO
+# ===============================
+# Somas suficientes (n, Σx, Σy, Σx², Σy², Σxy) por mês×área×cultura para cada par de
+# analise.series_clima(): a correlação de qualquer filtro sai da soma dos grupos, sem ler
+# as linhas. As defasagens pareiam a colheita de um dia com o clima da mesma área N dias
+# antes, usando clima_diario (somas por dia) para achar os pares. Tudo mantido pelos gatilhos
+SERIES_CLIMA = analise.series_clima()
+COLUNAS_ESTATISTICAS_CLIMA = [analise.coluna_estatistica(e, x, y, d)
+                              for x, y, d in SERIES_CLIMA for e in analise.ESTATISTICAS_PARES]
+_VARIAVEIS_CLIMA = analise.COLUNAS_CLIMA
+_COLUNAS_CLIMA_DIARIO = [f"{prefixo}_{v}" for v in _VARIAVEIS_CLIMA for prefixo in ("n", "s", "q")]
+
+# (data, area) no início da chave de clima_diario: é a busca dos pares defasados
+TABELAS_CLIMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS clima_diario (
+        data TEXT NOT NULL, area TEXT NOT NULL, cultura TEXT NOT NULL,
+        registros INTEGER NOT NULL DEFAULT 0,
+        {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in _COLUNAS_CLIMA_DIARIO)},
+        PRIMARY KEY (data, area, cultura)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS estatisticas_clima (
+        mes TEXT NOT NULL, area TEXT NOT NULL, cultura TEXT NOT NULL,
+        registros INTEGER NOT NULL DEFAULT 0,
+        {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in COLUNAS_ESTATISTICAS_CLIMA)},
+        PRIMARY KEY (mes, area, cultura)
+    )
+    """
+]
+
+def _somar_excluidos(colunas):
+    """SET col = col + excluded.col, para os upserts dos gatilhos"""
+    return ", ".join(f"{c} = {c} + excluded.{c}" for c in colunas)
+
+def _estatisticas_do_par(x, y, valido_x, valido_y, valor_x, valor_y):
+    """Expressões das seis somas de um par, na ordem de analise.ESTATISTICAS_PARES"""
+    ambos = f"({valido_x} AND {valido_y})"
+    return [f"CASE WHEN {ambos} THEN {expr} ELSE 0 END" for expr in
+            ("1", valor_x, valor_y, f"{valor_x} * {valor_x}", f"{valor_y} * {valor_y}", f"{valor_x} * {valor_y}")]
+
+def _gatilho_clima(ref, sinal):
+    """Corpo do gatilho que soma (sinal '') ou desconta (sinal '-') a linha ref nas estatísticas"""
+    chave = f"COALESCE(substr({ref}.data, 1, 10), ''), COALESCE({ref}.area, ''), COALESCE({ref}.cultura, '')"
+    valores_diario = []
+    for v in _VARIAVEIS_CLIMA:
+        valores_diario += [f"{sinal}({ref}.{v} IS NOT NULL)", f"{sinal}COALESCE({ref}.{v}, 0)",
+                           f"{sinal}COALESCE({ref}.{v} * {ref}.{v}, 0)"]
+    sql = [f"""
+        INSERT INTO clima_diario (data, area, cultura, registros, {", ".join(_COLUNAS_CLIMA_DIARIO)})
+        VALUES ({chave}, {sinal}1, {", ".join(valores_diario)})
+        ON CONFLICT (data, area, cultura) DO UPDATE SET registros = registros + excluded.registros,
+            {_somar_excluidos(_COLUNAS_CLIMA_DIARIO)};
+    """]
+    
+    # A própria linha: pares sem defasagem e, como colheita, o clima da mesma área N dias antes
+    mes = f"COALESCE(substr({ref}.data, 1, 7), ''), COALESCE({ref}.area, ''), COALESCE({ref}.cultura, '')"
+    producao = analise.COLUNAS_CLIMA[0]
+    c, tem_c = f"COALESCE({ref}.{producao}, 0)", f"({ref}.{producao} IS NOT NULL)"
+    colunas, valores = ["registros"], [f"{sinal}1"]
+    defasadas, como_colheita, como_clima = [], [], []
+    for x, y, dias in SERIES_CLIMA:
+        if not dias:
+            colunas += [analise.coluna_estatistica(e, x, y) for e in analise.ESTATISTICAS_PARES]
+            valores += [f"{sinal}({expr})" for expr in _estatisticas_do_par(
+                x, y, f"{ref}.{x} IS NOT NULL", f"{ref}.{y} IS NOT NULL", f"{ref}.{x}", f"{ref}.{y}")]
+            continue
+        
+        antes = f"(cd.data = date({ref}.data, '-{dias} days'))"
+        n, s, q = (f"TOTAL(cd.{prefixo}_{y} * {antes})" for prefixo in ("n", "s", "q"))
+        defasadas += [analise.coluna_estatistica(e, x, y, dias) for e in analise.ESTATISTICAS_PARES]
+        como_colheita += [f"{sinal}{tem_c} * {n}", f"{sinal}{c} * {n}", f"{sinal}{tem_c} * {s}",
+                          f"{sinal}{c} * {c} * {n}", f"{sinal}{tem_c} * {q}", f"{sinal}{c} * {s}"]
+        
+        # A mesma linha como clima da colheita N dias depois, somada no grupo daquela colheita
+        depois = f"(cd.data = date({ref}.data, '+{dias} days'))"
+        v, tem_v = f"COALESCE({ref}.{y}, 0)", f"({ref}.{y} IS NOT NULL)"
+        n, s, q = (f"TOTAL(cd.{prefixo}_{producao} * {depois})" for prefixo in ("n", "s", "q"))
+        como_clima += [f"{sinal}{tem_v} * {n}", f"{sinal}{tem_v} * {s}", f"{sinal}{v} * {n}",
+                       f"{sinal}{tem_v} * {q}", f"{sinal}{v} * {v} * {n}", f"{sinal}{v} * {s}"]
+    colunas += defasadas
+    valores += como_colheita
+    
+    # Sem GROUP BY o agregado sempre devolve uma linha, mesmo sem clima nos dias anteriores
+    datas_antes = ", ".join(f"date({ref}.data, '-{dias} days')" for dias in analise.DEFASAGENS_CLIMA)
+    datas_depois = ", ".join(f"date({ref}.data, '+{dias} days')" for dias in analise.DEFASAGENS_CLIMA)
+    sql.append(f"""
+        INSERT INTO estatisticas_clima (mes, area, cultura, {", ".join(colunas)})
+        SELECT {mes}, {", ".join(valores)}
+        FROM clima_diario cd
+        WHERE cd.data IN ({datas_antes}) AND cd.area = COALESCE({ref}.area, '')
+        ON CONFLICT (mes, area, cultura) DO UPDATE SET {_somar_excluidos(colunas)};
+        INSERT INTO estatisticas_clima (mes, area, cultura, {", ".join(defasadas)})
+        SELECT substr(cd.data, 1, 7), cd.area, cd.cultura, {", ".join(como_clima)}
+        FROM clima_diario cd
+        WHERE cd.data IN ({datas_depois}) AND cd.area = COALESCE({ref}.area, '')
+        GROUP BY 1, 2, 3
+        ON CONFLICT (mes, area, cultura) DO UPDATE SET {_somar_excluidos(defasadas)};
+    """)
+    
+    if sinal:
+        sql.append(f"""
+            DELETE FROM clima_diario WHERE registros <= 0 AND data = COALESCE(substr({ref}.data, 1, 10), '')
+              AND area = COALESCE({ref}.area, '') AND cultura = COALESCE({ref}.cultura, '');
+            DELETE FROM estatisticas_clima WHERE registros <= 0 AND mes = COALESCE(substr({ref}.data, 1, 7), '')
+              AND area = COALESCE({ref}.area, '') AND cultura = COALESCE({ref}.cultura, '');
+        """)
+    return "".join(sql)
+
+_SOMA_CLIMA = _gatilho_clima("NEW", "")
+_SUBTRAI_CLIMA = _gatilho_clima("OLD", "-")
+
+def _sql_estatisticas_clima(linhas):
+    """SELECT das estatísticas por mês×área×cultura calculadas direto das linhas (subconsulta recebida)"""
+    producao = analise.COLUNAS_CLIMA[0]
+    chave = "COALESCE(substr(l.data, 1, 7), '') AS mes, COALESCE(l.area, '') AS area, COALESCE(l.cultura, '') AS cultura"
+    
+    pares = []
+    for x, y, defasagem in SERIES_CLIMA:
+        if not defasagem:
+            pares += [f"TOTAL({expr}) AS {analise.coluna_estatistica(e, x, y)}" for e, expr in zip(
+                analise.ESTATISTICAS_PARES,
+                _estatisticas_do_par(x, y, f"l.{x} IS NOT NULL", f"l.{y} IS NOT NULL", f"l.{x}", f"l.{y}"))]
+    blocos = [f"(SELECT {chave}, COUNT(*) AS registros, {', '.join(pares)} FROM ({linhas}) l GROUP BY 1, 2, 3) p0"]
+    
+    c, tem_c = f"COALESCE(l.{producao}, 0)", f"(l.{producao} IS NOT NULL)"
+    for dias in analise.DEFASAGENS_CLIMA:
+        somas = []
+        for x, y, d in SERIES_CLIMA:
+            if d == dias:
+                somas += [f"TOTAL({expr}) AS {analise.coluna_estatistica(e, x, y, dias)}" for e, expr in zip(
+                    analise.ESTATISTICAS_PARES,
+                    (f"{tem_c} * cd.n_{y}", f"{c} * cd.n_{y}", f"{tem_c} * cd.s_{y}",
+                     f"{c} * {c} * cd.n_{y}", f"{tem_c} * cd.q_{y}", f"{c} * cd.s_{y}"))]
+        blocos.append(f"""LEFT JOIN (SELECT {chave}, {', '.join(somas)} FROM ({linhas}) l
+            JOIN clima_diario cd ON cd.data = date(l.data, '-{dias} days') AND cd.area = COALESCE(l.area, '')
+            GROUP BY 1, 2, 3) p{dias} USING (mes, area, cultura)""")
+    
+    # Grupos sem pares defasados ficam com zero, como na tabela mantida pelos gatilhos
+    defasadas = {analise.coluna_estatistica(e, x, y, d) for x, y, d in SERIES_CLIMA if d
+                 for e in analise.ESTATISTICAS_PARES}
+    colunas = [f"COALESCE({c}, 0) AS {c}" if c in defasadas else c for c in COLUNAS_ESTATISTICAS_CLIMA]
+    return f"SELECT mes, area, cultura, registros, {', '.join(colunas)} FROM {' '.join(blocos)}"
+
+# Gatilhos criados em cada partição anual de produção e de insumos
+GATILHOS_RESUMO = {
+    "producao": (_SOMA_PRODUCAO + _SOMA_CLIMA, _SUBTRAI_PRODUCAO + _SUBTRAI_CLIMA),
+    "insumos": (_SOMA_INSUMOS, _SUBTRAI_INSUMOS)
+}
+
+# ===============================
+# PARTIÇÕES POR ANO
+# ===============================
+# producao e insumos ficam em uma tabela por ano (producao_2024, insumos_2024...) e em
+# producao_sem_data para datas vazias ou fora do padrão AAAA-...; "producao" e "insumos"
+# viram views UNION ALL das partições. As leituras filtradas por período montam a consulta
+# só com os anos do período, e uma safra antiga pode ser compactada ou arquivada sozinha.
+# Os IDs continuam únicos entre as partições (sequencias_ids), como no AUTOINCREMENT
+ESQUEMA_PARTICOES = {
+    "producao": """
+        id INTEGER PRIMARY KEY,
+        data TEXT, area TEXT, cultura TEXT, caixas INTEGER,
+        caixas_segunda INTEGER, temperatura REAL, umidade REAL,
+        chuva REAL, observacao TEXT
+    """,
+    "insumos": """
+        id INTEGER PRIMARY KEY, data TEXT, area TEXT,
+        cultura TEXT, tipo TEXT, quantidade REAL, unidade TEXT,
+        custo_unitario REAL, custo_total REAL, fornecedor TEXT,
+        lote TEXT, observacoes TEXT
+    """
+}
+
+# (data) já carrega o id no fim: serve a ordenação data DESC, id DESC das grades paginadas
+INDICES_PARTICOES = {
+    "producao": {"data_area_cultura": "data, area, cultura", "data": "data"},
+    "insumos": {"data_tipo_cultura": "data, tipo, cultura", "data": "data"}
+}
+
+SEM_DATA = "sem_data"
+
+# Mesma regra de _sufixos_particao, em SQL (usada na migração das tabelas antigas)
+_SUFIXO_PARTICAO_SQL = ("CASE WHEN substr(data, 1, 4) GLOB '[0-9][0-9][0-9][0-9]' "
+                        f"THEN substr(data, 1, 4) ELSE '{SEM_DATA}' END")
+
+def _sufixos_particao(df):
+    """Ano (AAAA) de cada linha do DataFrame; data vazia ou fora do padrão vai para sem_data"""
+    if "data" not in df.columns:
+        return pd.Series(SEM_DATA, index=df.index)
+    anos = df["data"].astype("string").str[:4]
+    return anos.where(anos.str.fullmatch("[0-9]{4}").fillna(False), SEM_DATA).astype(object)
+
+def listar_particoes(nome_tabela, conn=None):
+    """Sufixos das partições existentes da tabela, do ano mais antigo ao sem_data"""
+    linhas = (conn or obter_conexao()).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND (name GLOB ? OR name = ?)",
+        (f"{nome_tabela}_[0-9][0-9][0-9][0-9]", f"{nome_tabela}_{SEM_DATA}")
+    ).fetchall()
+    return sorted(nome[len(nome_tabela) + 1:] for nome, in linhas)
+
+def _criar_particao(conn, nome_tabela, sufixo):
+    """Cria a tabela de uma partição com os índices e os gatilhos dos resumos"""
+    particao = f"{nome_tabela}_{sufixo}"
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {particao} ({ESQUEMA_PARTICOES[nome_tabela]})")
+    for nome_indice, colunas in INDICES_PARTICOES[nome_tabela].items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{particao}_{nome_indice} ON {particao} ({colunas})")
+    
+    soma, subtrai = GATILHOS_RESUMO[nome_tabela]
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{particao}_ins AFTER INSERT ON {particao} BEGIN {soma} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{particao}_del AFTER DELETE ON {particao} BEGIN {subtrai} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{particao}_upd AFTER UPDATE ON {particao} BEGIN {subtrai} {soma} END")
+    return particao
+
+def _recriar_visao(conn, nome_tabela):
+    """Refaz a view UNION ALL com as partições atuais"""
+    conn.execute(f"DROP VIEW IF EXISTS {nome_tabela}")
+    ramos = " UNION ALL ".join(f"SELECT * FROM {nome_tabela}_{sufixo}"
+                               for sufixo in listar_particoes(nome_tabela, conn))
+    conn.execute(f"CREATE VIEW {nome_tabela} AS {ramos}")
+
+def garantir_particao(conn, nome_tabela, sufixo):
+    """Cria a partição (e inclui na view) se ainda não existir; chamar dentro da transação"""
+    if sufixo not in listar_particoes(nome_tabela, conn):
+        _criar_particao(conn, nome_tabela, sufixo)
+        _recriar_visao(conn, nome_tabela)
+    return f"{nome_tabela}_{sufixo}"
+
+def _preparar_particoes(conn, nome_tabela):
+    """Garante partições, view e sequência de IDs; bancos antigos têm a tabela única dividida por ano"""
+    conn.execute("INSERT OR IGNORE INTO sequencias_ids (tabela, ultimo_id) VALUES (?, 0)", (nome_tabela,))
+    tipo = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (nome_tabela,)).fetchone()
+    
+    if tipo and tipo[0] == "table":
+        sufixos = [linha[0] for linha in conn.execute(f"SELECT DISTINCT {_SUFIXO_PARTICAO_SQL} FROM {nome_tabela}")]
+        for sufixo in sufixos:
+            # Cópia antes dos gatilhos: os resumos já contam essas linhas
+            conn.execute(f"CREATE TABLE {nome_tabela}_{sufixo} ({ESQUEMA_PARTICOES[nome_tabela]})")
+            conn.execute(f"INSERT INTO {nome_tabela}_{sufixo} SELECT * FROM {nome_tabela} "
+                         f"WHERE {_SUFIXO_PARTICAO_SQL} = ?", (sufixo,))
+            _criar_particao(conn, nome_tabela, sufixo)
+        
+        ultimo_id = conn.execute(
+            f"SELECT MAX(COALESCE((SELECT MAX(id) FROM {nome_tabela}), 0), "
+            "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0))", (nome_tabela,)
+        ).fetchone()[0]
+        conn.execute("UPDATE sequencias_ids SET ultimo_id = MAX(ultimo_id, ?) WHERE tabela = ?",
+                     (ultimo_id, nome_tabela))
+        conn.execute(f"DROP TABLE {nome_tabela}")
+    
+    # A partição sem_data sempre existe: a view nunca fica sem ramos
+    _criar_particao(conn, nome_tabela, SEM_DATA)
+    if tipo is None or tipo[0] == "table":
+        _recriar_visao(conn, nome_tabela)
+
+def particoes_do_periodo(nome_tabela, data_inicio=None, data_fim=None):
+    """Tabelas que podem ter linhas do período; tabelas sem partição voltam como estão"""
+    if nome_tabela not in ESQUEMA_PARTICOES:
+        return [nome_tabela]
+    
+    ano_inicio = pd.Timestamp(data_inicio).year if data_inicio is not None else None
+    ano_fim = pd.Timestamp(data_fim).year if data_fim is not None else None
+    particoes = []
+    for sufixo in listar_particoes(nome_tabela):
+        # sem_data entra sempre: o filtro de período decide linha a linha, como antes
+        if sufixo != SEM_DATA:
+            if (ano_inicio is not None and int(sufixo) < ano_inicio) or \
+               (ano_fim is not None and int(sufixo) > ano_fim):
+                continue
+        particoes.append(f"{nome_tabela}_{sufixo}")
+    return particoes
+
+def consulta_particionada(nome_tabela, where="", parametros=(), data_inicio=None, data_fim=None,
+                          colunas="*", complemento=""):
+    """SELECT com um ramo UNION ALL por partição do período, repetindo o WHERE em cada ramo"""
+    particoes = particoes_do_periodo(nome_tabela, data_inicio, data_fim)
+    ramos = " UNION ALL ".join(f"SELECT {colunas} FROM {particao}{where}" for particao in particoes)
+    return f"{ramos}{complemento}", list(parametros) * len(particoes)
+
+@medido("sql")
+def resumo_particoes():
+    """Registros e período de cada partição, para acompanhar o crescimento por safra"""
+    linhas = []
+    for nome_tabela in ESQUEMA_PARTICOES:
+        for sufixo in listar_particoes(nome_tabela):
+            registros, inicio, fim = obter_conexao().execute(
+                f"SELECT COUNT(*), MIN(data), MAX(data) FROM {nome_tabela}_{sufixo}").fetchone()
+            linhas.append({"tabela": nome_tabela, "particao": sufixo, "registros": registros,
+                           "inicio": inicio, "fim": fim})
+    return pd.DataFrame(linhas, columns=["tabela", "particao", "registros", "inicio", "fim"])
 
+@medido("sql")
+def compactar_particao(nome_tabela, sufixo):
+    """Regrava uma partição em ordem de data, sem os espaços deixados por exclusões
+
+    As páginas liberadas voltam para a lista livre do arquivo e são reaproveitadas
+    pelas próximas gravações; as outras partições não são lidas.
+    """
+    sufixo = str(sufixo)
+    if sufixo not in listar_particoes(nome_tabela):
+        raise ValueError(f"Partição {nome_tabela}_{sufixo} não existe")
+    
+    particao = f"{nome_tabela}_{sufixo}"
+    with transacao() as conn:
+        # A view sai antes da troca de tabelas e volta no fim
+        conn.execute(f"DROP VIEW {nome_tabela}")
+        conn.execute(f"CREATE TABLE {particao}_nova ({ESQUEMA_PARTICOES[nome_tabela]})")
+        conn.execute(f"INSERT INTO {particao}_nova SELECT * FROM {particao} ORDER BY data, id")
+        conn.execute(f"DROP TABLE {particao}")
+        conn.execute(f"ALTER TABLE {particao}_nova RENAME TO {particao}")
+        _criar_particao(conn, nome_tabela, sufixo)
+        _recriar_visao(conn, nome_tabela)
+        incrementar_versao(conn, nome_tabela)
+
+@medido("sql")
+def arquivar_particao(nome_tabela, sufixo, destino):
+    """Move uma partição para outro arquivo SQLite e tira suas linhas dos resumos"""
+    sufixo = str(sufixo)
+    if sufixo == SEM_DATA or sufixo not in listar_particoes(nome_tabela):
+        raise ValueError(f"Partição {nome_tabela}_{sufixo} não pode ser arquivada")
+    
+    particao = f"{nome_tabela}_{sufixo}"
+    conn = obter_conexao()
+    conn.execute("ATTACH DATABASE ? AS arquivo", (destino,))
+    try:
+        with transacao():
+            if conn.execute("SELECT 1 FROM arquivo.sqlite_master WHERE name = ?", (particao,)).fetchone():
+                raise ValueError(f"{destino} já tem a partição {particao}")
+            conn.execute(f"CREATE TABLE arquivo.{particao} ({ESQUEMA_PARTICOES[nome_tabela]})")
+            conn.execute(f"INSERT INTO arquivo.{particao} SELECT * FROM main.{particao}")
+            # DELETE (e não só DROP) para os gatilhos descontarem as linhas dos resumos
+            conn.execute(f"DELETE FROM main.{particao}")
+            conn.execute(f"DROP TABLE main.{particao}")
+            _recriar_visao(conn, nome_tabela)
+            incrementar_versao(conn, nome_tabela)
+    finally:
+        conn.execute("DETACH DATABASE arquivo")
+
+@medido("sql")
+def restaurar_particao(nome_tabela, sufixo, origem):
+    """Traz de volta uma partição arquivada com arquivar_particao (os resumos são refeitos pelos gatilhos)"""
+    sufixo = str(sufixo)
+    particao = f"{nome_tabela}_{sufixo}"
+    conn = obter_conexao()
+    conn.execute("ATTACH DATABASE ? AS arquivo", (origem,))
+    try:
+        with transacao():
+            if not conn.execute("SELECT 1 FROM arquivo.sqlite_master WHERE name = ?", (particao,)).fetchone():
+                raise ValueError(f"{origem} não tem a partição {particao}")
+            garantir_particao(conn, nome_tabela, sufixo)
+            conn.execute(f"INSERT INTO main.{particao} SELECT * FROM arquivo.{particao}")
+            conn.execute(f"DROP TABLE arquivo.{particao}")
+            incrementar_versao(conn, nome_tabela)
+    finally:
+        conn.execute("DETACH DATABASE arquivo")
+
+@medido("sql")
+def reconstruir_resumos():
+    """Recalcula as tabelas de resumo diário a partir das tabelas de origem"""
+    with transacao() as conn:
+        conn.execute("DELETE FROM producao_diaria")
+        conn.execute("""
+            INSERT INTO producao_diaria (data, area, cultura, caixas, caixas_segunda, registros)
+            SELECT COALESCE(substr(data, 1, 10), ''), COALESCE(area, ''), COALESCE(cultura, ''),
+                   SUM(COALESCE(caixas, 0)), SUM(COALESCE(caixas_segunda, 0)), COUNT(*)
+            FROM producao GROUP BY 1, 2, 3
+        """)
+        conn.execute("DELETE FROM insumos_diario")
+        conn.execute("""
+            INSERT INTO insumos_diario (data, tipo, cultura, custo_total, registros)
+            SELECT COALESCE(substr(data, 1, 10), ''), COALESCE(tipo, ''), COALESCE(cultura, ''),
+                   SUM(COALESCE(custo_total, 0)), COUNT(*)
+            FROM insumos GROUP BY 1, 2, 3
+        """)
+        
+        # clima_diario antes: os pares defasados são buscados nele
+        conn.execute("DELETE FROM clima_diario")
+        somas = ", ".join(f"COUNT({v}), TOTAL({v}), TOTAL({v} * {v})" for v in _VARIAVEIS_CLIMA)
+        conn.execute(f"""
+            INSERT INTO clima_diario (data, area, cultura, registros, {", ".join(_COLUNAS_CLIMA_DIARIO)})
+            SELECT COALESCE(substr(data, 1, 10), ''), COALESCE(area, ''), COALESCE(cultura, ''), COUNT(*), {somas}
+            FROM producao GROUP BY 1, 2, 3
+        """)
+        conn.execute("DELETE FROM estatisticas_clima")
+        conn.execute(f"""
+            INSERT INTO estatisticas_clima (mes, area, cultura, registros, {", ".join(COLUNAS_ESTATISTICAS_CLIMA)})
+            {_sql_estatisticas_clima("SELECT * FROM producao")}
+        """)
+        incrementar_versao(conn, "producao", "insumos")
+
+@medido("sql")
+def carregar_resumo_producao():
+    """Carrega a produção já agregada por dia×área×cultura"""
+    return leitura_em_cache(("resumo", "producao"), ("producao",),
+                            lambda: pd.read_sql("SELECT * FROM producao_diaria", obter_conexao()))
+
+@medido("sql")
+def carregar_resumo_insumos():
+    """Carrega os custos de insumos já agregados por dia×tipo×cultura"""
+    return leitura_em_cache(("resumo", "insumos"), ("insumos",),
+                            lambda: pd.read_sql("SELECT * FROM insumos_diario", obter_conexao()))
+
+@medido("sql")
+def carregar_ultimo_registro(nome_tabela):
+    """Retorna o registro mais recente da tabela (ou None se estiver vazia)"""
+    df = pd.read_sql(f"SELECT * FROM {nome_tabela} ORDER BY id DESC LIMIT 1", obter_conexao())
+    # Numa linha só o NULL volta como None (não NaN); as comparações de clima esperam float
+    for coluna in COLUNAS_NUMERICAS.get(nome_tabela, {}):
+        if coluna in df.columns:
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype(float)
+    return None if df.empty else df.iloc[0]
+
+@medido("sql")
 def inserir_tabela(nome_tabela, df):
     """Insere dados em uma tabela do banco"""
-    conn = sqlite3.connect(DB_NAME)
-    
     if nome_tabela == "producao":
         df = normalizar_colunas(df)
     
-    df.to_sql(nome_tabela, conn, if_exists="append", index=False)
-    conn.close()
+    if df.empty:
+        return
+    
+    with transacao() as conn:
+        _inserir_lote(conn, nome_tabela, df)
+        incrementar_versao(conn, nome_tabela)
 
+def _inserir_lote(conn, nome_tabela, df):
+    """Insere um DataFrame com executemany na conexão (e transação) recebida"""
+    if nome_tabela in ESQUEMA_PARTICOES:
+        _inserir_particionado(conn, nome_tabela, df)
+        return
+    
+    colunas = ", ".join(df.columns)
+    marcadores = ", ".join("?" for _ in df.columns)
+    conn.executemany(f"INSERT INTO {nome_tabela} ({colunas}) VALUES ({marcadores})",
+                     _linhas_para_sql(df))
+
+def _inserir_particionado(conn, nome_tabela, df):
+    """Reserva os IDs na sequência da tabela e grava cada ano na sua partição"""
+    # UPDATE e depois SELECT (e não RETURNING, só do SQLite 3.35+): a transação já tem o
+    # lock de escrita, então ninguém reserva IDs entre os dois
+    conn.execute("UPDATE sequencias_ids SET ultimo_id = ultimo_id + ? WHERE tabela = ?", (len(df), nome_tabela))
+    ultimo_id = conn.execute("SELECT ultimo_id FROM sequencias_ids WHERE tabela = ?", (nome_tabela,)).fetchone()[0]
+    df = df.assign(id=np.arange(ultimo_id - len(df) + 1, ultimo_id + 1))
+    
+    colunas = ", ".join(df.columns)
+    marcadores = ", ".join("?" for _ in df.columns)
+    for sufixo, lote in df.groupby(_sufixos_particao(df), sort=True):
+        particao = garantir_particao(conn, nome_tabela, sufixo)
+        conn.executemany(f"INSERT INTO {particao} ({colunas}) VALUES ({marcadores})",
+                         _linhas_para_sql(lote))
+
+@medido("sql")
+def colunas_tabela(nome_tabela):
+    """Lista as colunas gravadas pelo usuário em uma tabela (sem o id)"""
+    linhas = obter_conexao().execute(f"PRAGMA table_info({nome_tabela})").fetchall()
+    return [linha[1] for linha in linhas if linha[1] != "id"]
+
+@medido("sql")
 def carregar_tabela(nome_tabela):
     """Carrega dados de uma tabela do banco"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql(f"SELECT * FROM {nome_tabela}", conn)
-    conn.close()
+    return leitura_em_cache(("tabela", nome_tabela), (nome_tabela,),
+                            lambda: pd.read_sql(f"SELECT * FROM {nome_tabela}", obter_conexao()))
+
+# Colunas que podem ser usadas em filtros IN (evita montar SQL com nomes arbitrários)
+COLUNAS_FILTRAVEIS = {
+    "producao": ("area", "cultura"),
+    "insumos": ("area", "cultura", "tipo")
+}
+
+def montar_filtro_sql(nome_tabela, data_inicio=None, data_fim=None, ids=None, **filtros):
+    """Monta a cláusula WHERE parametrizada para IDs, período e listas de valores"""
+    condicoes, parametros = [], []
+    
+    if ids is not None:
+        # IDs passados como um único array JSON: sem limite de variáveis do SQLite
+        condicoes.append("id IN (SELECT value FROM json_each(?))")
+        parametros.append(json.dumps([int(i) for i in ids]))
+    if data_inicio is not None:
+        condicoes.append("data >= ?")
+        parametros.append(pd.Timestamp(data_inicio).strftime("%Y-%m-%d"))
+    if data_fim is not None:
+        # Limite aberto no dia seguinte para incluir datas gravadas com horário
+        condicoes.append("data < ?")
+        parametros.append((pd.Timestamp(data_fim) + timedelta(days=1)).strftime("%Y-%m-%d"))
+    
+    for coluna, valores in filtros.items():
+        if coluna not in COLUNAS_FILTRAVEIS.get(nome_tabela, ()):
+            raise ValueError(f"Coluna '{coluna}' não pode ser filtrada em {nome_tabela}")
+        if valores:
+            valores = list(valores)
+            condicoes.append(f"{coluna} IN ({', '.join('?' for _ in valores)})")
+            parametros.extend(valores)
+    
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return where, parametros
+
+@medido("sql")
+def carregar_tabela_filtrada(nome_tabela, data_inicio=None, data_fim=None, **filtros):
+    """Carrega só as linhas do período/áreas/culturas/tipos selecionados"""
+    where, parametros = montar_filtro_sql(nome_tabela, data_inicio, data_fim, **filtros)
+    sql, parametros = consulta_particionada(nome_tabela, where, parametros, data_inicio, data_fim)
+    return leitura_em_cache(("filtrada", nome_tabela, sql, tuple(parametros)), (nome_tabela,),
+                            lambda: pd.read_sql(sql, obter_conexao(), params=parametros))
+
+# Tipos compactos das tabelas analisadas: texto repetido vira categoria, contagens int32,
+# clima float32 (décimos de grau/mm) e data já em datetime. Valores em R$ ficam float64
+TIPOS_COMPACTOS = {
+    "producao": {"area": "category", "cultura": "category", "caixas": "int32", "caixas_segunda": "int32",
+                 "temperatura": "float32", "umidade": "float32", "chuva": "float32", "data": "datetime"},
+    "insumos": {"area": "category", "cultura": "category", "tipo": "category", "unidade": "category",
+                "fornecedor": "category", "data": "datetime"}
+}
+
+def tipar_colunas(nome_tabela, df):
+    """Converte as colunas do DataFrame lido do banco para os tipos compactos da tabela"""
+    for coluna, tipo in TIPOS_COMPACTOS.get(nome_tabela, {}).items():
+        if coluna not in df.columns:
+            continue
+        if tipo == "datetime":
+            df[coluna] = pd.to_datetime(df[coluna], format="ISO8601", errors="coerce")
+        elif tipo == "int32":
+            valores = pd.to_numeric(df[coluna], errors="coerce")
+            # Nulos, frações ou valores fora da faixa: fica o float64 que o pandas usaria
+            cabe = valores.notna().all() and (valores % 1 == 0).all() and \
+                   valores.between(np.iinfo(np.int32).min, np.iinfo(np.int32).max).all()
+            df[coluna] = valores.astype("int32") if cabe else valores.astype("float64")
+        elif tipo == "float32":
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype("float32")
+        else:
+            df[coluna] = df[coluna].astype(tipo)
+    return df
+
+@medido("sql")
+def carregar_tabela_compacta(nome_tabela, data_inicio=None, data_fim=None, **filtros):
+    """Como carregar_tabela_filtrada, mas com os tipos compactos (cópia guardada no cache já convertida)"""
+    where, parametros = montar_filtro_sql(nome_tabela, data_inicio, data_fim, **filtros)
+    sql, parametros = consulta_particionada(nome_tabela, where, parametros, data_inicio, data_fim)
+    return leitura_em_cache(("compacta", nome_tabela, sql, tuple(parametros)), (nome_tabela,),
+                            lambda: tipar_colunas(nome_tabela, pd.read_sql(sql, obter_conexao(), params=parametros)))
+
+def relatorio_memoria(nome_tabela, df):
+    """Memória por coluna (MB) com os tipos padrão do pandas e com os tipos compactos"""
+    compacto = tipar_colunas(nome_tabela, df.copy())
+    relatorio = pd.DataFrame({
+        "tipo_padrao": df.dtypes.astype(str),
+        "tipo_compacto": compacto.dtypes.astype(str),
+        "mb_padrao": df.memory_usage(deep=True, index=False) / 1024 ** 2,
+        "mb_compacto": compacto.memory_usage(deep=True, index=False) / 1024 ** 2
+    })
+    relatorio.loc["total"] = ["", "", relatorio["mb_padrao"].sum(), relatorio["mb_compacto"].sum()]
+    relatorio["economia_pct"] = (1 - relatorio["mb_compacto"] / relatorio["mb_padrao"]) * 100
+    return relatorio.round(2)
+
+@medido("sql")
+def intervalo_datas(nome_tabela):
+    """Retorna a menor e a maior data registradas na tabela"""
+    # MIN/MAX em cada partição usam o índice de data; na view seria uma varredura completa
+    ramos, _ = consulta_particionada(nome_tabela, colunas="MIN(data) AS inicio, MAX(data) AS fim")
+    return obter_conexao().execute(f"SELECT MIN(inicio), MAX(fim) FROM ({ramos})").fetchone()
+
+@medido("sql")
+def valores_distintos(nome_tabela, coluna):
+    """Lista os valores distintos de uma coluna filtrável"""
+    if coluna not in COLUNAS_FILTRAVEIS.get(nome_tabela, ()):
+        raise ValueError(f"Coluna '{coluna}' não pode ser filtrada em {nome_tabela}")
+    
+    def carregar():
+        linhas = obter_conexao().execute(f"SELECT DISTINCT {coluna} FROM {nome_tabela} ORDER BY {coluna}").fetchall()
+        return [linha[0] for linha in linhas]
+    
+    return leitura_em_cache(("distintos", nome_tabela, coluna), (nome_tabela,), carregar)
+
+@medido("sql")
+def tabela_tem_registros(nome_tabela):
+    """Indica se a tabela tem pelo menos uma linha"""
+    return obter_conexao().execute(f"SELECT EXISTS (SELECT 1 FROM {nome_tabela})").fetchone()[0] == 1
+
+@medido("sql")
+def carregar_pagina(nome_tabela, tamanho, cursor=None, **filtros):
+    """Carrega uma página ordenada por data/id decrescentes começando após o cursor (data, id)"""
+    where, parametros = montar_filtro_sql(nome_tabela, **filtros)
+    condicoes = [where[len(" WHERE "):]] if where else []
+    
+    def ler(condicao, valores, limite):
+        clausula = " AND ".join(condicoes + [condicao]) if condicao else " AND ".join(condicoes)
+        # ORDER BY ... LIMIT sobre o UNION ALL intercala os índices de data de cada partição
+        sql, params = consulta_particionada(nome_tabela, f" WHERE {clausula}" if clausula else "",
+                                            parametros + valores, filtros.get("data_inicio"),
+                                            filtros.get("data_fim"), complemento=" ORDER BY data DESC, id DESC LIMIT ?")
+        return pd.read_sql(sql, obter_conexao(), params=params + [int(limite)])
+    
+    # No DESC as linhas sem data (NULL) vêm por último; (data, id) < (?, ?) é NULL para elas,
+    # então depois das datadas são lidas à parte, em vez de um OR que desfaz a busca no índice
+    if cursor is None:
+        return ler("", [], tamanho)
+    data_cursor, id_cursor = cursor
+    if pd.isna(data_cursor):
+        return ler("data IS NULL AND id < ?", [int(id_cursor)], tamanho)
+    df = ler("(data, id) < (?, ?)", [data_cursor, int(id_cursor)], tamanho)
+    if len(df) < tamanho:
+        sem_data = ler("data IS NULL", [], tamanho - len(df))
+        if not sem_data.empty:
+            df = pd.concat([df, sem_data], ignore_index=True) if not df.empty else sem_data
     return df
 
+@medido("sql")
+def carregar_custos_mensais(**filtros):
+    """Soma e conta os custos de insumos por mês direto no SQL"""
+    where, parametros = montar_filtro_sql("insumos", **filtros)
+    ramos, parametros = consulta_particionada("insumos", where, parametros, filtros.get("data_inicio"),
+                                              filtros.get("data_fim"), colunas="data, custo_total")
+    return leitura_em_cache(("custos_mensais", ramos, tuple(parametros)), ("insumos",), lambda: pd.read_sql(f"""
+        SELECT substr(data, 1, 7) AS data, SUM(custo_total) AS custo_total, COUNT(custo_total) AS registros
+        FROM ({ramos}) GROUP BY 1 ORDER BY 1
+    """, obter_conexao(), params=parametros))
+
+def _meses_do_periodo(data_inicio=None, data_fim=None):
+    """Primeiro e último mês inteiros do período (AAAA-MM) e os trechos parciais das pontas"""
+    inicio = pd.Timestamp(data_inicio).normalize() if data_inicio is not None else None
+    fim = pd.Timestamp(data_fim).normalize() if data_fim is not None else None
+    primeiro, ultimo, parciais = None, None, []
+    
+    if inicio is not None:
+        primeiro = (inicio if inicio.day == 1 else inicio + pd.offsets.MonthBegin(1)).strftime("%Y-%m")
+        if inicio.day != 1:
+            fim_do_mes = inicio + pd.offsets.MonthEnd(0)
+            parciais.append((inicio, min(fim_do_mes, fim) if fim is not None else fim_do_mes))
+    if fim is not None:
+        comeco_do_mes = fim.replace(day=1)
+        ultimo = (fim if fim.is_month_end else comeco_do_mes - timedelta(days=1)).strftime("%Y-%m")
+        # Se o início já está no mesmo mês, o trecho parcial de cima já foi incluído
+        if not fim.is_month_end and (inicio is None or inicio <= comeco_do_mes):
+            parciais.append((max(comeco_do_mes, inicio) if inicio is not None else comeco_do_mes, fim))
+    
+    return primeiro, ultimo, parciais
+
+@medido("sql")
+def carregar_estatisticas_clima(data_inicio=None, data_fim=None, areas=None, culturas=None):
+    """Somas das séries de clima × produção do filtro: meses inteiros da tabela, pontas das linhas"""
+    where, parametros = montar_filtro_sql("producao", area=areas, cultura=culturas)
+    condicoes = [where[len(" WHERE "):]] if where else []
+    primeiro, ultimo, parciais = _meses_do_periodo(data_inicio, data_fim)
+    somas = ", ".join(f"TOTAL({c})" for c in COLUNAS_ESTATISTICAS_CLIMA)
+    
+    consultas = []
+    if data_inicio is not None or data_fim is not None:
+        # Linhas sem data só entram quando não há filtro de período
+        condicoes.append("mes <> ''")
+    if primeiro is not None:
+        condicoes.append("mes >= ?")
+        parametros = parametros + [primeiro]
+    if ultimo is not None:
+        condicoes.append("mes <= ?")
+        parametros = parametros + [ultimo]
+    if primeiro is None or ultimo is None or primeiro <= ultimo:
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        consultas.append((f"SELECT {somas} FROM estatisticas_clima{where}", parametros))
+    
+    for inicio, fim in parciais:
+        where, parametros = montar_filtro_sql("producao", inicio, fim, area=areas, cultura=culturas)
+        linhas, parametros = consulta_particionada("producao", where, parametros, inicio, fim,
+                                                   colunas="data, area, cultura, " + ", ".join(_VARIAVEIS_CLIMA))
+        # A subconsulta das linhas aparece uma vez por bloco (sem defasagem e cada defasagem)
+        consultas.append((f"SELECT {somas} FROM ({_sql_estatisticas_clima(linhas)})",
+                          parametros * (1 + len(analise.DEFASAGENS_CLIMA))))
+    
+    def carregar():
+        conn = obter_conexao()
+        totais = np.zeros(len(COLUNAS_ESTATISTICAS_CLIMA))
+        for sql, parametros_consulta in consultas:
+            totais += np.array(conn.execute(sql, parametros_consulta).fetchone(), dtype=float)
+        return dict(zip(COLUNAS_ESTATISTICAS_CLIMA, totais.tolist()))
+    
+    chave = ("estatisticas_clima",) + tuple((sql, tuple(p)) for sql, p in consultas)
+    return leitura_em_cache(chave, ("producao",), carregar)
+
+LIMITE_CANDIDATOS_EXCLUSAO = 100
+
+@medido("sql")
+def buscar_candidatos_exclusao(nome_tabela, termo="", limite=LIMITE_CANDIDATOS_EXCLUSAO):
+    """Busca registros por prefixo de ID/data ou trecho de área/cultura, limitado a poucas linhas"""
+    colunas = "id, data, area, cultura" + (", tipo" if nome_tabela == "insumos" else "")
+    termo = termo.strip()
+    
+    if not termo:
+        where, parametros = "", []
+    else:
+        termo = termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where = """
+            WHERE CAST(id AS TEXT) LIKE ? ESCAPE '\\' OR data LIKE ? ESCAPE '\\'
+               OR area LIKE ? ESCAPE '\\' OR cultura LIKE ? ESCAPE '\\'
+        """
+        parametros = [f"{termo}%", f"{termo}%", f"%{termo}%", f"%{termo}%"]
+    
+    sql, parametros = consulta_particionada(nome_tabela, where, parametros, colunas=colunas,
+                                            complemento=" ORDER BY data DESC, id DESC LIMIT ?")
+    return pd.read_sql(sql, obter_conexao(), params=parametros + [int(limite)])
+
+@medido("sql")
 def excluir_linha(nome_tabela, row_id):
     """Exclui uma linha específica do banco"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(f"DELETE FROM {nome_tabela} WHERE id=?", (row_id,))
-    conn.commit()
-    conn.close()
+    excluir_linhas(nome_tabela, ids=[row_id])
+
+@medido("sql")
+def excluir_linhas(nome_tabela, ids=None, data_inicio=None, data_fim=None, **filtros):
+    """Exclui por lista de IDs, período e/ou filtros em uma única instrução e transação"""
+    if ids is not None and len(ids) == 0:
+        return 0
+    
+    where, parametros = montar_filtro_sql(nome_tabela, data_inicio, data_fim, ids=ids, **filtros)
+    if not where:
+        raise ValueError("Informe IDs, período ou filtros para excluir; a tabela inteira não é apagada")
+    
+    with transacao() as conn:
+        # A view não aceita DELETE: exclui em cada partição que pode ter linhas do período
+        excluidas = sum(conn.execute(f"DELETE FROM {particao}{where}", parametros).rowcount
+                        for particao in particoes_do_periodo(nome_tabela, data_inicio, data_fim))
+        if excluidas:
+            incrementar_versao(conn, nome_tabela)
+    
+    return excluidas
 
+@medido("sql")
 def carregar_fenologia_especies():
     """Carrega os estágios fenológicos por espécie"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM fenologia_especies", conn)
-    conn.close()
-    
-    fenologia_dict = {}
-    for _, row in df.iterrows():
-        try:
-            fenologia_dict[row['especie']] = json.loads(row['estagios'])
-        except:
-            fenologia_dict[row['especie']] = []
-    
-    return fenologia_dict
+    return leitura_em_cache(("fenologia_especies",), ("fenologia_especies",), _ler_fenologia_especies)
+
+def _ler_fenologia_especies():
+    """Lê do banco os estágios fenológicos por espécie"""
+    linhas = obter_conexao().execute("SELECT especie, estagios FROM fenologia_especies").fetchall()
+    return {especie: _estagios_do_json(estagios) for especie, estagios in linhas}
+
+def _estagios_do_json(texto):
+    """Converte a coluna estagios; conteúdo inválido vira lista vazia"""
+    try:
+        return json.loads(texto)
+    except (TypeError, ValueError):
+        return []
 
+@medido("sql")
 def salvar_fenologia_especie(especie, estagios):
     """Salva estágios fenológicos de uma espécie"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM fenologia_especies WHERE especie = ?", (especie,))
-    existe = cursor.fetchone()
-    
-    if existe:
-        cursor.execute("UPDATE fenologia_especies SET estagios = ? WHERE especie = ?", 
-                      (json.dumps(estagios), especie))
-    else:
-        cursor.execute("INSERT INTO fenologia_especies (especie, estagios) VALUES (?, ?)", 
-                      (especie, json.dumps(estagios)))
-    
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        conn.execute("""
+            INSERT INTO fenologia_especies (especie, estagios) VALUES (?, ?)
+            ON CONFLICT(especie) DO UPDATE SET estagios = excluded.estagios
+        """, (especie, json.dumps(estagios)))
+        incrementar_versao(conn, "fenologia_especies")
 
+@medido("sql")
 def carregar_precos_culturas():
     """Carrega os preços das culturas do banco de dados"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM precos_culturas", conn)
-    conn.close()
-    
-    precos_dict = {}
-    for _, row in df.iterrows():
-        precos_dict[row['cultura']] = {
-            'preco_primeira': row['preco_primeira'],
-            'preco_segunda': row['preco_segunda']
-        }
-    
-    return precos_dict
+    return leitura_em_cache(("precos_culturas",), ("precos_culturas",), _ler_precos_culturas)
 
+def _ler_precos_culturas():
+    """Lê do banco os preços por cultura"""
+    linhas = obter_conexao().execute(
+        "SELECT cultura, preco_primeira, preco_segunda FROM precos_culturas"
+    ).fetchall()
+    return {cultura: {'preco_primeira': primeira, 'preco_segunda': segunda}
+            for cultura, primeira, segunda in linhas}
+
+@medido("sql")
 def salvar_preco_cultura(cultura, preco_primeira, preco_segunda):
     """Salva ou atualiza o preço de uma cultura"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM precos_culturas WHERE cultura = ?", (cultura,))
-    existe = cursor.fetchone()
-    
-    if existe:
-        cursor.execute("UPDATE precos_culturas SET preco_primeira = ?, preco_segunda = ? WHERE cultura = ?", 
-                      (preco_primeira, preco_segunda, cultura))
-    else:
-        cursor.execute("INSERT INTO precos_culturas (cultura, preco_primeira, preco_segunda) VALUES (?, ?, ?)", 
-                      (cultura, preco_primeira, preco_segunda))
-    
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        conn.execute("""
+            INSERT INTO precos_culturas (cultura, preco_primeira, preco_segunda) VALUES (?, ?, ?)
+            ON CONFLICT(cultura) DO UPDATE SET preco_primeira = excluded.preco_primeira,
+                                               preco_segunda = excluded.preco_segunda
+        """, (cultura, preco_primeira, preco_segunda))
+        incrementar_versao(conn, "precos_culturas")
 
 # ===============================
 # CONFIGURAÇÕES
 # ===============================
+# O config.json é lido uma vez por processo e compartilhado entre as sessões;
+# só volta ao disco quando o arquivo muda (mtime/tamanho/inode)
+_config_cache = {"assinatura": None, "valor": None}
+_config_lock = threading.Lock()
+
+def _assinatura_arquivo(caminho):
+    """Identifica a versão do arquivo no disco (None se não existir)"""
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+def _gravar_json_atomico(caminho, dados):
+    """Grava o JSON num temporário ao lado e troca de uma vez, sem leitores verem arquivo pela metade"""
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(prefix=".config_", suffix=".json", dir=diretorio)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
 def carregar_config():
-    """Carrega as configurações do sistema"""
+    """Carrega as configurações do sistema (cópia; o cache só é relido quando o arquivo muda)"""
+    with _config_lock:
+        assinatura = _assinatura_arquivo(CONFIG_FILE)
+        if assinatura is None or assinatura != _config_cache["assinatura"]:
+            valor = _ler_config_disco()
+            _config_cache.update(assinatura=_assinatura_arquivo(CONFIG_FILE), valor=valor)
+        return copy.deepcopy(_config_cache["valor"])
+
+def _ler_config_disco():
+    """Lê o config.json, criando-o com os valores padrão se não existir"""
     if not os.path.exists(CONFIG_FILE):
         cfg = {
             "cidade": CIDADE_PADRAO,
@@ -200,22 +1241,23 @@ def carregar_config():
             "alerta_prod_baixo_pct": 30.0,
             "preco_padrao_primeira": 30.0,
             "preco_padrao_segunda": 15.0,
+            "clima_cache_ttl_min": CLIMA_CACHE_TTL_PADRAO_MIN,
             "custo_medio_insumos": {
                 "Adubo Orgânico": 2.5, "Adubo Químico": 4.0, "Defensivo Agrícola": 35.0,
                 "Semente": 0.5, "Muda": 1.2, "Fertilizante Foliar": 15.0, "Corretivo de Solo": 1.8
             }
         }
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=4)
+        _gravar_json_atomico(CONFIG_FILE, cfg)
         return cfg
     
     with open(CONFIG_FILE, "r", encoding="utf-8") as f:
         return json.load(f)
 
 def salvar_config(cfg):
-    """Salva as configurações do sistema"""
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, ensure_ascii=False, indent=4)
+    """Salva as configurações do sistema; as outras sessões veem a mudança no próximo rerun"""
+    with _config_lock:
+        _gravar_json_atomico(CONFIG_FILE, cfg)
+        _config_cache.update(assinatura=_assinatura_arquivo(CONFIG_FILE), valor=copy.deepcopy(cfg))
 
 # ===============================
 # FUNÇÕES UTILITÁRIAS
@@ -244,61 +1286,532 @@ def normalizar_colunas(df):
     
     return df
 
-def buscar_clima(cidade):
-    """Busca dados climáticos da API"""
+# ===============================
+# IMPORTAÇÃO DE PLANILHAS
+# ===============================
+IMPORTACAO_TAMANHO_LOTE = 5000
+
+# Colunas numéricas de cada tabela: células vazias viram 0, textos não numéricos rejeitam a linha
+COLUNAS_NUMERICAS = {
+    "producao": {"caixas": 0, "caixas_segunda": 0, "temperatura": None, "umidade": None, "chuva": None},
+    "insumos": {"quantidade": 0, "custo_unitario": 0, "custo_total": 0}
+}
+
+def ler_planilha_em_lotes(arquivo, tamanho_lote=IMPORTACAO_TAMANHO_LOTE):
+    """Lê a primeira aba da planilha linha a linha (openpyxl read-only), devolvendo DataFrames por lote"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = workbook.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if not cabecalho:
+            return
+        
+        cabecalho = [str(c).strip() if c is not None else f"coluna_{i + 1}" for i, c in enumerate(cabecalho)]
+        n_colunas = len(cabecalho)
+        lote = []
+        
+        for linha in linhas:
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in linha):
+                continue
+            lote.append(tuple(linha[:n_colunas]) + (None,) * (n_colunas - len(linha)))
+            if len(lote) >= tamanho_lote:
+                yield pd.DataFrame(lote, columns=cabecalho)
+                lote = []
+        
+        if lote:
+            yield pd.DataFrame(lote, columns=cabecalho)
+    finally:
+        workbook.close()
+
+def _normalizar_lote(nome_tabela, df, colunas_validas):
+    """Normaliza um lote da planilha e separa as linhas que não podem ser gravadas"""
+    if nome_tabela == "producao":
+        df = normalizar_colunas(df)
+    else:
+        df = df.rename(columns=lambda x: str(x).lower())
+        if "data" in df.columns:
+            df["data"] = pd.to_datetime(df["data"], errors="coerce").dt.strftime('%Y-%m-%d')
+    
+    rejeitadas = pd.Series(False, index=df.index)
+    if "data" in df.columns:
+        rejeitadas |= df["data"].isna()
+    
+    for coluna, padrao in COLUNAS_NUMERICAS.get(nome_tabela, {}).items():
+        if coluna not in df.columns:
+            continue
+        original = df[coluna]
+        vazio = original.isna() | original.astype(str).str.strip().eq("")
+        df[coluna] = pd.to_numeric(original.where(~vazio), errors="coerce")
+        rejeitadas |= df[coluna].isna() & ~vazio
+        if padrao is not None:
+            df[coluna] = df[coluna].fillna(padrao)
+    
+    ignoradas = [c for c in df.columns if c not in colunas_validas]
+    validas = df.loc[~rejeitadas, [c for c in df.columns if c in colunas_validas]]
+    return validas, int(rejeitadas.sum()), ignoradas
+
+@medido("sql")
+def importar_excel(nome_tabela, arquivo, tamanho_lote=IMPORTACAO_TAMANHO_LOTE):
+    """Importa uma planilha em lotes dentro de uma única transação (tudo ou nada)"""
+    inicio = time.perf_counter()
+    colunas_validas = colunas_tabela(nome_tabela)
+    importadas, rejeitadas, ignoradas = 0, 0, set()
+    
+    with transacao() as conn:
+        for lote in ler_planilha_em_lotes(arquivo, tamanho_lote):
+            validas, n_rejeitadas, colunas_ignoradas = _normalizar_lote(nome_tabela, lote, colunas_validas)
+            rejeitadas += n_rejeitadas
+            ignoradas.update(colunas_ignoradas)
+            if not validas.empty:
+                _inserir_lote(conn, nome_tabela, validas)
+                importadas += len(validas)
+        
+        if importadas:
+            incrementar_versao(conn, nome_tabela)
+    
+    segundos = time.perf_counter() - inicio
+    return {
+        "importadas": importadas,
+        "rejeitadas": rejeitadas,
+        "colunas_ignoradas": sorted(ignoradas),
+        "segundos": segundos,
+        "linhas_por_segundo": importadas / segundos if segundos > 0 else 0.0
+    }
+
+def mostrar_resultado_importacao(chave):
+    """Exibe (uma vez) o resumo da última importação guardado na sessão"""
+    resultado = st.session_state.pop(chave, None)
+    if not resultado:
+        return
+    
+    st.success(f"✅ {resultado['importadas']} linhas importadas em {resultado['segundos']:.1f}s "
+               f"({resultado['linhas_por_segundo']:,.0f} linhas/s)")
+    if resultado["rejeitadas"]:
+        st.warning(f"⚠️ {resultado['rejeitadas']} linhas rejeitadas (data inválida ou valor não numérico)")
+    if resultado["colunas_ignoradas"]:
+        st.info(f"ℹ️ Colunas ignoradas: {', '.join(resultado['colunas_ignoradas'])}")
+
+def formulario_importacao(nome_tabela, rotulo, chave_upload=None):
+    """Upload de planilha que importa cada arquivo uma única vez e mostra o resumo"""
+    uploaded_file = st.file_uploader(rotulo, type=["xlsx"], key=chave_upload)
+    chave_resultado = f"resultado_importacao_{nome_tabela}"
+    chave_arquivo = f"arquivo_importado_{nome_tabela}"
+    
+    if uploaded_file and st.session_state.get(chave_arquivo) != uploaded_file.file_id:
+        try:
+            with st.spinner("Importando planilha..."):
+                resultado = importar_excel(nome_tabela, uploaded_file)
+        except Exception as e:
+            st.error(f"❌ Falha na importação, nenhuma linha foi gravada: {e}")
+        else:
+            st.session_state[chave_arquivo] = uploaded_file.file_id
+            st.session_state[chave_resultado] = resultado
+            st.rerun()
+    
+    mostrar_resultado_importacao(chave_resultado)
+
+# ===============================
+# EXPORTAÇÃO DE PLANILHAS
+# ===============================
+EXPORTACAO_TAMANHO_LOTE = 5000
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@medido("sql")
+def exportar_excel(nome_tabela, nome_aba, data_inicio=None, data_fim=None, areas=None):
+    """Grava a tabela em um .xlsx temporário direto do cursor, em lotes e com memória constante"""
+    import xlsxwriter
+    
+    where, parametros = montar_filtro_sql(nome_tabela, data_inicio, data_fim, area=areas)
+    descritor, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(descritor)
+    
+    # Sem isso uma falha na consulta ou na escrita deixaria o .xlsx para trás no /tmp
     try:
-        city_encoded = urllib.parse.quote(cidade)
-        url = f"https://api.openweathermap.org/data/2.5/weather?q={city_encoded}&appid={API_KEY}&units=metric&lang=pt_br"
-        r = requests.get(url, timeout=10)
+        workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+        try:
+            worksheet = workbook.add_worksheet(nome_aba)
+            format_header = workbook.add_format({'bold': True, 'bg_color': '#2c3e50', 'font_color': 'white'})
+            
+            sql, parametros = consulta_particionada(nome_tabela, where, parametros, data_inicio, data_fim,
+                                                    complemento=" ORDER BY id")
+            cursor = obter_conexao().execute(sql, parametros)
+            for col_num, value in enumerate(d[0] for d in cursor.description):
+                worksheet.write(0, col_num, value, format_header)
+            
+            linha = 1
+            while True:
+                lote = cursor.fetchmany(EXPORTACAO_TAMANHO_LOTE)
+                if not lote:
+                    break
+                for registro in lote:
+                    worksheet.write_row(linha, 0, registro)
+                    linha += 1
+        finally:
+            workbook.close()
+    except Exception:
+        os.remove(caminho)
+        raise
+    
+    return caminho, linha - 1
+
+def botao_exportacao(nome_tabela, nome_aba, rotulo_botao, rotulo_download, nome_arquivo, filtros):
+    """Botão da sidebar que gera a planilha filtrada e oferece o download"""
+    if st.sidebar.button(rotulo_botao):
+        caminho, linhas = exportar_excel(nome_tabela, nome_aba, **filtros)
+        # O download_button guarda os bytes na memória do servidor (arquivo aberto também vira
+        # bytes), então o pico de memória é o tamanho do .xlsx; a geração em si é em lotes
+        try:
+            with open(caminho, "rb") as arquivo:
+                conteudo = arquivo.read()
+        finally:
+            os.remove(caminho)
+        
+        st.sidebar.caption(f"{linhas} linhas exportadas")
+        st.sidebar.download_button(rotulo_download, data=conteudo, file_name=nome_arquivo, mime=MIME_XLSX)
+
+# ===============================
+# CACHE DE CLIMA
+# ===============================
+OPENWEATHER_URL = os.environ.get("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5")
+CLIMA_TIMEOUT_S = 5
+CLIMA_MAX_PARALELO = 8
+CLIMA_CACHE_TTL_PADRAO_MIN = 30
+CLIMA_CACHE_MAX_CIDADES = 50
+CLIMA_FALHA_ESPERA_S = 60
+
+_cache_clima = OrderedDict()
+_cache_clima_lock = threading.Lock()
+_clima_atualizando = set()
+_clima_falhas = {}
+_clima_sem_previsao = set()
+
+_sessao_http = None
+_sessao_http_lock = threading.Lock()
+
+def obter_sessao_http():
+    """Sessão HTTP compartilhada, com keep-alive e novas tentativas, para a API de clima"""
+    global _sessao_http
+    with _sessao_http_lock:
+        if _sessao_http is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            tentativas = Retry(total=2, backoff_factor=0.3, allowed_methods=("GET",),
+                               status_forcelist=(429, 500, 502, 503, 504))
+            adaptador = HTTPAdapter(pool_connections=CLIMA_MAX_PARALELO, pool_maxsize=CLIMA_MAX_PARALELO,
+                                    max_retries=tentativas)
+            sessao = requests.Session()
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+            _sessao_http = sessao
+    return _sessao_http
+
+def _url_openweather(endpoint, cidade):
+    """Monta a URL de um endpoint da OpenWeatherMap para a cidade"""
+    city_encoded = urllib.parse.quote(cidade)
+    return f"{OPENWEATHER_URL}/{endpoint}?q={city_encoded}&appid={API_KEY}&units=metric&lang=pt_br"
+
+def _clima_atual_api(cidade):
+    """Busca as condições atuais de uma cidade na API"""
+    try:
+        r = obter_sessao_http().get(_url_openweather("weather", cidade), timeout=CLIMA_TIMEOUT_S)
         data = r.json()
         
         if r.status_code != 200: 
-            return None, None
+            return None
         
-        atual = {
+        return {
             "temp": float(data["main"]["temp"]),
             "umidade": float(data["main"]["humidity"]),
             "chuva": float(data.get("rain", {}).get("1h", 0) or 0.0)
         }
-        
-        # Previsão
-        url_forecast = f"https://api.openweathermap.org/data/2.5/forecast?q={city_encoded}&appid={API_KEY}&units=metric&lang=pt_br"
-        forecast = requests.get(url_forecast).json()
-        previsao = []
-        
-        if forecast.get("cod") == "200":
-            for item in forecast["list"]:
-                previsao.append({
-                    "Data": item["dt_txt"], "Temp Real (°C)": item["main"]["temp"],
-                    "Temp Média (°C)": (item["main"]["temp_min"] + item["main"]["temp_max"]) / 2,
-                    "Temp Min (°C)": item["main"]["temp_min"], "Temp Max (°C)": item["main"]["temp_max"],
-                    "Umidade (%)": item["main"]["humidity"]
-                })
-                
-        return atual, pd.DataFrame(previsao)
     except:
+        return None
+
+def _previsao_api(cidade):
+    """Busca a previsão de 5 dias (passos de 3h) de uma cidade na API (None se a consulta falhar)"""
+    previsao = []
+    try:
+        forecast = obter_sessao_http().get(_url_openweather("forecast", cidade), timeout=CLIMA_TIMEOUT_S).json()
+        
+        if str(forecast.get("cod")) != "200":
+            return None
+        for item in forecast["list"]:
+            previsao.append({
+                "Data": item["dt_txt"], "Temp Real (°C)": item["main"]["temp"],
+                "Temp Média (°C)": (item["main"]["temp_min"] + item["main"]["temp_max"]) / 2,
+                "Temp Min (°C)": item["main"]["temp_min"], "Temp Max (°C)": item["main"]["temp_max"],
+                "Umidade (%)": item["main"]["humidity"]
+            })
+    except:
+        return None
+    
+    return pd.DataFrame(previsao)
+
+def _buscar_clima_api(cidade):
+    """Busca dados climáticos direto na API"""
+    atual = _clima_atual_api(cidade)
+    if not atual:
+        return None, None
+    return atual, _previsao_api(cidade)
+
+def _guardar_clima_memoria(chave, entrada):
+    """Guarda uma entrada no cache em memória, descartando as menos usadas além do limite"""
+    with _cache_clima_lock:
+        _cache_clima[chave] = entrada
+        _cache_clima.move_to_end(chave)
+        while len(_cache_clima) > CLIMA_CACHE_MAX_CIDADES:
+            _cache_clima.popitem(last=False)
+
+def _ler_clima_disco(chave):
+    """Lê do banco a última consulta de clima salva para a cidade"""
+    linha = obter_conexao().execute(
+        "SELECT atualizado_em, atual, previsao FROM cache_clima WHERE cidade = ?", (chave,)
+    ).fetchone()
+    if not linha:
+        return None
+    return linha[0], json.loads(linha[1]), pd.DataFrame(json.loads(linha[2]))
+
+def _clima_em_cache(chave):
+    """Procura a cidade no cache em memória e, se não estiver, no banco"""
+    with _cache_clima_lock:
+        entrada = _cache_clima.get(chave)
+        if entrada:
+            _cache_clima.move_to_end(chave)
+    
+    if entrada is None:
+        entrada = _ler_clima_disco(chave)
+        if entrada:
+            _guardar_clima_memoria(chave, entrada)
+    
+    return entrada
+
+def _ttl_clima_s(ttl_min=None):
+    """Validade do cache de clima em segundos"""
+    if ttl_min is None:
+        ttl_min = config.get("clima_cache_ttl_min", CLIMA_CACHE_TTL_PADRAO_MIN)
+    return ttl_min * 60
+
+def _clima_vencido(chave, atualizado_em, ttl_min=None):
+    """Se a entrada do cache passou da validade (curta quando veio sem a previsão)"""
+    validade = CLIMA_FALHA_ESPERA_S if chave in _clima_sem_previsao else _ttl_clima_s(ttl_min)
+    return time.time() - atualizado_em > validade
+
+def _atualizar_clima(cidade):
+    """Consulta a API e, em caso de sucesso, grava o resultado na memória e no banco"""
+    return _salvar_clima(cidade, *_buscar_clima_api(cidade))
+
+def _salvar_clima(cidade, atual, previsao):
+    """Registra o resultado de uma consulta de clima (ou a falha) no cache"""
+    chave = cidade.strip().lower()
+    
+    if not atual:
+        _clima_falhas[chave] = time.time()
+        return None, None
+    
+    _clima_falhas.pop(chave, None)
+    agora = time.time()
+    if previsao is None:
+        # Só a previsão falhou: mantém a última previsão boa (os alertas continuam), sem gravar
+        # no banco e com validade curta, para tentar de novo logo
+        _clima_sem_previsao.add(chave)
+        anterior = _clima_em_cache(chave)
+        previsao = anterior[2] if anterior else pd.DataFrame()
+        _guardar_clima_memoria(chave, (agora, atual, previsao))
+        return atual, previsao.copy()
+    
+    _clima_sem_previsao.discard(chave)
+    _guardar_clima_memoria(chave, (agora, atual, previsao))
+    with transacao() as conn:
+        conn.execute("""
+            INSERT INTO cache_clima (cidade, atualizado_em, atual, previsao) VALUES (?, ?, ?, ?)
+            ON CONFLICT(cidade) DO UPDATE SET atualizado_em = excluded.atualizado_em,
+                                              atual = excluded.atual, previsao = excluded.previsao
+        """, (chave, agora, json.dumps(atual), json.dumps(previsao.to_dict("records"))))
+        conn.execute("""
+            DELETE FROM cache_clima WHERE cidade NOT IN (
+                SELECT cidade FROM cache_clima ORDER BY atualizado_em DESC LIMIT ?
+            )
+        """, (CLIMA_CACHE_MAX_CIDADES,))
+    
+    return atual, previsao.copy()
+
+def _atualizar_clima_em_segundo_plano(cidade):
+    """Dispara a atualização do clima sem bloquear a página (uma por cidade)"""
+    chave = cidade.strip().lower()
+    with _cache_clima_lock:
+        if chave in _clima_atualizando:
+            return
+        _clima_atualizando.add(chave)
+    
+    def tarefa():
+        try:
+            _atualizar_clima(cidade)
+        finally:
+            with _cache_clima_lock:
+                _clima_atualizando.discard(chave)
+    
+    threading.Thread(target=tarefa, daemon=True).start()
+
+@medido("clima")
+def buscar_clima(cidade, ttl_min=None):
+    """Busca dados climáticos, servindo do cache enquanto estiverem dentro da validade"""
+    if not cidade or not cidade.strip():
+        return None, None
+    
+    chave = cidade.strip().lower()
+    entrada = _clima_em_cache(chave)
+    
+    if entrada:
+        atualizado_em, atual, previsao = entrada
+        if _clima_vencido(chave, atualizado_em, ttl_min):
+            # Dado vencido: devolve o que já tem e atualiza em segundo plano
+            _atualizar_clima_em_segundo_plano(cidade)
+        return atual, previsao.copy()
+    
+    # Sem dado nenhum: evita repetir a espera a cada interação se a API acabou de falhar
+    if time.time() - _clima_falhas.get(chave, 0) < CLIMA_FALHA_ESPERA_S:
         return None, None
+    
+    return _atualizar_clima(cidade)
+
+# ===============================
+# CLIMA DE VÁRIAS CIDADES
+# ===============================
+COLUNAS_CLIMA_CIDADES = ["Cidade", "Tipo", "Data", "Temp Real (°C)", "Temp Média (°C)",
+                         "Temp Min (°C)", "Temp Max (°C)", "Umidade (%)", "Chuva (mm)"]
+
+@medido("clima")
+def buscar_clima_cidades(cidades, ttl_min=None):
+    """Busca clima atual e previsão de várias cidades em paralelo e junta tudo em um DataFrame"""
+    cidades = list(dict.fromkeys(c.strip() for c in cidades if c and c.strip()))
+    resultados, pendentes = {}, []
+    agora = time.time()
+    
+    for cidade in cidades:
+        chave = cidade.lower()
+        entrada = _clima_em_cache(chave)
+        if entrada and not _clima_vencido(chave, entrada[0], ttl_min):
+            resultados[cidade] = (entrada[1], entrada[2].copy())
+        elif agora - _clima_falhas.get(chave, 0) >= CLIMA_FALHA_ESPERA_S:
+            pendentes.append(cidade)
+        elif entrada:
+            resultados[cidade] = (entrada[1], entrada[2].copy())
+    
+    if pendentes:
+        # Atual e previsão de todas as cidades disparados juntos sobre a mesma sessão
+        with ThreadPoolExecutor(max_workers=min(CLIMA_MAX_PARALELO, 2 * len(pendentes))) as executor:
+            atuais = {c: executor.submit(_clima_atual_api, c) for c in pendentes}
+            previsoes = {c: executor.submit(_previsao_api, c) for c in pendentes}
+            buscados = {c: (atuais[c].result(), previsoes[c].result()) for c in pendentes}
+        
+        with transacao():
+            for cidade, (atual, previsao) in buscados.items():
+                atual, previsao = _salvar_clima(cidade, atual, previsao)
+                if atual:
+                    resultados[cidade] = (atual, previsao)
+    
+    partes = []
+    momento = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for cidade in cidades:
+        if cidade not in resultados:
+            continue
+        atual, previsao = resultados[cidade]
+        partes.append(pd.DataFrame([{
+            "Cidade": cidade, "Tipo": "Atual", "Data": momento, "Temp Real (°C)": atual["temp"],
+            "Umidade (%)": atual["umidade"], "Chuva (mm)": atual["chuva"]
+        }]))
+        if not previsao.empty:
+            partes.append(previsao.assign(Cidade=cidade, Tipo="Previsão"))
+    
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_CLIMA_CIDADES)
+    return pd.concat(partes, ignore_index=True).reindex(columns=COLUNAS_CLIMA_CIDADES)
+
+# ===============================
+# ÍNDICE FENOLÓGICO
+# ===============================
+ESTAGIO_NAO_ESPECIFICADO = "Não especificado"
+ESTAGIO_DATA_INVALIDA = "Data inválida"
+ESTAGIO_CONCLUIDO = "Colheita concluída"
+
+_indice_fenologia = {"chave": None, "indice": None}
+
+def compilar_estagios(estagios):
+    """Converte a lista de estágios ("dias": "0-30") em limites ordenados para busca binária"""
+    intervalos = []
+    for ordem, estagio in enumerate(estagios):
+        partes = str(estagio.get("dias", "")).split("-")
+        try:
+            inicio, fim = int(partes[0]), int(partes[1])
+        except (ValueError, IndexError):
+            continue
+        if len(partes) == 2 and inicio <= fim:
+            intervalos.append((inicio, fim + 1, ordem, estagio["nome"]))
+    
+    # Segmentos elementares entre todos os limites; em sobreposições vale o primeiro estágio da lista
+    limites = sorted({p for inicio, fim, _, _ in intervalos for p in (inicio, fim)})
+    rotulos = []
+    for inicio_segmento in limites[:-1]:
+        cobrindo = [(ordem, nome) for inicio, fim, ordem, nome in intervalos if inicio <= inicio_segmento < fim]
+        rotulos.append(min(cobrindo)[1] if cobrindo else None)
+    
+    return np.array(limites, dtype=np.int64), rotulos
+
+def obter_indice_fenologia():
+    """Índice compilado por espécie (None = padrão), refeito só quando a fenologia muda"""
+    estagios_padrao = config.get("fenologia_padrao", {}).get("estagios", [])
+    chave = (versoes_tabelas("fenologia_especies"), json.dumps(estagios_padrao, sort_keys=True, default=str))
+    
+    if _indice_fenologia["chave"] != chave:
+        indice = {None: compilar_estagios(estagios_padrao)}
+        for especie, estagios in carregar_fenologia_especies().items():
+            indice[especie] = compilar_estagios(estagios)
+        _indice_fenologia.update(chave=chave, indice=indice)
+    
+    return _indice_fenologia["indice"]
+
+def calcular_estagios_fenologicos(datas_plantio, especies=None, referencia=None):
+    """Rotula uma coluna de datas de plantio (e espécies) com o estágio fenológico em uma chamada"""
+    indice_original = datas_plantio.index if isinstance(datas_plantio, pd.Series) else None
+    datas_plantio = pd.Series(datas_plantio).reset_index(drop=True)
+    especies = pd.Series(especies if especies is not None else [None] * len(datas_plantio)).reset_index(drop=True)
+    indice = obter_indice_fenologia()
+    
+    datas = pd.to_datetime(datas_plantio, format="%Y-%m-%d", errors="coerce")
+    dias = (pd.Timestamp(referencia or datetime.now()) - datas).dt.days.to_numpy()
+    vazias = datas_plantio.isna() | datas_plantio.astype(str).str.strip().eq("")
+    estagios = np.where(vazias, ESTAGIO_NAO_ESPECIFICADO, ESTAGIO_DATA_INVALIDA).astype(object)
+    validas = datas.notna().to_numpy()
+    
+    # Um searchsorted por espécie distinta, não por linha
+    codigos, unicas = pd.factorize(especies)
+    for codigo in range(-1, len(unicas)):
+        especie = unicas[codigo] if codigo >= 0 else None
+        limites, rotulos = indice.get(especie, indice[None])
+        linhas = np.flatnonzero((codigos == codigo) & validas)
+        if len(linhas) == 0:
+            continue
+        
+        posicoes = np.searchsorted(limites, dias[linhas], side="right") - 1
+        rotulos_linhas = np.full(len(linhas), ESTAGIO_CONCLUIDO, dtype=object)
+        dentro = (posicoes >= 0) & (posicoes < len(rotulos))
+        if dentro.any():
+            encontrados = np.array(rotulos + [None], dtype=object)[posicoes[dentro]]
+            rotulos_linhas[dentro] = np.where(pd.isna(encontrados), ESTAGIO_CONCLUIDO, encontrados)
+        estagios[linhas] = rotulos_linhas
+    
+    return pd.Series(estagios, index=indice_original)
 
 def calcular_estagio_fenologico(data_plantio, especie=None):
     """Calcula o estágio fenológico com base na data de plantio"""
     if not data_plantio:
-        return "Não especificado"
-        
-    try:
-        dias = (datetime.now() - datetime.strptime(data_plantio, "%Y-%m-%d")).days
-        estagios = config["fenologia_padrao"]["estagios"]
-        
-        if especie and especie in fenologia_especies:
-            estagios = fenologia_especies[especie]
-        
-        for estagio in estagios:
-            dias_range = estagio["dias"].split("-")
-            if len(dias_range) == 2 and dias >= int(dias_range[0]) and dias <= int(dias_range[1]):
-                return estagio["nome"]
-                
-        return "Colheita concluída"
-    except:
-        return "Data inválida"
+        return ESTAGIO_NAO_ESPECIFICADO
+    
+    return calcular_estagios_fenologicos([data_plantio], [especie]).iloc[0]
 
 def recomendar_adubacao(estagio, especie=None):
     """Retorna recomendação de adubação baseada no estágio fenológico"""
@@ -335,29 +1848,98 @@ def calcular_receita_cultura(caixas_primeira, caixas_segunda, cultura):
     preco_segunda = obter_preco_cultura(cultura, "segunda")
     return (caixas_primeira * preco_primeira) + (caixas_segunda * preco_segunda)
 
+def precos_padrao():
+    """Par (1ª, 2ª) de preços usado para culturas sem preço cadastrado"""
+    return config.get("preco_padrao_primeira", 30.0), config.get("preco_padrao_segunda", 15.0)
+
+def calcular_receita_linhas(df_prod):
+    """Calcula a receita de 1ª, 2ª e total de cada linha de produção"""
+    return analise.receita_linhas(df_prod, precos_culturas, precos_padrao())
+
+def calcular_receitas(df_prod):
+    """Calcula a receita por linha, por cultura, por área e os totais de uma vez"""
+    return analise.receitas(df_prod, precos_culturas, precos_padrao())
+
 def calcular_receita_total(df_prod):
     """Calcula a receita total considerando preços diferentes por cultura"""
     if df_prod.empty:
         return 0, 0, 0
     
-    receita_primeira = 0
-    receita_segunda = 0
-    
-    for _, row in df_prod.iterrows():
-        cultura = row['cultura']
-        if cultura and cultura.strip():
-            preco_primeira = obter_preco_cultura(cultura, "primeira")
-            preco_segunda = obter_preco_cultura(cultura, "segunda")
-            receita_primeira += row['caixas'] * preco_primeira
-            receita_segunda += row['caixas_segunda'] * preco_segunda
-    
-    return receita_primeira, receita_segunda, receita_primeira + receita_segunda
+    receitas = calcular_receitas(df_prod)
+    return receitas['primeira'], receitas['segunda'], receitas['total']
+
+def receita_por_cultura_grafico(receitas):
+    """Formata a receita por cultura para os gráficos de barras empilhadas"""
+    return analise.receita_por_cultura_grafico(receitas)
+
+def calcular_rentabilidade(df_prod, df_ins, chaves='cultura'):
+    """Calcula receita, custo, lucro e ROI por cultura (ou área / área×cultura) em um único groupby"""
+    return analise.rentabilidade(df_prod, df_ins, precos_culturas, precos_padrao(), chaves)
 
 def calcular_lucro(df_prod, custos):
     """Calcula o lucro considerando preços diferentes por cultura"""
     _, _, receita_total = calcular_receita_total(df_prod)
     return receita_total - custos
 
+# ===============================
+# KPIs EM SQL
+# ===============================
+# Os números do cabeçalho são somas: saem dos resumos diários direto no SQL, com o preço
+# de precos_culturas (ou o padrão da configuração), sem carregar linhas no pandas
+_CULTURA_VALIDA_SQL = "trim(COALESCE(p.cultura, ''), char(32, 9, 10, 11, 12, 13)) <> ''"
+
+@medido("sql")
+def carregar_kpis(data_inicio=None, data_fim=None, areas=None, culturas=None, tipos=None):
+    """KPIs do cabeçalho (mesmas chaves de analise.kpis) calculados por agregação no SQL"""
+    # Os resumos têm data, área, cultura e tipo: os mesmos filtros das tabelas de origem servem
+    where_prod, parametros_prod = montar_filtro_sql("producao", data_inicio, data_fim, area=areas, cultura=culturas)
+    where_ins, parametros_ins = montar_filtro_sql("insumos", data_inicio, data_fim, tipo=tipos)
+    padrao_primeira, padrao_segunda = precos_padrao()
+    
+    # Soma por cultura antes do join: o preço é aplicado uma vez por cultura, não por linha
+    sql_producao = f"""
+        SELECT TOTAL(p.caixas), TOTAL(p.caixas_segunda),
+               TOTAL(CASE WHEN {_CULTURA_VALIDA_SQL} THEN p.caixas *
+                     (CASE WHEN pc.cultura IS NULL THEN ? ELSE pc.preco_primeira END) END),
+               TOTAL(CASE WHEN {_CULTURA_VALIDA_SQL} THEN p.caixas_segunda *
+                     (CASE WHEN pc.cultura IS NULL THEN ? ELSE pc.preco_segunda END) END)
+        FROM (SELECT cultura, SUM(caixas) AS caixas, SUM(caixas_segunda) AS caixas_segunda
+              FROM producao_diaria{where_prod} GROUP BY cultura) p
+        LEFT JOIN precos_culturas pc ON pc.cultura = p.cultura
+    """
+    parametros_prod = [padrao_primeira, padrao_segunda] + parametros_prod
+    sql_insumos = f"SELECT TOTAL(custo_total) FROM insumos_diario{where_ins}"
+    
+    def carregar():
+        conn = obter_conexao()
+        caixas, caixas_segunda, receita_primeira, receita_segunda = conn.execute(sql_producao, parametros_prod).fetchone()
+        custo = conn.execute(sql_insumos, parametros_ins).fetchone()[0]
+        return analise.kpis_dos_totais(caixas, caixas_segunda, custo, receita_primeira, receita_segunda)
+    
+    chave = ("kpis", where_prod, tuple(parametros_prod), where_ins, tuple(parametros_ins))
+    return leitura_em_cache(chave, ("producao", "insumos", "precos_culturas"), carregar)
+
+# ===============================
+# ANÁLISES
+# ===============================
+# Os cálculos ficam em analise.py (sem Streamlit); aqui só se carregam os dados e os
+# parâmetros da configuração, para as páginas e o precalcular.py usarem o mesmo caminho
+def analisar_dashboard():
+    """KPIs e agregações do dashboard a partir dos resumos diários"""
+    return analise.analise_dashboard(carregar_resumo_producao(), carregar_resumo_insumos(),
+                                     precos_culturas, precos_padrao(),
+                                     config.get("alerta_pct_segunda", 25))
+
+def analisar_periodo(data_inicio=None, data_fim=None, areas=None, culturas=None, tipos=None):
+    """KPIs, rentabilidade, tendências e insights da produção e dos insumos filtrados"""
+    # Tipos compactos: categorias nos agrupamentos e a data já convertida
+    df_prod = carregar_tabela_compacta("producao", data_inicio, data_fim, area=areas, cultura=culturas)
+    df_ins = carregar_tabela_compacta("insumos", data_inicio, data_fim, tipo=tipos)
+    # Correlação (com defasagens) a partir das estatísticas suficientes, sem .corr() nas linhas
+    estatisticas = carregar_estatisticas_clima(data_inicio, data_fim, areas=areas, culturas=culturas)
+    return analise.analise_periodo(df_prod, df_ins, precos_culturas, precos_padrao(),
+                                   config.get("alerta_pct_segunda", 25), estatisticas_clima=estatisticas)
+
 # ===============================
 # DADOS AGRONÔMICOS
 # ===============================
@@ -487,6 +2069,63 @@ def verificar_alertas_sanitarios(cultura, dados_clima):
     
     return alertas
 
+@medido("sql")
+def carregar_culturas_por_area():
+    """Pares área×cultura em andamento: a cultura do registro mais recente de cada área"""
+    return pd.read_sql("""
+        SELECT d.area, d.cultura FROM producao_diaria d
+        JOIN (SELECT area, MAX(data) AS data FROM producao_diaria
+              WHERE TRIM(cultura) <> '' AND area <> '' GROUP BY area) u
+          ON d.area = u.area AND d.data = u.data
+        WHERE TRIM(d.cultura) <> ''
+        GROUP BY d.area, d.cultura
+    """, obter_conexao())
+
+def avaliar_regras_agronomicas(pares, previsao):
+    """Avalia os limites de DADOS_AGRONOMICOS para todos os pares área×cultura e passos da previsão de uma vez"""
+    colunas = ['area', 'cultura', 'data', 'temperatura', 'umidade', 'regra', 'alerta']
+    if pares.empty or previsao is None or previsao.empty:
+        return pd.DataFrame(columns=colunas)
+    
+    limites = pd.DataFrame([{
+        'cultura': cultura,
+        'temp_min': dados['temp_ideal'][0], 'temp_max': dados['temp_ideal'][1],
+        'umid_min': dados['umidade_ideal'][0], 'umid_max': dados['umidade_ideal'][1],
+        'doencas': ', '.join(dados['doencas_comuns'][:2]),
+        'pragas': ', '.join(dados['pragas_comuns'][:2])
+    } for cultura, dados in DADOS_AGRONOMICOS.items()])
+    
+    passos = pd.DataFrame({
+        'data': previsao['Data'],
+        'temperatura': pd.to_numeric(previsao['Temp Real (°C)'], errors='coerce'),
+        'umidade': pd.to_numeric(previsao['Umidade (%)'], errors='coerce')
+    })
+    
+    # Culturas sem dados agronômicos ficam de fora (como nas funções individuais)
+    grade = pares[['area', 'cultura']].merge(limites, on='cultura').merge(passos, how='cross')
+    t, u = grade['temperatura'], grade['umidade']
+    
+    regras = {
+        'Temperatura baixa': (t < grade['temp_min'], "🌡️ Temperatura baixa (" + t.round(1).astype(str) + "°C) - considerar aquecimento ou cobertura"),
+        'Temperatura alta': (t > grade['temp_max'], "🌡️ Temperatura alta (" + t.round(1).astype(str) + "°C) - aumentar ventilação/sombreamento"),
+        'Umidade baixa': (u < grade['umid_min'], "💧 Umidade baixa (" + u.round(0).astype(str) + "%) - aumentar irrigação"),
+        'Umidade alta': (u > grade['umid_max'], "💧 Umidade alta (" + u.round(0).astype(str) + "%) - risco de doenças, melhorar ventilação"),
+        'Doenças fúngicas': (u > 80, "⚠️ Condições favoráveis para doenças fúngicas: " + grade['doencas']),
+        'Pragas': ((t > 28) & (u > 70), "⚠️ Condições ideais para pragas: " + grade['pragas'])
+    }
+    
+    alertas = [grade.loc[mascara, ['area', 'cultura', 'data', 'temperatura', 'umidade']].assign(regra=regra, alerta=mensagem[mascara])
+               for regra, (mascara, mensagem) in regras.items() if mascara.any()]
+    if not alertas:
+        return pd.DataFrame(columns=colunas)
+    
+    return pd.concat(alertas, ignore_index=True).sort_values(['data', 'area', 'regra'], ignore_index=True)[colunas]
+
+def gerar_alertas_previsao(cidade=None):
+    """Tabela de alertas de todas as áreas em andamento para a previsão de 5 dias da cidade"""
+    _, previsao = buscar_clima(cidade or config.get("cidade", CIDADE_PADRAO))
+    return avaliar_regras_agronomicas(carregar_culturas_por_area(), previsao)
+
 def calcular_otimizacao_espaco(estufa_area, cultura):
     """Calcula otimização de espaço para a cultura"""
     if cultura not in DADOS_AGRONOMICOS:
@@ -510,8 +2149,8 @@ def mostrar_modulo_agronomico():
     """Interface do módulo agronômico"""
     st.title("🌿 Recomendações Agronômicas Inteligentes")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Calculadora de Produção", "Recomendações de Manejo", 
-                                    "Alertas Sanitários", "Otimização de Espaço"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Calculadora de Produção", "Recomendações de Manejo", 
+                                          "Alertas Sanitários", "Otimização de Espaço", "Alertas da Previsão"])
     
     with tab1:
         st.header("📊 Calculadora de Produção Esperada")
@@ -615,14 +2254,34 @@ def mostrar_modulo_agronomico():
                 - 💰 Receita estimada: R$ {receita_total:,.2f}
                 - 📏 Espaçamento: {resultado['espacamento_recomendado']}
                 - 📊 Rendimento: {resultado['rendimento_por_m2']} kg/m²""")
+    
+    with tab5:
+        st.header("🗓️ Alertas da Previsão por Área")
+        st.info("Condições previstas para os próximos 5 dias comparadas com a cultura atual de cada área")
+        
+        alertas = gerar_alertas_previsao()
+        if alertas.empty:
+            st.success("✅ Nenhum alerta previsto para as áreas em produção")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                regras_filtro = st.multiselect("Tipos de alerta", options=sorted(alertas['regra'].unique()))
+            with col2:
+                areas_filtro = st.multiselect("Áreas", options=sorted(alertas['area'].unique()), key="areas_alerta_previsao")
+            
+            if regras_filtro: alertas = alertas[alertas['regra'].isin(regras_filtro)]
+            if areas_filtro: alertas = alertas[alertas['area'].isin(areas_filtro)]
+            
+            resumo = alertas.pivot_table(index='area', columns='regra', values='data', aggfunc='count', fill_value=0)
+            st.dataframe(resumo, use_container_width=True)
+            st.dataframe(alertas, use_container_width=True)
 
 def adicionar_recomendacoes_dashboard():
     """Adiciona cards de recomendação ao dashboard principal"""
-    df_prod = carregar_tabela("producao")
+    ultimo_registro = carregar_ultimo_registro("producao")
     
-    if not df_prod.empty:
+    if ultimo_registro is not None:
         st.subheader("🌿 Recomendações Agronômicas")
-        ultimo_registro = df_prod.iloc[-1]
         cultura = ultimo_registro['cultura']
         
         if cultura and cultura.strip() and cultura in DADOS_AGRONOMICOS:
@@ -654,91 +2313,203 @@ def adicionar_recomendacoes_dashboard():
         else:
             st.info("ℹ️ Selecione uma cultura válida para ver recomendações")
 
+# ===============================
+# GRÁFICOS
+# ===============================
+class _GraficosMedidos:
+    """Acesso ao plotly.express (importado no primeiro uso) que cronometra cada gráfico no modo de perfil"""
+    def __getattr__(self, nome):
+        import plotly.express as px
+        
+        funcao = getattr(px, nome)
+        if not callable(funcao):
+            return funcao
+        
+        @functools.wraps(funcao)
+        def grafico(*args, **kwargs):
+            with medir("grafico", f"px.{nome}"):
+                return funcao(*args, **kwargs)
+        return grafico
+
+def graficos_medidos():
+    """Substituto do "import plotly.express as px" nas páginas"""
+    return _GraficosMedidos()
+
+def mostrar_grafico(fig):
+    """Envia o gráfico para a página (a serialização da figura entra no perfil)"""
+    with medir("grafico", "st.plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+# Acima disso a série vai reduzida (LTTB) e em WebGL; mais pontos que pixels não aparecem na tela
+GRAFICO_MAX_PONTOS = 1000
+
+def _rotulo_eixo(valor):
+    """Texto curto de um ponto do eixo x para o seletor de período"""
+    return valor.strftime("%d/%m/%Y") if hasattr(valor, "strftime") else str(valor)
+
+def _filtrar_periodo_serie(df, x, chave):
+    """Slider do período do gráfico: só as pontas vão para o navegador, não cada ponto do eixo"""
+    eixo = df[x]
+    rotulo = "🔍 Período do gráfico"
+    if pd.api.types.is_datetime64_any_dtype(eixo):
+        minimo, maximo = eixo.min().date(), eixo.max().date()
+        inicio, fim = st.slider(rotulo, min_value=minimo, max_value=maximo, value=(minimo, maximo),
+                                step=timedelta(days=1), format="DD/MM/YYYY", key=f"zoom_{chave}")
+        return df[(eixo >= pd.Timestamp(inicio)) & (eixo < pd.Timestamp(fim) + pd.Timedelta(days=1))]
+    if pd.api.types.is_numeric_dtype(eixo):
+        minimo, maximo = float(eixo.min()), float(eixo.max())
+        inicio, fim = st.slider(rotulo, min_value=minimo, max_value=maximo, value=(minimo, maximo),
+                                key=f"zoom_{chave}")
+        return df[(eixo >= inicio) & (eixo <= fim)]
+    
+    # Eixo de texto (meses AAAA-MM...): o slider anda pelas posições e a legenda mostra os valores
+    inicio, fim = st.slider(rotulo, min_value=0, max_value=len(df) - 1, value=(0, len(df) - 1),
+                            key=f"zoom_{chave}")
+    st.caption(f"De {_rotulo_eixo(eixo.iloc[inicio])} a {_rotulo_eixo(eixo.iloc[fim])}")
+    return df.iloc[inicio:fim + 1]
+
+def mostrar_serie(df, x, y, chave, **kwargs):
+    """Gráfico de linha que reduz séries longas e deixa aproximar um período em resolução total"""
+    px = graficos_medidos()
+    
+    df = df.sort_values(x)
+    total = len(df)
+    if total > GRAFICO_MAX_PONTOS:
+        # O seletor é o "zoom": quanto menor o período, menos a série precisa ser reduzida
+        df = _filtrar_periodo_serie(df, x, chave)
+        total = len(df)
+    
+    reduzida = analise.reduzir_serie(df, x, y, GRAFICO_MAX_PONTOS)
+    if total > GRAFICO_MAX_PONTOS:
+        kwargs.setdefault("render_mode", "webgl")
+    
+    mostrar_grafico(px.line(reduzida, x=x, y=y, **kwargs))
+    if len(reduzida) < total:
+        st.caption(f"Mostrando {len(reduzida)} de {total} pontos; escolha um período menor para ver todos")
+
+# ===============================
+# GRADES PAGINADAS
+# ===============================
+def _avancar_pagina(chave, cursor):
+    st.session_state[chave]["cursores"].append(cursor)
+
+def _voltar_pagina(chave):
+    if len(st.session_state[chave]["cursores"]) > 1:
+        st.session_state[chave]["cursores"].pop()
+
+def grade_paginada(nome_tabela, chave, tamanho, **filtros):
+    """Carrega a página atual de uma grade (keyset por data/id) e desenha a navegação"""
+    # Mudou o filtro: volta para a primeira página
+    assinatura = json.dumps(filtros, sort_keys=True, default=str)
+    estado = st.session_state.get(chave)
+    if estado is None or estado["filtros"] != assinatura:
+        estado = st.session_state[chave] = {"filtros": assinatura, "cursores": [None]}
+    
+    df = carregar_pagina(nome_tabela, tamanho + 1, estado["cursores"][-1], **filtros)
+    tem_proxima = len(df) > tamanho
+    df = df.head(tamanho)
+    
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{chave}_anterior", disabled=len(estado["cursores"]) == 1,
+                  on_click=_voltar_pagina, args=(chave,))
+    with col2:
+        # Linha sem data vira cursor (None, id): carregar_pagina segue só pelas sem data
+        ultima_data = df["data"].iloc[-1]
+        proximo_cursor = (None if pd.isna(ultima_data) else ultima_data, int(df["id"].iloc[-1])) if tem_proxima else None
+        st.button("Próxima ➡️", key=f"{chave}_proxima", disabled=not tem_proxima,
+                  on_click=_avancar_pagina, args=(chave, proximo_cursor))
+    with col3:
+        st.caption(f"Página {len(estado['cursores'])}")
+    
+    return df
+
+def seletor_exclusao(nome_tabela, chave, rotulo):
+    """Multiselect de IDs alimentado por busca: só os candidatos encontrados vão para o navegador"""
+    termo = st.text_input("🔎 Buscar por ID, data (AAAA-MM-DD), área ou cultura", key=f"{chave}_busca")
+    candidatos = buscar_candidatos_exclusao(nome_tabela, termo)
+    
+    # Rótulos dos IDs já selecionados ficam guardados para continuarem visíveis em outra busca
+    rotulos = st.session_state.setdefault(f"{chave}_rotulos", {})
+    for registro in candidatos.itertuples(index=False, name=None):
+        rotulos[registro[0]] = " · ".join(str(v) for v in registro if pd.notna(v) and str(v).strip())
+    
+    # Descarta da seleção os IDs que já foram excluídos
+    selecionados = st.session_state.get(chave, [])
+    if selecionados:
+        existentes = set(carregar_tabela_filtrada(nome_tabela, ids=selecionados)["id"])
+        selecionados = st.session_state[chave] = [i for i in selecionados if i in existentes]
+    opcoes = list(dict.fromkeys(selecionados + candidatos["id"].tolist()))
+    if len(candidatos) == LIMITE_CANDIDATOS_EXCLUSAO:
+        st.caption(f"Mostrando os {LIMITE_CANDIDATOS_EXCLUSAO} registros mais recentes encontrados; refine a busca para ver outros")
+    
+    return st.multiselect(rotulo, opcoes, key=chave, format_func=lambda i: rotulos.get(i, str(i)))
+
 # ===============================
 # PÁGINAS PRINCIPAIS
 # ===============================
 def pagina_dashboard():
     """Página principal do dashboard"""
-    st.title("🌱 Dashboard de Produção")
+    px = graficos_medidos()
     
-    df_prod = carregar_tabela("producao")
-    df_ins = carregar_tabela("insumos")
+    st.title("🌱 Dashboard de Produção")
     
     # KPIs principais - COM PREÇOS ESPECÍFICOS POR CULTURA
+    # Somados no SQL: aparecem na tela antes das agregações dos gráficos
+    kpis = carregar_kpis()
+    
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        total_caixas = df_prod["caixas"].sum() if not df_prod.empty else 0
-        st.metric("📦 Caixas 1ª Qualidade", f"{total_caixas:.0f}")
+        st.metric("📦 Caixas 1ª Qualidade", f"{kpis['caixas']:.0f}")
     
     with col2:
-        total_segunda = df_prod["caixas_segunda"].sum() if not df_prod.empty else 0
-        st.metric("🔄 Caixas 2ª Qualidade", f"{total_segunda:.0f}")
+        st.metric("🔄 Caixas 2ª Qualidade", f"{kpis['caixas_segunda']:.0f}")
     
     with col3:
-        total_insumos = df_ins["custo_total"].sum() if not df_ins.empty else 0
-        st.metric("💰 Custo Insumos", f"R$ {total_insumos:,.2f}")
+        st.metric("💰 Custo Insumos", f"R$ {kpis['custo_insumos']:,.2f}")
     
     with col4:
-        receita_primeira, receita_segunda, receita_total = calcular_receita_total(df_prod)
-        st.metric("💵 Receita Total", f"R$ {receita_total:,.2f}")
+        st.metric("💵 Receita Total", f"R$ {kpis['receita_total']:,.2f}")
     
     with col5:
-        lucro_total = receita_total - total_insumos
-        st.metric("📊 Lucro Total", f"R$ {lucro_total:,.2f}", 
-                 delta=f"{((lucro_total/receita_total)*100 if receita_total > 0 else 0):.1f}%")
+        st.metric("📊 Lucro Total", f"R$ {kpis['lucro']:,.2f}", delta=f"{kpis['margem_pct']:.1f}%")
+    
+    # Resumos diários em vez do histórico completo; os cálculos vêm prontos do analise.py
+    with st.spinner("Carregando gráficos..."):
+        resultado = analisar_dashboard()
     
     # Gráfico de Receitas Separadas
     st.subheader("💰 Distribuição de Receitas")
     
-    if not df_prod.empty:
+    if 'producao_diaria' in resultado:
         receitas_data = pd.DataFrame({
             'Tipo': ['1ª Qualidade', '2ª Qualidade', 'Custos'],
-            'Valor (R$)': [receita_primeira, receita_segunda, -total_insumos],
+            'Valor (R$)': [kpis['receita_primeira'], kpis['receita_segunda'], -kpis['custo_insumos']],
             'Categoria': ['Receita', 'Receita', 'Custo']
         })
         
         fig = px.bar(receitas_data, x='Tipo', y='Valor (R$)', color='Categoria',
                     title='Receitas e Custos por Categoria', text='Valor (R$)')
         fig.update_traces(texttemplate='R$ %{y:,.2f}', textposition='outside')
-        st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico(fig)
     
     # Receita por Cultura
     st.subheader("🌱 Receita por Cultura")
     
-    if not df_prod.empty:
-        receitas_culturas = []
-        for cultura in df_prod['cultura'].unique():
-            if cultura and cultura.strip():
-                df_cultura = df_prod[df_prod['cultura'] == cultura]
-                rec_primeira, rec_segunda, rec_total = calcular_receita_total(df_cultura)
-                receitas_culturas.append({
-                    'Cultura': cultura,
-                    'Receita 1ª': rec_primeira,
-                    'Receita 2ª': rec_segunda,
-                    'Receita Total': rec_total
-                })
-        
-        if receitas_culturas:
-            df_receitas = pd.DataFrame(receitas_culturas)
-            fig = px.bar(df_receitas, x='Cultura', y=['Receita 1ª', 'Receita 2ª'],
-                        title='Receita por Cultura', barmode='stack')
-            st.plotly_chart(fig, use_container_width=True)
+    if not resultado['receita_por_cultura'].empty:
+        fig = px.bar(resultado['receita_por_cultura'], x='Cultura', y=['Receita 1ª', 'Receita 2ª'],
+                    title='Receita por Cultura', barmode='stack')
+        mostrar_grafico(fig)
     
     # Alertas
     st.subheader("⚠️ Alertas e Recomendações")
     
-    if not df_prod.empty:
-        df_prod["pct_segunda"] = np.where(
-            (df_prod["caixas"] + df_prod["caixas_segunda"]) > 0,
-            df_prod["caixas_segunda"] / (df_prod["caixas"] + df_prod["caixas_segunda"]) * 100, 0
-        )
-        
-        alta_segunda = df_prod[df_prod["pct_segunda"] > config.get("alerta_pct_segunda", 25)]
-        if not alta_segunda.empty:
-            st.warning(f"Alto percentual de 2ª qualidade ({alta_segunda['pct_segunda'].mean():.1f}%)")
+    if 'producao_diaria' in resultado:
+        if resultado['pct_segunda_alta'] is not None:
+            st.warning(f"Alto percentual de 2ª qualidade ({resultado['pct_segunda_alta']:.1f}%)")
         
-        ultimo_clima = df_prod.iloc[-1]
+        ultimo_clima = carregar_ultimo_registro("producao")
         if ultimo_clima is not None and ultimo_clima["umidade"] > 85:
             st.error("Alerta: Umidade muito alta, risco de doenças fúngicas!")
         if ultimo_clima is not None and ultimo_clima["temperatura"] < 10:
@@ -747,49 +2518,52 @@ def pagina_dashboard():
     # Gráficos resumos
     st.subheader("📊 Visão Geral")
     
-    if not df_prod.empty:
+    if 'producao_diaria' in resultado:
         col1, col2 = st.columns(2)
         
         with col1:
-            if "area" in df_prod.columns:
-                prod_area = df_prod.groupby("area")[["caixas", "caixas_segunda"]].sum().reset_index()
-                if not prod_area.empty:
-                    fig = px.bar(prod_area, x="area", y=["caixas", "caixas_segunda"], 
-                                title="Produção por Área", barmode="group")
-                    st.plotly_chart(fig, use_container_width=True)
+            fig = px.bar(resultado['producao_por_area'], x="area", y=["caixas", "caixas_segunda"], 
+                        title="Produção por Área", barmode="group")
+            mostrar_grafico(fig)
         
         with col2:
-            if "data" in df_prod.columns:
-                df_prod["data"] = pd.to_datetime(df_prod["data"])
-                prod_temporal = df_prod.groupby("data")[["caixas", "caixas_segunda"]].sum().reset_index()
-                if not prod_temporal.empty:
-                    fig = px.line(prod_temporal, x="data", y=["caixas", "caixas_segunda"], 
-                                 title="Evolução da Produção", markers=True)
-                    st.plotly_chart(fig, use_container_width=True)
-    
-    if not df_ins.empty:
+            mostrar_serie(resultado['producao_diaria'], "data", ["caixas", "caixas_segunda"],
+                          "evolucao_producao", title="Evolução da Produção", markers=True)
+    
+    if 'custos_por_tipo' in resultado:
         col1, col2 = st.columns(2)
         
         with col1:
-            custos_tipo = df_ins.groupby("tipo")["custo_total"].sum().reset_index()
-            if not custos_tipo.empty:
-                fig = px.pie(custos_tipo, values="custo_total", names="tipo", 
-                            title="Distribuição de Custos por Tipo")
-                st.plotly_chart(fig, use_container_width=True)
+            fig = px.pie(resultado['custos_por_tipo'], values="custo_total", names="tipo", 
+                        title="Distribuição de Custos por Tipo")
+            mostrar_grafico(fig)
         
         with col2:
-            custos_cultura = df_ins.groupby("cultura")["custo_total"].sum().reset_index()
-            if not custos_cultura.empty:
-                fig = px.bar(custos_cultura, x="cultura", y="custo_total", 
-                            title="Custos por Cultura")
-                st.plotly_chart(fig, use_container_width=True)
+            fig = px.bar(resultado['custos_por_cultura'], x="cultura", y="custo_total", 
+                        title="Custos por Cultura")
+            mostrar_grafico(fig)
+
+    # Clima das propriedades em outros municípios
+    cidades = [config.get("cidade", CIDADE_PADRAO)] + config.get("cidades_propriedades", [])
+    if len(cidades) > 1:
+        with st.expander("🌦️ Clima nas Propriedades"):
+            df_clima = buscar_clima_cidades(cidades)
+            if df_clima.empty:
+                st.info("ℹ️ Não foi possível obter o clima das cidades configuradas")
+            else:
+                st.dataframe(df_clima[df_clima["Tipo"] == "Atual"].drop(columns=["Tipo", "Temp Média (°C)", "Temp Min (°C)", "Temp Max (°C)"]),
+                             use_container_width=True)
+                df_previsao = df_clima[df_clima["Tipo"] == "Previsão"]
+                if not df_previsao.empty:
+                    fig = px.line(df_previsao, x="Data", y="Temp Real (°C)", color="Cidade",
+                                 title="Previsão de Temperatura por Cidade")
+                    mostrar_grafico(fig)
 
     adicionar_recomendacoes_dashboard()
 
 def pagina_cadastro_producao():
     """Página de cadastro de produção"""
     st.title("📝 Cadastro de Produção")
-    df = carregar_tabela("producao")
     cidade = st.sidebar.text_input("🌍 Cidade para clima", value=config.get("cidade", CIDADE_PADRAO))
 
     with st.form("form_cadastro_producao", clear_on_submit=True):
@@ -835,46 +2609,35 @@ def pagina_cadastro_producao():
             inserir_tabela("producao", novo)
             st.success("Registro salvo com sucesso!")
 
-    if not df.empty:
+    if tabela_tem_registros("producao"):
         st.markdown("### 📋 Registros recentes")
         
-        # Adicionar coluna de receita ao dataframe
-        df_display = df.copy()
-        receitas = []
-        for _, row in df_display.iterrows():
-            receita = calcular_receita_cultura(row['caixas'], row['caixas_segunda'], row['cultura'])
-            receitas.append(receita)
-        
-        df_display['Receita (R$)'] = receitas
-        st.dataframe(df_display.sort_values("data", ascending=False).head(15), use_container_width=True)
+        # Receita calculada só para as linhas da página exibida
+        df_display = grade_paginada("producao", "grade_producao", 15)
+        df_display['Receita (R$)'] = calcular_receita_linhas(df_display)['receita_total']
+        st.dataframe(df_display, use_container_width=True)
         
         st.markdown("### 🗑️ Excluir Registros")
         col1, col2 = st.columns([3, 1])
         with col1:
-            ids = st.multiselect("Selecione ID(s) para excluir", df["id"].tolist())
+            ids = seletor_exclusao("producao", "excluir_producao", "Selecione ID(s) para excluir")
         with col2:
             if st.button("Excluir selecionados", type="secondary"):
                 if ids:
-                    for i in ids: 
-                        excluir_linha("producao", i)
-                    st.success("✅ Linhas excluídas!")
+                    excluidas = excluir_linhas("producao", ids=ids)
+                    st.success(f"✅ {excluidas} linhas excluídas!")
                     st.rerun()
                 else:
                     st.warning("Selecione pelo menos um ID para excluir")
 
     st.subheader("📂 Importar Excel")
-    uploaded_file = st.file_uploader("Envie planilha Excel (Produção)", type=["xlsx"])
-    if uploaded_file:
-        df_excel = pd.read_excel(uploaded_file)
-        df_excel = normalizar_colunas(df_excel)
-        inserir_tabela("producao", df_excel)
-        st.success("✅ Dados importados do Excel!")
-        st.rerun()
+    formulario_importacao("producao", "Envie planilha Excel (Produção)")
 
 def pagina_cadastro_insumos():
     """Página de cadastro de insumos"""
+    px = graficos_medidos()
+    
     st.title("📦 Cadastro de Insumos")
-    df_ins = carregar_tabela("insumos")
     
     with st.form("form_insumos", clear_on_submit=True):
         col1, col2 = st.columns(2)
@@ -911,78 +2674,65 @@ def pagina_cadastro_insumos():
             inserir_tabela("insumos", novo)
             st.success("Insumo salvo com sucesso!")
 
-    if not df_ins.empty:
+    if tabela_tem_registros("insumos"):
         st.subheader("📋 Histórico de Insumos")
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            filtro_tipo = st.multiselect("Filtrar por tipo", options=df_ins["tipo"].unique())
+            filtro_tipo = st.multiselect("Filtrar por tipo", options=valores_distintos("insumos", "tipo"))
         with col2:
-            filtro_area = st.multiselect("Filtrar por área", options=df_ins["area"].unique())
+            filtro_area = st.multiselect("Filtrar por área", options=valores_distintos("insumos", "area"))
         with col3:
-            filtro_cultura = st.multiselect("Filtrar por cultura", options=df_ins["cultura"].unique())
+            filtro_cultura = st.multiselect("Filtrar por cultura", options=valores_distintos("insumos", "cultura"))
         
-        df_filtrado = df_ins.copy()
-        if filtro_tipo: df_filtrado = df_filtrado[df_filtrado["tipo"].isin(filtro_tipo)]
-        if filtro_area: df_filtrado = df_filtrado[df_filtrado["area"].isin(filtro_area)]
-        if filtro_cultura: df_filtrado = df_filtrado[df_filtrado["cultura"].isin(filtro_cultura)]
-            
-        st.dataframe(df_filtrado.sort_values("data", ascending=False).head(20), use_container_width=True)
+        filtros = {"tipo": filtro_tipo, "area": filtro_area, "cultura": filtro_cultura}
+        st.dataframe(grade_paginada("insumos", "grade_insumos", 20, **filtros), use_container_width=True)
         
         st.subheader("📊 Estatísticas de Custos")
-        if not df_filtrado.empty:
-            total_custo = df_filtrado["custo_total"].sum()
-            media_custo = df_filtrado["custo_total"].mean()
+        custos_mensais = carregar_custos_mensais(**filtros)
+        if not custos_mensais.empty:
+            total_custo = custos_mensais["custo_total"].sum()
+            media_custo = total_custo / custos_mensais["registros"].sum() if custos_mensais["registros"].sum() else 0
             st.write(f"**Total gasto:** R$ {total_custo:,.2f} | **Média por registro:** R$ {media_custo:,.2f}")
             
-            df_filtrado["data"] = pd.to_datetime(df_filtrado["data"])
-            custos_mensais = df_filtrado.groupby(df_filtrado["data"].dt.to_period("M"))["custo_total"].sum().reset_index()
-            custos_mensais["data"] = custos_mensais["data"].astype(str)
-            
             fig = px.bar(custos_mensais, x="data", y="custo_total", 
                         title="Evolução Mensal de Custos com Insumos")
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
         
         st.markdown("### 🗑️ Excluir Insumos")
         col1, col2 = st.columns([3, 1])
         with col1:
-            ids_insumos = st.multiselect("Selecione ID(s) de insumos para excluir", df_ins["id"].tolist())
+            ids_insumos = seletor_exclusao("insumos", "excluir_insumos", "Selecione ID(s) de insumos para excluir")
         with col2:
             if st.button("Excluir insumos selecionados", type="secondary"):
                 if ids_insumos:
-                    for i in ids_insumos: 
-                        excluir_linha("insumos", i)
-                    st.success("✅ Insumos excluídos!")
+                    excluidos = excluir_linhas("insumos", ids=ids_insumos)
+                    st.success(f"✅ {excluidos} insumos excluídos!")
                     st.rerun()
                 else:
                     st.warning("Selecione pelo menos um ID para excluir")
 
     st.subheader("📂 Importar Excel (Insumos)")
-    uploaded_file = st.file_uploader("Envie planilha Excel (Insumos)", type=["xlsx"], key="insumos_upload")
-    if uploaded_file:
-        df_excel = pd.read_excel(uploaded_file)
-        df_excel.rename(columns=lambda x: x.lower(), inplace=True)
-        inserir_tabela("insumos", df_excel)
-        st.success("✅ Dados de insumos importados do Excel!")
-        st.rerun()
+    formulario_importacao("insumos", "Envie planilha Excel (Insumos)", chave_upload="insumos_upload")
 
 def pagina_analise():
     """Página de análise de dados"""
+    px = graficos_medidos()
+    
     st.title("📊 Análise Avançada de Produção e Custos")
     
-    df_prod = carregar_tabela("producao")
-    df_ins = carregar_tabela("insumos")
+    min_prod, max_prod = intervalo_datas("producao")
+    min_ins, _ = intervalo_datas("insumos")
     
-    if df_prod.empty and df_ins.empty:
+    if min_prod is None and min_ins is None:
         st.warning("📭 Nenhum dado disponível para análise. Cadastre dados de produção e insumos primeiro.")
         st.stop()
     
     st.sidebar.subheader("🔍 Filtros de Análise")
     
     # Período temporal
-    if not df_prod.empty:
-        datas_disponiveis = pd.to_datetime(df_prod['data']).sort_values()
-        min_date, max_date = datas_disponiveis.min(), datas_disponiveis.max()
+    if min_prod is not None:
+        min_date, max_date = pd.to_datetime(min_prod), pd.to_datetime(max_prod)
     else:
         min_date, max_date = date.today() - timedelta(days=365), date.today()
     
@@ -995,55 +2745,44 @@ def pagina_analise():
     col1, col2 = st.sidebar.columns(2)
     
     with col1:
-        areas_selecionadas = st.multiselect("🏭 Áreas", options=df_prod['area'].unique(), default=df_prod['area'].unique()) if not df_prod.empty else []
-        tipos_selecionados = st.multiselect("📦 Tipos de Insumos", options=df_ins['tipo'].unique(), default=df_ins['tipo'].unique()) if not df_ins.empty else []
+        areas_disponiveis = valores_distintos("producao", "area") if min_prod is not None else []
+        tipos_disponiveis = valores_distintos("insumos", "tipo") if min_ins is not None else []
+        areas_selecionadas = st.multiselect("🏭 Áreas", options=areas_disponiveis, default=areas_disponiveis) if min_prod is not None else []
+        tipos_selecionados = st.multiselect("📦 Tipos de Insumos", options=tipos_disponiveis, default=tipos_disponiveis) if min_ins is not None else []
     
     with col2:
-        culturas_selecionadas = st.multiselect("🌱 Culturas", options=df_prod['cultura'].unique(), default=df_prod['cultura'].unique()) if not df_prod.empty else []
-    
-    # Aplicar filtros
-    if not df_prod.empty:
-        df_prod['data'] = pd.to_datetime(df_prod['data'])
-        df_prod_filtrado = df_prod[(df_prod['data'] >= pd.to_datetime(start_date)) & 
-                                  (df_prod['data'] <= pd.to_datetime(end_date))]
-        if areas_selecionadas: df_prod_filtrado = df_prod_filtrado[df_prod_filtrado['area'].isin(areas_selecionadas)]
-        if culturas_selecionadas: df_prod_filtrado = df_prod_filtrado[df_prod_filtrado['cultura'].isin(culturas_selecionadas)]
-    else:
-        df_prod_filtrado = pd.DataFrame()
+        culturas_disponiveis = valores_distintos("producao", "cultura") if min_prod is not None else []
+        culturas_selecionadas = st.multiselect("🌱 Culturas", options=culturas_disponiveis, default=culturas_disponiveis) if min_prod is not None else []
     
-    if not df_ins.empty:
-        df_ins['data'] = pd.to_datetime(df_ins['data'])
-        df_ins_filtrado = df_ins[(df_ins['data'] >= pd.to_datetime(start_date)) & 
-                                (df_ins['data'] <= pd.to_datetime(end_date))]
-        if tipos_selecionados: df_ins_filtrado = df_ins_filtrado[df_ins_filtrado['tipo'].isin(tipos_selecionados)]
-    else:
-        df_ins_filtrado = pd.DataFrame()
+    # Métricas de performance, somadas no SQL antes de carregar as linhas filtradas
+    kpis = carregar_kpis(start_date, end_date, areas=areas_selecionadas,
+                         culturas=culturas_selecionadas, tipos=tipos_selecionados)
     
-    # Métricas de performance
     st.header("📈 Métricas de Performance")
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        total_caixas = df_prod_filtrado['caixas'].sum() if not df_prod_filtrado.empty else 0
-        st.metric("📦 Caixas 1ª Qualidade", f"{total_caixas:,.0f}")
+        st.metric("📦 Caixas 1ª Qualidade", f"{kpis['caixas']:,.0f}")
     
     with col2:
-        total_segunda = df_prod_filtrado['caixas_segunda'].sum() if not df_prod_filtrado.empty else 0
-        pct_segunda = (total_segunda / (total_caixas + total_segunda) * 100) if (total_caixas + total_segunda) > 0 else 0
-        st.metric("🔄 % 2ª Qualidade", f"{pct_segunda:.1f}%")
+        st.metric("🔄 % 2ª Qualidade", f"{kpis['pct_segunda']:.1f}%")
     
     with col3:
-        custo_total = df_ins_filtrado['custo_total'].sum() if not df_ins_filtrado.empty else 0
-        st.metric("💰 Custo Total", f"R$ {custo_total:,.2f}")
+        st.metric("💰 Custo Total", f"R$ {kpis['custo_insumos']:,.2f}")
     
     with col4:
-        receita_primeira, receita_segunda, receita_total = calcular_receita_total(df_prod_filtrado)
-        st.metric("💵 Receita Total", f"R$ {receita_total:,.2f}")
+        st.metric("💵 Receita Total", f"R$ {kpis['receita_total']:,.2f}")
     
     with col5:
-        lucro = receita_total - custo_total
-        st.metric("📊 Lucro Estimado", f"R$ {lucro:,.2f}")
+        st.metric("📊 Lucro Estimado", f"R$ {kpis['lucro']:,.2f}")
+    
+    # Filtros aplicados direto no SQL; rentabilidade, tendências e insights vêm prontos do analise.py
+    with st.spinner("Carregando análises detalhadas..."):
+        resultado = analisar_periodo(start_date, end_date, areas=areas_selecionadas,
+                                     culturas=culturas_selecionadas, tipos=tipos_selecionados)
+    df_prod_filtrado, df_ins_filtrado = resultado['producao'], resultado['insumos']
+    rentabilidade = resultado['rentabilidade']
     
     # Gráfico de Receitas Separadas
     st.subheader("💰 Distribuição de Receitas")
@@ -1051,36 +2790,22 @@ def pagina_analise():
     if not df_prod_filtrado.empty:
         receitas_data = pd.DataFrame({
             'Tipo': ['1ª Qualidade', '2ª Qualidade', 'Custos'],
-            'Valor (R$)': [receita_primeira, receita_segunda, -custo_total],
+            'Valor (R$)': [kpis['receita_primeira'], kpis['receita_segunda'], -kpis['custo_insumos']],
             'Categoria': ['Receita', 'Receita', 'Custo']
         })
         
         fig = px.bar(receitas_data, x='Tipo', y='Valor (R$)', color='Categoria',
                     title='Receitas e Custos por Categoria', text='Valor (R$)')
         fig.update_traces(texttemplate='R$ %{y:,.2f}', textposition='outside')
-        st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico(fig)
     
     # Receita por Cultura
     st.subheader("🌱 Receita por Cultura")
     
-    if not df_prod_filtrado.empty:
-        receitas_culturas = []
-        for cultura in df_prod_filtrado['cultura'].unique():
-            if cultura and cultura.strip():
-                df_cultura = df_prod_filtrado[df_prod_filtrado['cultura'] == cultura]
-                rec_primeira, rec_segunda, rec_total = calcular_receita_total(df_cultura)
-                receitas_culturas.append({
-                    'Cultura': cultura,
-                    'Receita 1ª': rec_primeira,
-                    'Receita 2ª': rec_segunda,
-                    'Receita Total': rec_total
-                })
-        
-        if receitas_culturas:
-            df_receitas = pd.DataFrame(receitas_culturas)
-            fig = px.bar(df_receitas, x='Cultura', y=['Receita 1ª', 'Receita 2ª'],
-                        title='Receita por Cultura', barmode='stack')
-            st.plotly_chart(fig, use_container_width=True)
+    if not resultado['receita_por_cultura'].empty:
+        fig = px.bar(resultado['receita_por_cultura'], x='Cultura', y=['Receita 1ª', 'Receita 2ª'],
+                    title='Receita por Cultura', barmode='stack')
+        mostrar_grafico(fig)
     
     # Análise de Produção
     if not df_prod_filtrado.empty:
@@ -1092,62 +2817,51 @@ def pagina_analise():
             col1, col2 = st.columns(2)
             
             with col1:
-                prod_diaria = df_prod_filtrado.groupby('data')[['caixas', 'caixas_segunda']].sum().reset_index()
-                fig = px.line(prod_diaria, x='data', y=['caixas', 'caixas_segunda'],
-                             title='📅 Produção Diária', markers=True)
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_serie(resultado['producao_diaria'], 'data', ['caixas', 'caixas_segunda'],
+                              'producao_diaria', title='📅 Produção Diária', markers=True)
             
             with col2:
                 qualidade_data = pd.DataFrame({
                     'Categoria': ['1ª Qualidade', '2ª Qualidade'],
-                    'Quantidade': [total_caixas, total_segunda]
+                    'Quantidade': [kpis['caixas'], kpis['caixas_segunda']]
                 })
                 fig = px.pie(qualidade_data, values='Quantidade', names='Categoria',
                             title='🎯 Distribuição por Qualidade')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
         
         with tab2:
-            prod_cultura = df_prod_filtrado.groupby('cultura')[['caixas', 'caixas_segunda']].sum().reset_index()
-            prod_cultura['Total'] = prod_cultura['caixas'] + prod_cultura['caixas_segunda']
-            prod_cultura['% 2ª'] = (prod_cultura['caixas_segunda'] / prod_cultura['Total'] * 100).round(1)
+            prod_cultura = resultado['producao_por_cultura']
             
             col1, col2 = st.columns(2)
             
             with col1:
                 fig = px.bar(prod_cultura, x='cultura', y=['caixas', 'caixas_segunda'],
                             title='🌿 Produção por Cultura', barmode='group')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
             
             with col2:
                 fig = px.bar(prod_cultura, x='cultura', y='% 2ª',
                             title='📊 Percentual de 2ª por Cultura')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
         
         with tab3:
-            if 'area' in df_prod_filtrado.columns:
-                prod_area = df_prod_filtrado.groupby('area')[['caixas', 'caixas_segunda']].sum().reset_index()
-                prod_area['Produtividade'] = prod_area['caixas'] / len(df_prod_filtrado['data'].unique())
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    fig = px.bar(prod_area, x='area', y='caixas',
-                                title='🏭 Produção Total por Área')
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with col2:
-                    fig = px.bar(prod_area, x='area', y='Produtividade',
-                                title='⚡ Produtividade Média Diária por Área')
-                    st.plotly_chart(fig, use_container_width=True)
+            prod_area = resultado['producao_por_area']
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                fig = px.bar(prod_area, x='area', y='caixas',
+                            title='🏭 Produção Total por Área')
+                mostrar_grafico(fig)
+            
+            with col2:
+                fig = px.bar(prod_area, x='area', y='Produtividade',
+                            title='⚡ Produtividade Média Diária por Área')
+                mostrar_grafico(fig)
         
         with tab4:
-            prod_mensal = df_prod_filtrado.copy()
-            prod_mensal['mes'] = prod_mensal['data'].dt.to_period('M').astype(str)
-            prod_mensal = prod_mensal.groupby('mes')[['caixas', 'caixas_segunda']].sum().reset_index()
-            
-            fig = px.line(prod_mensal, x='mes', y=['caixas', 'caixas_segunda'],
-                         title='📈 Tendência Mensal de Produção', markers=True)
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_serie(resultado['producao_mensal'], 'mes', ['caixas', 'caixas_segunda'],
+                          'producao_mensal', title='📈 Tendência Mensal de Produção', markers=True)
     
     # Análise de Custos
     if not df_ins_filtrado.empty:
@@ -1159,66 +2873,38 @@ def pagina_analise():
             col1, col2 = st.columns(2)
             
             with col1:
-                custos_tipo = df_ins_filtrado.groupby('tipo')['custo_total'].sum().reset_index()
-                fig = px.pie(custos_tipo, values='custo_total', names='tipo',
+                fig = px.pie(resultado['custos_por_tipo'], values='custo_total', names='tipo',
                             title='📊 Distribuição de Custos por Tipo')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
             
             with col2:
-                custos_cultura = df_ins_filtrado.groupby('cultura')['custo_total'].sum().reset_index()
-                fig = px.bar(custos_cultura, x='cultura', y='custo_total',
+                fig = px.bar(resultado['custos_por_cultura'], x='cultura', y='custo_total',
                             title='🌱 Custos por Cultura')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
         
         with tab2:
-            custos_mensal = df_ins_filtrado.copy()
-            custos_mensal['mes'] = custos_mensal['data'].dt.to_period('M').astype(str)
-            custos_mensal = custos_mensal.groupby('mes')['custo_total'].sum().reset_index()
-            
-            fig = px.line(custos_mensal, x='mes', y='custo_total',
-                         title='📈 Evolução Mensal de Custos', markers=True)
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_serie(resultado['custos_mensais'], 'mes', 'custo_total',
+                          'custos_mensais', title='📈 Evolução Mensal de Custos', markers=True)
         
         with tab3:
             if not df_prod_filtrado.empty:
-                # Calcular rentabilidade por cultura
-                rentabilidade_data = []
-                for cultura in df_prod_filtrado['cultura'].unique():
-                    if cultura and cultura.strip():
-                        df_cultura_prod = df_prod_filtrado[df_prod_filtrado['cultura'] == cultura]
-                        df_cultura_ins = df_ins_filtrado[df_ins_filtrado['cultura'] == cultura]
-                        
-                        rec_primeira, rec_segunda, rec_total = calcular_receita_total(df_cultura_prod)
-                        custo_total = df_cultura_ins['custo_total'].sum() if not df_cultura_ins.empty else 0
-                        lucro = rec_total - custo_total
-                        
-                        if custo_total > 0:
-                            roi = (lucro / custo_total) * 100
-                        else:
-                            roi = 0
-                            
-                        rentabilidade_data.append({
-                            'Cultura': cultura,
-                            'Receita Total': rec_total,
-                            'Custo Total': custo_total,
-                            'Lucro': lucro,
-                            'ROI (%)': roi
-                        })
-                
-                if rentabilidade_data:
-                    df_rentabilidade = pd.DataFrame(rentabilidade_data)
+                if not rentabilidade.empty:
+                    df_rentabilidade = rentabilidade.rename(columns={
+                        'cultura': 'Cultura', 'receita': 'Receita Total', 'custo': 'Custo Total',
+                        'lucro': 'Lucro', 'roi': 'ROI (%)'
+                    })
                     
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         fig = px.bar(df_rentabilidade, x='Cultura', y='Lucro',
                                     title='💵 Lucro por Cultura')
-                        st.plotly_chart(fig, use_container_width=True)
+                        mostrar_grafico(fig)
                     
                     with col2:
                         fig = px.bar(df_rentabilidade, x='Cultura', y='ROI (%)',
                                     title='📈 ROI (%) por Cultura')
-                        st.plotly_chart(fig, use_container_width=True)
+                        mostrar_grafico(fig)
                     
                     # Mostrar tabela detalhada
                     st.dataframe(df_rentabilidade.sort_values('Lucro', ascending=False), use_container_width=True)
@@ -1232,68 +2918,28 @@ def pagina_analise():
         col1, col2 = st.columns(2)
         
         with col1:
-            correlacao_cols = ['caixas', 'temperatura', 'umidade', 'chuva']
-            cols_disponiveis = [col for col in correlacao_cols if col in df_prod_filtrado.columns]
-            
-            if len(cols_disponiveis) > 1:
-                correlacao = df_prod_filtrado[cols_disponiveis].corr()
-                fig = px.imshow(correlacao, text_auto=True, aspect="auto",
+            if resultado['correlacao'] is not None:
+                fig = px.imshow(resultado['correlacao'], text_auto=True, aspect="auto",
                                title='📊 Correlação: Clima vs Produção')
-                st.plotly_chart(fig, use_container_width=True)
+                mostrar_grafico(fig)
+            
+            if resultado.get('correlacao_defasada') is not None:
+                fig = px.imshow(resultado['correlacao_defasada'], text_auto=".2f", aspect="auto",
+                               zmin=-1, zmax=1, color_continuous_scale="RdBu",
+                               title='⏳ Caixas vs Clima de Dias Antes')
+                mostrar_grafico(fig)
         
         with col2:
-            if 'area' in df_prod_filtrado.columns:
-                top_areas = df_prod_filtrado.groupby('area')['caixas'].sum().nlargest(5)
-                if not top_areas.empty:
-                    fig = px.bar(x=top_areas.index, y=top_areas.values,
-                                title='🏆 Top 5 Áreas por Produção')
-                    st.plotly_chart(fig, use_container_width=True)
+            top_areas = resultado['top_areas']
+            if not top_areas.empty:
+                fig = px.bar(x=top_areas.index, y=top_areas.values,
+                            title='🏆 Top 5 Áreas por Produção')
+                mostrar_grafico(fig)
     
     # Recomendações baseadas em dados
     st.header("🎯 Recomendações Estratégicas")
     
-    insights = []
-    
-    if not df_prod_filtrado.empty:
-        # Verificar culturas mais rentáveis
-        rentabilidade_data = []
-        for cultura in df_prod_filtrado['cultura'].unique():
-            if cultura and cultura.strip():
-                df_cultura_prod = df_prod_filtrado[df_prod_filtrado['cultura'] == cultura]
-                df_cultura_ins = df_ins_filtrado[df_ins_filtrado['cultura'] == cultura]
-                
-                rec_primeira, rec_segunda, rec_total = calcular_receita_total(df_cultura_prod)
-                custo_total = df_cultura_ins['custo_total'].sum() if not df_cultura_ins.empty else 0
-                lucro = rec_total - custo_total
-                
-                if custo_total > 0:
-                    roi = (lucro / custo_total) * 100
-                else:
-                    roi = 0
-                    
-                rentabilidade_data.append({
-                    'Cultura': cultura,
-                    'Lucro': lucro,
-                    'ROI': roi
-                })
-        
-        if rentabilidade_data:
-            df_rentabilidade = pd.DataFrame(rentabilidade_data)
-            cultura_lucrativa = df_rentabilidade.nlargest(1, 'ROI')['Cultura'].iloc[0]
-            roi_max = df_rentabilidade.nlargest(1, 'ROI')['ROI'].iloc[0]
-            insights.append(f"✅ **{cultura_lucrativa}** é a cultura mais rentável (ROI: {roi_max:.1f}%)")
-    
-    if 'pct_segunda' in locals() and pct_segunda > config.get('alerta_pct_segunda', 25):
-        insights.append(f"⚠️ **Alerta**: Percentual de 2ª qualidade ({pct_segunda:.1f}%) acima do limite recomendado")
-    
-    if not df_prod_filtrado.empty and 'area' in df_prod_filtrado.columns:
-        prod_area = df_prod_filtrado.groupby('area')['caixas'].mean()
-        if not prod_area.empty:
-            area_baixa = prod_area.idxmin()
-            prod_baixa = prod_area.min()
-            insights.append(f"🔍 **Oportunidade**: Área {area_baixa} tem a menor produtividade média ({prod_baixa:.1f} caixas/dia)")
-    
-    for insight in insights:
+    for insight in resultado['insights']:
         st.info(insight)
     
     if not df_prod_filtrado.empty:
@@ -1313,6 +2959,8 @@ def pagina_configuracoes():
     with tab1:
         st.subheader("Configurações Gerais")
         cidade_new = st.text_input("Cidade padrão para clima", value=config.get("cidade", CIDADE_PADRAO))
+        cidades_extra = st.text_input("Outras cidades das propriedades (separadas por vírgula)",
+                                      value=", ".join(config.get("cidades_propriedades", [])))
         
         pct_alert = st.number_input("Alerta % de segunda qualidade", 
                                    min_value=0.0, max_value=100.0, 
@@ -1327,6 +2975,9 @@ def pagina_configuracoes():
         
         preco_padrao_segunda = st.number_input("Preço padrão caixa 2ª (R$)", min_value=0.0,
                                        value=float(config.get("preco_padrao_segunda", 15.0)))
+        
+        clima_ttl = st.number_input("Validade do cache de clima (min)", min_value=1, step=5,
+                                    value=int(config.get("clima_cache_ttl_min", CLIMA_CACHE_TTL_PADRAO_MIN)))
     
     with tab2:
         st.subheader("Estágios Fenológicos Padrão")
@@ -1467,20 +3118,77 @@ def pagina_configuracoes():
     
     if st.button("Salvar Configurações Gerais"):
         config["cidade"] = cidade_new
+        config["cidades_propriedades"] = [c.strip() for c in cidades_extra.split(",") if c.strip()]
         config["alerta_pct_segunda"] = float(pct_alert)
         config["alerta_prod_baixo_pct"] = float(prod_alert)
         config["preco_padrao_primeira"] = float(preco_padrao_primeira)
         config["preco_padrao_segunda"] = float(preco_padrao_segunda)
+        config["clima_cache_ttl_min"] = int(clima_ttl)
         salvar_config(config)
         st.success("Configurações salvas com sucesso!")
 
+# ===============================
+# PAINEL DE PERFIL
+# ===============================
+def registrar_tempo_pagina(pagina, segundos):
+    """Guarda o tempo de um rerun da página e descarta medições mais antigas que a retenção"""
+    agora = time.time()
+    with transacao() as conn:
+        conn.execute("INSERT INTO metricas_paginas (pagina, registrado_em, segundos) VALUES (?, ?, ?)",
+                     (pagina, agora, segundos))
+        conn.execute("DELETE FROM metricas_paginas WHERE registrado_em < ?",
+                     (agora - METRICAS_RETENCAO_DIAS * 86400,))
+
+def resumo_tempos_paginas(dias=30):
+    """p50/p95 do tempo de cada página nos últimos dias"""
+    df = pd.read_sql("SELECT pagina, segundos FROM metricas_paginas WHERE registrado_em >= ?",
+                     obter_conexao(), params=(time.time() - dias * 86400,))
+    if df.empty:
+        return pd.DataFrame(columns=["pagina", "execucoes", "p50_ms", "p95_ms"])
+    
+    resumo = df.groupby("pagina")["segundos"].agg(
+        execucoes="count",
+        p50_ms=lambda s: s.quantile(0.5) * 1000,
+        p95_ms=lambda s: s.quantile(0.95) * 1000
+    ).round(1)
+    return resumo.reset_index().sort_values("p95_ms", ascending=False)
+
+def mostrar_painel_perfil(medicoes):
+    """Quebra do tempo do rerun por página, SQL, clima e gráficos na barra lateral"""
+    df = pd.DataFrame(medicoes, columns=["categoria", "nome", "segundos"])
+    
+    with st.sidebar.expander("⏱️ Perfil desta execução", expanded=True):
+        if df.empty:
+            st.caption("Nada medido neste rerun")
+        else:
+            por_categoria = df.groupby("categoria")["segundos"].sum() * 1000
+            st.dataframe(por_categoria.round(1).rename("total_ms").to_frame(), use_container_width=True)
+            
+            detalhe = df.groupby(["categoria", "nome"])["segundos"].agg(chamadas="count", total_ms="sum", max_ms="max")
+            detalhe[["total_ms", "max_ms"]] = (detalhe[["total_ms", "max_ms"]] * 1000).round(1)
+            st.dataframe(detalhe.sort_values("total_ms", ascending=False).reset_index(),
+                         use_container_width=True, hide_index=True)
+        
+        st.caption("Histórico por página (últimos 30 dias)")
+        st.dataframe(resumo_tempos_paginas(), use_container_width=True, hide_index=True)
+        
+        # Lê as tabelas inteiras: só sob demanda
+        if st.button("💾 Medir memória das tabelas", key="perfil_memoria"):
+            for nome_tabela in TIPOS_COMPACTOS:
+                st.caption(f"{nome_tabela}: tipos padrão × compactos (MB)")
+                st.dataframe(relatorio_memoria(nome_tabela, carregar_tabela(nome_tabela)), use_container_width=True)
+
 # ===============================
 # MENU PRINCIPAL
 # ===============================
 def main():
     """Função principal da aplicação"""
+    st.set_page_config(page_title="🌱 Gerenciador Integrado de Produção", layout="wide")
+    
     # Inicialização
-    criar_tabelas()
+    # Esquema e dados de referência vêm de caches do processo: no rerun comum
+    # custam um stat do config.json e a consulta de versões das tabelas
+    garantir_tabelas()
     global config, fenologia_especies, precos_culturas
     config = carregar_config()
     fenologia_especies = carregar_fenologia_especies()
@@ -1492,61 +3200,51 @@ def main():
                             ["Dashboard", "Cadastro Produção", "Cadastro Insumos", 
                              "Análise", "Recomendações Agronômicas", "Configurações"])
     
+    modo_perfil = st.sidebar.checkbox("⏱️ Modo de perfil", value=PERFIL_PADRAO, key="modo_perfil",
+                                      help="Mede página, consultas, clima e gráficos deste rerun")
+    if modo_perfil:
+        iniciar_perfil()
+    
     # Navegação
-    if pagina == "Dashboard":
-        pagina_dashboard()
-    elif pagina == "Cadastro Produção":
-        pagina_cadastro_producao()
-    elif pagina == "Cadastro Insumos":
-        pagina_cadastro_insumos()
-    elif pagina == "Análise":
-        pagina_analise()
-    elif pagina == "Recomendações Agronômicas":
-        mostrar_modulo_agronomico()
-    elif pagina == "Configurações":
-        pagina_configuracoes()
+    try:
+        with medir("pagina", pagina):
+            if pagina == "Dashboard":
+                pagina_dashboard()
+            elif pagina == "Cadastro Produção":
+                pagina_cadastro_producao()
+            elif pagina == "Cadastro Insumos":
+                pagina_cadastro_insumos()
+            elif pagina == "Análise":
+                pagina_analise()
+            elif pagina == "Recomendações Agronômicas":
+                mostrar_modulo_agronomico()
+            elif pagina == "Configurações":
+                pagina_configuracoes()
+    finally:
+        # st.stop()/st.rerun() interrompem a página: o perfil para de anotar de qualquer forma
+        medicoes = encerrar_perfil() if modo_perfil else []
     
     # Exportar dados
     st.sidebar.markdown("---")
     st.sidebar.subheader("📤 Exportar Dados")
     
-    if st.sidebar.button("Exportar Produção Excel"):
-        df_export = carregar_tabela("producao")
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_export.to_excel(writer, sheet_name='Produção', index=False)
-            workbook = writer.book
-            worksheet = writer.sheets['Produção']
-            format_header = workbook.add_format({'bold': True, 'bg_color': '#2c3e50', 'font_color': 'white'})
-            for col_num, value in enumerate(df_export.columns.values):
-                worksheet.write(0, col_num, value, format_header)
-        
-        output.seek(0)
-        st.sidebar.download_button(
-            "📥 Baixar Produção", 
-            data=output, 
-            file_name="producao_exportada.xlsx", 
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    with st.sidebar.expander("Filtros da exportação (opcional)"):
+        periodo_exportacao = st.date_input("Período", value=(), key="periodo_exportacao")
+        areas_exportacao = st.multiselect("Áreas", options=AREAS_PRODUCAO, key="areas_exportacao")
     
-    if st.sidebar.button("Exportar Insumos Excel"):
-        df_export = carregar_tabela("insumos")
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_export.to_excel(writer, sheet_name='Insumos', index=False)
-            workbook = writer.book
-            worksheet = writer.sheets['Insumos']
-            format_header = workbook.add_format({'bold': True, 'bg_color': '#2c3e50', 'font_color': 'white'})
-            for col_num, value in enumerate(df_export.columns.values):
-                worksheet.write(0, col_num, value, format_header)
-        
-        output.seek(0)
-        st.sidebar.download_button(
-            "📥 Baixar Insumos", 
-            data=output, 
-            file_name="insumos_exportados.xlsx", 
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    filtros_exportacao = {"areas": areas_exportacao}
+    if len(periodo_exportacao) == 2:
+        filtros_exportacao["data_inicio"], filtros_exportacao["data_fim"] = periodo_exportacao
+    
+    botao_exportacao("producao", "Produção", "Exportar Produção Excel", "📥 Baixar Produção",
+                     "producao_exportada.xlsx", filtros_exportacao)
+    botao_exportacao("insumos", "Insumos", "Exportar Insumos Excel", "📥 Baixar Insumos",
+                     "insumos_exportados.xlsx", filtros_exportacao)
+    
+    if modo_perfil:
+        tempo_pagina = sum(seg for categoria, _, seg in medicoes if categoria == "pagina")
+        registrar_tempo_pagina(pagina, tempo_pagina)
+        mostrar_painel_perfil(medicoes)
     
     st.sidebar.markdown("---")
     st.sidebar.info("🌱 Desenvolvido para otimizar a gestão agrícola")
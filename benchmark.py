@@ -0,0 +1,271 @@
+"""Benchmark das funções de dados e análise do app.py sobre bancos sintéticos.
+
+Gera (uma vez, em .benchmark/) bancos de 10k/100k/1M registros de produção com
+gerar_dados_sinteticos.py, mede cada caso pelo melhor de várias execuções e
+compara com benchmark_baseline.json: um caso mais lento que a baseline além do
+limite de regressão faz o script terminar com código 1.
+
+A baseline guarda cada caso como razão sobre uma carga de referência fixa
+(SQLite, pandas e Python puro) medida na mesma execução, e não em segundos:
+assim a velocidade da máquina se cancela e a baseline gravada em outra máquina
+continua servindo. Disco, número de núcleos e versões de SQLite/pandas ainda
+mudam as razões; em uma máquina muito diferente, rode antes com
+--atualizar-baseline e compare com a baseline local.
+
+Uso:
+    python benchmark.py [--tamanhos 10k 100k] [--repeticoes 5] [--atualizar-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import app
+import gerar_dados_sinteticos
+
+TAMANHOS = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+TAMANHOS_PADRAO = ["10k", "100k"]
+REPETICOES_PADRAO = 5
+
+# Um caso regride quando fica LIMITE_REGRESSAO vezes mais lento que a baseline
+# e a diferença passa de FOLGA_MINIMA_S (abaixo disso é ruído de medição)
+LIMITE_REGRESSAO = 1.5
+FOLGA_MINIMA_S = 0.01
+
+# Os resultados da baseline são razões sobre carga_referencia(), não segundos
+UNIDADE_BASELINE = "razao_referencia"
+
+# A planilha do caso de importação é limitada para não dominar o tempo do benchmark
+IMPORTACAO_MAX_LINHAS = 20_000
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_DADOS = os.path.join(DIRETORIO, ".benchmark")
+ARQUIVO_BASELINE = os.path.join(DIRETORIO, "benchmark_baseline.json")
+
+
+# ===============================
+# PREPARAÇÃO
+# ===============================
+def preparar_banco(rotulo):
+    """Aponta o app para o banco sintético do tamanho pedido, gerando-o na primeira vez"""
+    os.makedirs(DIRETORIO_DADOS, exist_ok=True)
+    app.CONFIG_FILE = os.path.join(DIRETORIO_DADOS, "config.json")
+    caminho = os.path.join(DIRETORIO_DADOS, f"sintetico_{rotulo}.db")
+    novo = not os.path.exists(caminho)
+
+    app.usar_banco(caminho)
+    if novo:
+        print(f"Gerando banco sintético {rotulo}...")
+        gerar_dados_sinteticos.gerar_dados(TAMANHOS[rotulo])
+    app.criar_tabelas()
+
+    # Mesmo estado global que o main() monta a cada rerun
+    app.config = app.carregar_config()
+    app.fenologia_especies = app.carregar_fenologia_especies()
+    app.precos_culturas = app.carregar_precos_culturas()
+
+
+def _planilha_importacao(linhas):
+    """Grava um .xlsx com cabeçalhos como os das planilhas de campo"""
+    df = app.carregar_tabela("producao").head(linhas).drop(columns=["id"])
+    df = df.rename(columns={"data": "Data", "area": "Área", "caixas": "Primeira",
+                            "caixas_segunda": "Segunda", "observacao": "Obs"})
+    descritor, caminho = tempfile.mkstemp(suffix=".xlsx", dir=DIRETORIO_DADOS)
+    os.close(descritor)
+    df.to_excel(caminho, index=False, engine="xlsxwriter")
+    return caminho, len(df)
+
+
+# ===============================
+# AGREGAÇÕES DAS PÁGINAS
+# ===============================
+def agregacoes_dashboard():
+    """Dados que o pagina_dashboard calcula antes de desenhar"""
+    app.analisar_dashboard()
+    app.carregar_ultimo_registro("producao")
+
+
+def agregacoes_analise():
+    """Dados que o pagina_analise calcula antes de desenhar, com todos os filtros marcados"""
+    inicio, fim = app.intervalo_datas("producao")
+    app.analisar_periodo(inicio, fim,
+                         areas=app.valores_distintos("producao", "area"),
+                         culturas=app.valores_distintos("producao", "cultura"),
+                         tipos=app.valores_distintos("insumos", "tipo"))
+
+
+def agregacoes_cadastro():
+    """Primeiras duas páginas da grade de histórico da produção"""
+    pagina = app.carregar_pagina("producao", 51)
+    ultima = pagina.iloc[49]
+    app.carregar_pagina("producao", 51, (ultima["data"], int(ultima["id"])))
+
+
+# ===============================
+# CASOS
+# ===============================
+def casos(linhas):
+    """(nome, preparo, função medida); o preparo roda antes de cada medição, fora do tempo"""
+    df_prod = app.carregar_tabela("producao")
+    df_bruto = df_prod.drop(columns=["id"]).rename(columns={
+        "data": "Data", "area": "Área", "caixas": "Primeira", "caixas_segunda": "Segunda", "observacao": "Obs"
+    })
+    planilha, linhas_planilha = _planilha_importacao(min(linhas, IMPORTACAO_MAX_LINHAS))
+    id_inicial = app.obter_conexao().execute("SELECT MAX(id) FROM producao").fetchone()[0]
+
+    def desfazer_importacao():
+        # Cada repetição (e o banco guardado para a próxima execução) parte do mesmo estado
+        maximo = app.obter_conexao().execute("SELECT MAX(id) FROM producao").fetchone()[0]
+        if maximo > id_inicial:
+            app.excluir_linhas("producao", ids=list(range(id_inicial + 1, maximo + 1)))
+
+    def finalizar():
+        desfazer_importacao()
+        os.remove(planilha)
+
+    lista = [
+        ("carregar_tabela", app.limpar_cache_leituras, lambda: app.carregar_tabela("producao")),
+        ("carregar_tabela_em_cache", None, lambda: app.carregar_tabela("producao")),
+        ("carregar_tabela_compacta", app.limpar_cache_leituras, lambda: app.carregar_tabela_compacta("producao")),
+        ("calcular_receita_total", None, lambda: app.calcular_receita_total(df_prod)),
+        ("normalizar_colunas", None, lambda: app.normalizar_colunas(df_bruto)),
+        (f"importar_excel_{linhas_planilha}", desfazer_importacao, lambda: app.importar_excel("producao", planilha)),
+        ("kpis_sql", app.limpar_cache_leituras, app.carregar_kpis),
+        ("estatisticas_clima", app.limpar_cache_leituras, app.carregar_estatisticas_clima),
+        ("pagina_dashboard", app.limpar_cache_leituras, agregacoes_dashboard),
+        ("pagina_analise", app.limpar_cache_leituras, agregacoes_analise),
+        ("pagina_cadastro", app.limpar_cache_leituras, agregacoes_cadastro),
+    ]
+    return lista, finalizar
+
+
+def carga_referencia():
+    """Trabalho fixo, independente do app, que mede a velocidade da máquina"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"grupo": rng.integers(0, 100, 200_000), "valor": rng.normal(size=200_000)})
+    conn = sqlite3.connect(":memory:")
+    df.to_sql("referencia", conn, index=False)
+
+    def carga():
+        conn.execute("SELECT grupo, SUM(valor), COUNT(*) FROM referencia GROUP BY grupo").fetchall()
+        df.groupby("grupo")["valor"].agg(["sum", "mean"])
+        sum(i * i for i in range(200_000))
+    return carga
+
+
+def medir(preparo, funcao, repeticoes):
+    """Melhor tempo de várias execuções, depois de uma de aquecimento
+
+    O mínimo é o que menos sofre com ruído da máquina (outros processos, I/O);
+    uma regressão de verdade sobe também o melhor caso.
+    """
+    tempos = []
+    for _ in range(repeticoes + 1):
+        if preparo:
+            preparo()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos[1:])
+
+
+def mostrar_memoria(rotulo):
+    """Memória das tabelas inteiras com os tipos padrão do pandas e com os tipos compactos"""
+    for nome_tabela in app.TIPOS_COMPACTOS:
+        total = app.relatorio_memoria(nome_tabela, app.carregar_tabela(nome_tabela)).loc["total"]
+        print(f"{rotulo:>5}  memória {nome_tabela:<20} {total['mb_padrao']:8.1f} MB -> "
+              f"{total['mb_compacto']:7.1f} MB compacta (-{total['economia_pct']:.0f}%)")
+
+
+# ===============================
+# BASELINE
+# ===============================
+def carregar_baseline():
+    """Razões de referência guardadas (vazio na primeira execução ou se a baseline for em segundos)"""
+    if not os.path.exists(ARQUIVO_BASELINE):
+        return {"ambiente": {}, "resultados": {}}
+    with open(ARQUIVO_BASELINE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("unidade") != UNIDADE_BASELINE:
+        print(f"{os.path.basename(ARQUIVO_BASELINE)} em segundos (formato antigo): rode com --atualizar-baseline")
+        return {"ambiente": {}, "resultados": {}}
+    return baseline
+
+
+def salvar_baseline(baseline, resultados, referencia):
+    """Grava as razões medidas por cima dos tamanhos já guardados"""
+    baseline["ambiente"] = {
+        "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+        "sqlite": sqlite3.sqlite_version, "referencia_s": round(referencia, 6)
+    }
+    baseline["unidade"] = UNIDADE_BASELINE
+    baseline.setdefault("resultados", {}).update(resultados)
+    with open(ARQUIVO_BASELINE, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def comparar(rotulo, nome, segundos, referencia, baseline, limite=LIMITE_REGRESSAO):
+    """Linha do relatório e se o caso regrediu em relação à baseline (em razões sobre a referência)"""
+    razao = segundos / referencia
+    guardada = baseline.get("resultados", {}).get(rotulo, {}).get(nome)
+    if guardada is None:
+        return f"{rotulo:>5}  {nome:<28} {segundos:9.4f}s {razao:9.2f}ref   (sem baseline)", False
+    # A folga mínima continua em segundos desta máquina
+    regrediu = razao > guardada * limite and (razao - guardada) * referencia > FOLGA_MINIMA_S
+    marca = "  REGRESSÃO" if regrediu else ""
+    return (f"{rotulo:>5}  {nome:<28} {segundos:9.4f}s {razao:9.2f}ref   baseline {guardada:9.2f}ref "
+            f"({razao / guardada:5.2f}x){marca}"), regrediu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das funções de dados e análise")
+    parser.add_argument("--tamanhos", nargs="+", choices=list(TAMANHOS), default=TAMANHOS_PADRAO)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--limite", type=float, default=LIMITE_REGRESSAO,
+                        help="razão tempo/baseline a partir da qual o caso é regressão")
+    parser.add_argument("--atualizar-baseline", action="store_true",
+                        help="grava os tempos medidos como nova baseline")
+    args = parser.parse_args()
+
+    baseline = carregar_baseline()
+    resultados = {}
+    regressoes = 0
+    referencia = medir(None, carga_referencia(), args.repeticoes)
+    print(f"Carga de referência: {referencia:.4f}s")
+
+    for rotulo in args.tamanhos:
+        preparar_banco(rotulo)
+        lista, finalizar = casos(TAMANHOS[rotulo])
+        try:
+            resultados[rotulo] = {}
+            for nome, preparo, funcao in lista:
+                segundos = medir(preparo, funcao, args.repeticoes)
+                resultados[rotulo][nome] = round(segundos / referencia, 6)
+                linha, regrediu = comparar(rotulo, nome, segundos, referencia, baseline, args.limite)
+                regressoes += regrediu
+                print(linha)
+        finally:
+            finalizar()
+        mostrar_memoria(rotulo)
+
+    if args.atualizar_baseline:
+        salvar_baseline(baseline, resultados, referencia)
+        print(f"Baseline gravada em {os.path.basename(ARQUIVO_BASELINE)}")
+        return 0
+
+    if regressoes:
+        print(f"{regressoes} caso(s) acima de {args.limite:.1f}x a baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Confere o tempo de partida do app.py contra um orçamento.
+
+Importa o app em processos Python novos (como na partida a frio do container),
+mede a mediana e falha (código de saída 1) se passar do orçamento ou se algum
+módulo pesado voltar a ser importado no topo do arquivo.
+
+Uso:
+    python checar_inicializacao.py [--orcamento 1.5] [--repeticoes 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Mediana, em segundos, de "import app" num processo novo
+ORCAMENTO_PADRAO_S = float(os.environ.get("ORCAMENTO_INICIALIZACAO_S", "1.5"))
+REPETICOES_PADRAO = 5
+
+# Bibliotecas que só as páginas/ações que precisam delas devem carregar
+MODULOS_PESADOS = ("matplotlib", "seaborn", "plotly.express", "openpyxl", "xlsxwriter")
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+MEDICAO = f"""
+import sys, time
+sys.path.insert(0, {DIRETORIO_APP!r})
+inicio = time.perf_counter()
+import app
+duracao = time.perf_counter() - inicio
+pesados = [m for m in {MODULOS_PESADOS!r} if m in sys.modules]
+print(duracao)
+print(",".join(pesados))
+"""
+
+
+def medir_importacao():
+    """Importa o app num processo novo e devolve (segundos, módulos pesados carregados)"""
+    saida = subprocess.run([sys.executable, "-c", MEDICAO], capture_output=True, text=True,
+                           cwd=DIRETORIO_APP, check=True).stdout.splitlines()
+    return float(saida[0]), [m for m in saida[1].split(",") if m] if len(saida) > 1 else []
+
+
+def _tempos_importacao(codigo):
+    """Tempo acumulado por módulo, com a profundidade na árvore de imports (python -X importtime)"""
+    resultado = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                               capture_output=True, text=True, cwd=DIRETORIO_APP)
+    tempos = []
+    for linha in resultado.stderr.splitlines():
+        partes = linha.split("|")
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue
+        nome = partes[2]
+        profundidade = (len(nome) - len(nome.lstrip())) // 2
+        tempos.append((int(partes[1]) / 1e6, profundidade, nome.strip()))
+    return tempos
+
+
+def maiores_importacoes(quantidade=10):
+    """Imports do app.py que mais pesam na partida"""
+    # O que o interpretador já carrega sozinho (site, encodings...) não é do app
+    da_partida = {nome for _, _, nome in _tempos_importacao("pass")}
+    # Os imports diretos do app.py ficam um nível abaixo de "app"
+    tempos = [(segundos, nome) for segundos, profundidade, nome in _tempos_importacao("import app")
+              if profundidade == 1 and nome not in da_partida]
+    return sorted(tempos, reverse=True)[:quantidade]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere o tempo de partida do app.py")
+    parser.add_argument("--orcamento", type=float, default=ORCAMENTO_PADRAO_S,
+                        help="mediana máxima aceita, em segundos")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    args = parser.parse_args()
+
+    # A primeira importação aquece o cache de bytecode e do disco; não entra na conta
+    medir_importacao()
+    medicoes = [medir_importacao() for _ in range(args.repeticoes)]
+    mediana = statistics.median(segundos for segundos, _ in medicoes)
+    pesados = sorted({m for _, carregados in medicoes for m in carregados})
+
+    print(f"Importação do app: mediana {mediana:.3f}s em {args.repeticoes} execuções "
+          f"(orçamento {args.orcamento:.3f}s)")
+
+    falhou = False
+    if pesados:
+        print(f"FALHA: módulos pesados importados na partida: {', '.join(pesados)}")
+        falhou = True
+    if mediana > args.orcamento:
+        print("FALHA: partida acima do orçamento. Maiores importações de topo:")
+        for segundos, nome in maiores_importacoes():
+            print(f"  {segundos:7.3f}s  {nome}")
+        falhou = True
+
+    if not falhou:
+        print("OK")
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Gera um banco com dados sintéticos de produção, insumos e custos.
+
+Preenche as tabelas do app.py com vários anos de registros diários para as 60
+áreas (AREAS_PRODUCAO) e as culturas de DADOS_AGRONOMICOS: cada área planta uma
+cultura por semestre, o clima segue a sazonalidade do Paraná e a colheita
+acompanha a produção esperada da cultura. Bancos grandes têm vários registros
+por área e dia (colheitas/lotes diferentes).
+
+Uso:
+    python gerar_dados_sinteticos.py --linhas 100000 --banco sintetico.db [--anos 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import app
+
+ANOS_PADRAO = 5
+SEMENTE_PADRAO = 42
+TAMANHO_LOTE = 50_000
+
+# Proporção de registros de insumos e de custos em relação aos de produção
+PROPORCAO_INSUMOS = 0.5
+PROPORCAO_CUSTOS = 0.1
+
+UNIDADE_POR_TIPO = {
+    "Adubo Orgânico": "kg", "Adubo Químico": "kg", "Defensivo Agrícola": "L",
+    "Semente": "pacote", "Muda": "unidade", "Fertilizante Foliar": "L",
+    "Corretivo de Solo": "saco", "Insumo para Irrigação": "unidade", "Outros": "unidade"
+}
+FORNECEDORES = ["Agro Norte", "Casa do Produtor", "Coop. Londrina", "Sementes Paraná", "Irriga Sul"]
+TIPOS_CUSTOS = {
+    "Mão de obra": 180.0, "Energia": 95.0, "Manutenção": 140.0,
+    "Frete": 220.0, "Embalagens": 60.0, "Combustível": 110.0
+}
+
+
+def _calendario(rng, linhas, anos):
+    """Sorteia datas (em dias desde o início) e áreas, em ordem cronológica"""
+    inicio = date(date.today().year - anos, 1, 1)
+    dias = rng.integers(0, anos * 365, size=linhas)
+    dias.sort()
+    areas = rng.integers(0, len(app.AREAS_PRODUCAO), size=linhas)
+    return inicio, dias, areas
+
+
+def _culturas_plantadas(rng, anos):
+    """Cultura de cada área em cada semestre (matriz área x semestre)"""
+    culturas = np.array(list(app.DADOS_AGRONOMICOS))
+    return culturas[rng.integers(0, len(culturas), size=(len(app.AREAS_PRODUCAO), anos * 2 + 1))]
+
+
+def _datas_texto(inicio, dias):
+    """Converte os deslocamentos em dias para o texto AAAA-MM-DD gravado no banco"""
+    return (pd.Timestamp(inicio) + pd.to_timedelta(dias, unit="D")).strftime("%Y-%m-%d")
+
+
+def gerar_producao(rng, linhas, anos, plantio):
+    """Registros de colheita com clima do dia"""
+    inicio, dias, areas = _calendario(rng, linhas, anos)
+    culturas = plantio[areas, dias // 183]
+
+    # Verão (janeiro) quente e úmido, inverno (julho) frio e seco
+    fase = np.cos(2 * np.pi * (dias % 365 - 15) / 365)
+    temperatura = 21 + 6 * fase + rng.normal(0, 2.5, linhas)
+    umidade = np.clip(68 + 8 * fase - 0.6 * (temperatura - 21) + rng.normal(0, 8, linhas), 30, 100)
+    chuva = np.where(rng.random(linhas) < 0.3 + 0.15 * fase, rng.exponential(12, linhas), 0.0)
+
+    esperada = pd.Series({c: d["producao_esperada"] for c, d in app.DADOS_AGRONOMICOS.items()})
+    media = esperada.reindex(culturas).to_numpy() * 4 * (1 + 0.25 * fase)
+    media = np.where(areas < len(app.ESTUFAS), media * 1.3, media)
+    caixas = rng.poisson(media)
+    caixas_segunda = rng.binomial(caixas, rng.uniform(0.1, 0.3, linhas))
+
+    return pd.DataFrame({
+        "data": _datas_texto(inicio, dias),
+        "area": np.array(app.AREAS_PRODUCAO)[areas],
+        "cultura": culturas,
+        "caixas": caixas - caixas_segunda,
+        "caixas_segunda": caixas_segunda,
+        "temperatura": temperatura.round(1),
+        "umidade": umidade.round(1),
+        "chuva": chuva.round(1),
+        "observacao": np.where(rng.random(linhas) < 0.05, "Colheita com atraso", "")
+    })
+
+
+def gerar_insumos(rng, linhas, anos, plantio):
+    """Aplicações e compras de insumos por área"""
+    inicio, dias, areas = _calendario(rng, linhas, anos)
+    tipos = np.array(app.TIPOS_INSUMOS)[rng.integers(0, len(app.TIPOS_INSUMOS), size=linhas)]
+
+    custo_medio = app.carregar_config().get("custo_medio_insumos", {})
+    custo_base = pd.Series(tipos).map(custo_medio).fillna(10.0).to_numpy()
+    custo_unitario = (custo_base * rng.lognormal(0, 0.15, linhas)).round(2)
+    quantidade = rng.gamma(2.0, 15.0, linhas).round(1)
+
+    return pd.DataFrame({
+        "data": _datas_texto(inicio, dias),
+        "area": np.array(app.AREAS_PRODUCAO)[areas],
+        "cultura": plantio[areas, dias // 183],
+        "tipo": tipos,
+        "quantidade": quantidade,
+        "unidade": pd.Series(tipos).map(UNIDADE_POR_TIPO).to_numpy(),
+        "custo_unitario": custo_unitario,
+        "custo_total": (quantidade * custo_unitario).round(2),
+        "fornecedor": np.array(FORNECEDORES)[rng.integers(0, len(FORNECEDORES), size=linhas)],
+        "lote": [f"L{n:07d}" for n in rng.integers(0, 10_000_000, size=linhas)],
+        "observacoes": ""
+    })
+
+
+def gerar_custos(rng, linhas, anos):
+    """Custos gerais (mão de obra, energia...) por área"""
+    inicio, dias, areas = _calendario(rng, linhas, anos)
+    tipos = np.array(list(TIPOS_CUSTOS))[rng.integers(0, len(TIPOS_CUSTOS), size=linhas)]
+    valor = pd.Series(tipos).map(TIPOS_CUSTOS).to_numpy() * rng.lognormal(0, 0.3, linhas)
+
+    return pd.DataFrame({
+        "data": _datas_texto(inicio, dias),
+        "tipo": tipos,
+        "descricao": np.char.add(tipos.astype(str), " - lançamento"),
+        "valor": valor.round(2),
+        "area": np.array(app.AREAS_PRODUCAO)[areas],
+        "observacoes": ""
+    })
+
+
+def _inserir_em_lotes(nome_tabela, df):
+    """Grava pelo caminho normal do app (gatilhos dos resumos e versões incluídos)"""
+    for inicio in range(0, len(df), TAMANHO_LOTE):
+        app.inserir_tabela(nome_tabela, df.iloc[inicio:inicio + TAMANHO_LOTE])
+
+
+def gerar_dados(linhas, anos=ANOS_PADRAO, semente=SEMENTE_PADRAO):
+    """Preenche producao (linhas), insumos e custos no banco atual do app"""
+    rng = np.random.default_rng(semente)
+    plantio = _culturas_plantadas(rng, anos)
+
+    app.criar_tabelas()
+    _inserir_em_lotes("producao", gerar_producao(rng, linhas, anos, plantio))
+    _inserir_em_lotes("insumos", gerar_insumos(rng, int(linhas * PROPORCAO_INSUMOS), anos, plantio))
+    _inserir_em_lotes("custos", gerar_custos(rng, int(linhas * PROPORCAO_CUSTOS), anos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um banco com dados sintéticos")
+    parser.add_argument("--linhas", type=int, required=True, help="registros de produção")
+    parser.add_argument("--banco", required=True, help="arquivo SQLite a criar")
+    parser.add_argument("--anos", type=int, default=ANOS_PADRAO)
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--substituir", action="store_true", help="apaga o banco se já existir")
+    args = parser.parse_args()
+
+    if os.path.exists(args.banco):
+        if not args.substituir:
+            print(f"{args.banco} já existe (use --substituir para recriar)")
+            return 1
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(args.banco + sufixo):
+                os.remove(args.banco + sufixo)
+
+    app.usar_banco(os.path.abspath(args.banco))
+    inicio = time.perf_counter()
+    gerar_dados(args.linhas, args.anos, args.semente)
+    print(f"{args.banco}: {args.linhas} registros de produção gerados em {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
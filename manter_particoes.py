@@ -0,0 +1,69 @@
+"""Manutenção das partições anuais de produção e insumos.
+
+Cada safra (ano) de producao e insumos fica em uma tabela própria; este script
+lista as partições, compacta uma safra depois de muitas exclusões ou move safras
+antigas para um arquivo SQLite separado (e as traz de volta), sem tocar nas demais.
+
+Uso:
+    python manter_particoes.py listar [--banco dados_sitio.db]
+    python manter_particoes.py compactar 2021 [--tabela producao]
+    python manter_particoes.py arquivar 2019 [--destino arquivo_2019.db]
+    python manter_particoes.py restaurar 2019 [--origem arquivo_2019.db]
+"""
+import argparse
+import os
+import sys
+import time
+
+import app
+
+
+def _arquivo_padrao(ano):
+    """Arquivo de uma safra arquivada, ao lado do banco principal"""
+    return os.path.join(os.path.dirname(os.path.abspath(app.DB_NAME)), f"arquivo_{ano}.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das partições anuais do banco")
+    parser.add_argument("acao", choices=["listar", "compactar", "arquivar", "restaurar"])
+    parser.add_argument("ano", nargs="?", help="safra (AAAA); obrigatório exceto em listar")
+    parser.add_argument("--banco", default=app.DB_NAME)
+    parser.add_argument("--tabela", action="append", choices=list(app.ESQUEMA_PARTICOES),
+                        help="tabela a tratar (padrão: producao e insumos)")
+    parser.add_argument("--destino", help="arquivo da safra arquivada (padrão: arquivo_AAAA.db)")
+    parser.add_argument("--origem", help="arquivo de onde restaurar (padrão: arquivo_AAAA.db)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.banco):
+        print(f"Banco {args.banco} não encontrado")
+        return 1
+    if args.acao != "listar" and not (args.ano and args.ano.isdigit() and len(args.ano) == 4):
+        parser.error(f"informe o ano (AAAA) para {args.acao}")
+
+    app.usar_banco(args.banco)
+    app.garantir_tabelas()
+
+    if args.acao == "listar":
+        print(app.resumo_particoes().to_string(index=False))
+        return 0
+
+    tabelas = args.tabela or list(app.ESQUEMA_PARTICOES)
+    arquivo = args.destino or args.origem or _arquivo_padrao(args.ano)
+    for nome_tabela in tabelas:
+        inicio = time.perf_counter()
+        try:
+            if args.acao == "compactar":
+                app.compactar_particao(nome_tabela, args.ano)
+            elif args.acao == "arquivar":
+                app.arquivar_particao(nome_tabela, args.ano, arquivo)
+            else:
+                app.restaurar_particao(nome_tabela, args.ano, arquivo)
+        except ValueError as e:
+            print(f"{nome_tabela}: {e}")
+            continue
+        print(f"{nome_tabela}_{args.ano}: {args.acao} em {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Roda as análises do dashboard e da página de análise fora do Streamlit.
+
+Usa o mesmo caminho das páginas (app.analisar_dashboard / app.analisar_periodo,
+com os cálculos de analise.py) e grava os KPIs em JSON e cada tabela em CSV,
+para precálculo noturno. Com --perfil, mostra onde o tempo foi gasto.
+
+Uso:
+    python precalcular.py [--banco dados_sitio.db] [--inicio 2024-01-01] [--fim 2024-12-31]
+                          [--area "Estufa 1" ...] [--cultura Tomate ...] [--tipo Semente ...]
+                          [--saida precalculado] [--perfil]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+import app
+
+
+def _salvar_resultado(diretorio, prefixo, resultado):
+    """KPIs e listas no JSON; cada DataFrame/Series vira um CSV"""
+    os.makedirs(diretorio, exist_ok=True)
+    resumo = {}
+    for nome, valor in resultado.items():
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            valor.to_csv(os.path.join(diretorio, f"{prefixo}_{nome}.csv"), index=isinstance(valor, pd.Series))
+        elif isinstance(valor, dict) and nome == 'receitas':
+            resumo[nome] = {k: v for k, v in valor.items() if not isinstance(v, pd.DataFrame)}
+        else:
+            resumo[nome] = valor
+    with open(os.path.join(diretorio, f"{prefixo}.json"), "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=4, default=str)
+
+
+def _mostrar_perfil(medicoes):
+    """Tempo por chamada medida, da mais lenta para a mais rápida"""
+    df = pd.DataFrame(medicoes, columns=["categoria", "nome", "segundos"])
+    detalhe = df.groupby(["categoria", "nome"])["segundos"].agg(chamadas="count", total_ms="sum")
+    detalhe["total_ms"] = (detalhe["total_ms"] * 1000).round(1)
+    print(detalhe.sort_values("total_ms", ascending=False).to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula as análises do app sem o Streamlit")
+    parser.add_argument("--banco", default=app.DB_NAME)
+    parser.add_argument("--inicio", type=date.fromisoformat)
+    parser.add_argument("--fim", type=date.fromisoformat)
+    parser.add_argument("--area", action="append", default=[])
+    parser.add_argument("--cultura", action="append", default=[])
+    parser.add_argument("--tipo", action="append", default=[])
+    parser.add_argument("--saida", default="precalculado")
+    parser.add_argument("--perfil", action="store_true", help="mostra o tempo de cada etapa")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.banco):
+        print(f"Banco {args.banco} não encontrado")
+        return 1
+
+    app.usar_banco(args.banco)
+    app.garantir_tabelas()
+    # Mesmo estado global que o main() monta a cada rerun
+    app.config = app.carregar_config()
+    app.fenologia_especies = app.carregar_fenologia_especies()
+    app.precos_culturas = app.carregar_precos_culturas()
+
+    if args.perfil:
+        app.iniciar_perfil()
+    inicio = time.perf_counter()
+
+    with app.medir("analise", "analisar_dashboard"):
+        dashboard = app.analisar_dashboard()
+    with app.medir("analise", "analisar_periodo"):
+        periodo = app.analisar_periodo(args.inicio, args.fim, areas=args.area,
+                                       culturas=args.cultura, tipos=args.tipo)
+    periodo.pop('producao')
+    periodo.pop('insumos')
+
+    _salvar_resultado(args.saida, "dashboard", dashboard)
+    _salvar_resultado(args.saida, "analise", periodo)
+
+    print(f"Análises gravadas em {args.saida}/ em {time.perf_counter() - inicio:.2f}s")
+    if args.perfil:
+        _mostrar_perfil(app.encerrar_perfil())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
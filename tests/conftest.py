@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """App apontado para um banco novo e vazio, com a configuração padrão"""
+    monkeypatch.setattr(app, "CONFIG_FILE", str(tmp_path / "config.json"))
+    app.usar_banco(str(tmp_path / "dados_sitio.db"))
+    app.garantir_tabelas()
+    monkeypatch.setattr(app, "config", app.carregar_config(), raising=False)
+    monkeypatch.setattr(app, "precos_culturas", app.carregar_precos_culturas(), raising=False)
+    yield app
+    app.limpar_cache_leituras()
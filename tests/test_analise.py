@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analise
+
+PRECOS = {"Tomate": {"preco_primeira": 40.0, "preco_segunda": 20.0}}
+
+
+@pytest.fixture
+def producao():
+    return pd.DataFrame({
+        "data": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-03", "2024-02-10", "2024-02-11"]),
+        "area": pd.Categorical(["Estufa 1", "Estufa 1", "Campo 1", "Campo 1", "Estufa 1"],
+                               categories=["Campo 1", "Campo 2", "Estufa 1"]),
+        "cultura": pd.Categorical(["Tomate", "Tomate", "Alface", "Alface", ""],
+                                  categories=["", "Alface", "Pepino", "Tomate"]),
+        "caixas": [10, 20, 5, 7, 3],
+        "caixas_segunda": [2, 4, 1, 0, 1],
+    })
+
+
+@pytest.fixture
+def insumos():
+    return pd.DataFrame({
+        "data": pd.to_datetime(["2024-01-02", "2024-02-01"]),
+        "area": pd.Categorical(["Estufa 1", "Campo 1"]),
+        "cultura": pd.Categorical(["Tomate", "Alface"]),
+        "custo_total": [300.0, 50.0],
+    })
+
+
+def test_receitas_usa_preco_da_cultura_e_o_padrao(producao):
+    resultado = analise.receitas(producao, PRECOS, padrao=(30.0, 15.0))
+
+    # Tomate: (10 + 20) * 40 + (2 + 4) * 20; Alface (sem preço): padrão; cultura em branco: sem receita
+    assert resultado["por_cultura"].loc["Tomate", "receita_total"] == 1320.0
+    assert resultado["por_cultura"].loc["Alface", "receita_total"] == 12 * 30.0 + 1 * 15.0
+    assert "" not in resultado["por_cultura"].index
+    assert resultado["total"] == 1320.0 + 375.0
+
+
+def test_rentabilidade_por_area_e_cultura_so_com_grupos_observados(producao, insumos):
+    df = analise.rentabilidade(producao, insumos, PRECOS, padrao=(30.0, 15.0), chaves=["area", "cultura"])
+
+    assert sorted(zip(df["area"], df["cultura"])) == [("Campo 1", "Alface"), ("Estufa 1", "Tomate")]
+    tomate = df[df["cultura"] == "Tomate"].iloc[0]
+    assert tomate["custo"] == 300.0
+    assert tomate["lucro"] == 1020.0
+    assert tomate["roi"] == pytest.approx(340.0)
+
+
+def test_kpis_dos_totais():
+    resultado = analise.kpis_dos_totais(80.0, 20.0, 500.0, 1600.0, 300.0)
+
+    assert resultado["receita_total"] == 1900.0
+    assert resultado["lucro"] == 1400.0
+    assert resultado["margem_pct"] == pytest.approx(1400.0 / 1900.0 * 100)
+    assert analise.kpis_dos_totais(0.0, 0.0, 10.0, 0.0, 0.0)["margem_pct"] == 0.0
+
+
+def test_tendencia_mensal_soma_por_mes(producao):
+    df = analise.tendencia_mensal(producao, ["caixas"])
+
+    assert df["mes"].tolist() == ["2024-01", "2024-02"]
+    assert df["caixas"].tolist() == [30, 15]
+
+
+# ===============================
+# CORRELAÇÃO POR ESTATÍSTICAS SUFICIENTES
+# ===============================
+def _somas(df, defasados=None):
+    """Somas de analise.series_clima() feitas à mão: pares completos das linhas e, para cada
+    (variável, dias), os pares defasados recebidos (sem pares quando não vierem)"""
+    defasados = defasados or {}
+    totais = {}
+    for x, y, dias in analise.series_clima():
+        if dias:
+            pares = defasados.get((y, dias), pd.DataFrame({"x": [], "y": []}))
+        else:
+            pares = pd.DataFrame({"x": df[x], "y": df[y]})
+        pares = pares.dropna()
+        valores = {"n": len(pares), "sx": pares["x"].sum(), "sy": pares["y"].sum(),
+                   "sxx": (pares["x"] ** 2).sum(), "syy": (pares["y"] ** 2).sum(),
+                   "sxy": (pares["x"] * pares["y"]).sum()}
+        for estatistica in analise.ESTATISTICAS_PARES:
+            totais[analise.coluna_estatistica(estatistica, x, y, dias)] = float(valores[estatistica])
+    return totais
+
+
+@pytest.fixture
+def clima():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        "caixas": rng.integers(0, 50, 200).astype(float),
+        "temperatura": rng.normal(25, 4, 200),
+        "umidade": rng.normal(70, 10, 200),
+        "chuva": rng.exponential(2, 200),
+    })
+    df.loc[::7, "umidade"] = np.nan
+    df.loc[::11, "caixas"] = np.nan
+    return df
+
+
+def test_correlacao_das_somas_igual_ao_numpy():
+    x = np.array([1.0, 2.0, 4.0, 7.0, 11.0])
+    y = np.array([2.0, 1.0, 5.0, 6.0, 13.0])
+    r = analise.correlacao_das_somas(len(x), x.sum(), y.sum(), (x * x).sum(), (y * y).sum(), (x * y).sum())
+
+    assert r == pytest.approx(np.corrcoef(x, y)[0, 1])
+
+
+def test_correlacao_das_somas_sem_variancia_ou_poucos_pares_e_nan():
+    constante = np.full(4, 3.0)
+    y = np.array([1.0, 2.0, 3.0, 5.0])
+
+    assert np.isnan(analise.correlacao_das_somas(4, constante.sum(), y.sum(), (constante ** 2).sum(),
+                                                 (y ** 2).sum(), (constante * y).sum()))
+    assert np.isnan(analise.correlacao_das_somas(1, 2.0, 3.0, 4.0, 9.0, 6.0))
+
+
+def test_matriz_correlacao_igual_ao_corr_do_pandas(clima):
+    matriz = analise.matriz_correlacao(_somas(clima))
+
+    pd.testing.assert_frame_equal(matriz, clima[analise.COLUNAS_CLIMA].corr(), rtol=1e-9)
+
+
+def test_correlacao_defasada(clima):
+    # Umidade de 7 dias antes como a série deslocada; as demais defasagens ficam sem pares
+    pares = pd.DataFrame({"x": clima["caixas"].iloc[7:].to_numpy(), "y": clima["umidade"].iloc[:-7].to_numpy()})
+    df = analise.correlacao_defasada(_somas(clima, {("umidade", 7): pares}))
+
+    assert list(df.columns) == ["mesmo dia", "7 dias antes", "14 dias antes"]
+    assert list(df.index) == ["temperatura", "umidade", "chuva"]
+    assert df.loc["umidade", "mesmo dia"] == pytest.approx(clima["caixas"].corr(clima["umidade"]))
+    assert df.loc["umidade", "7 dias antes"] == pytest.approx(pares["x"].corr(pares["y"]))
+    assert df["14 dias antes"].isna().all()
+
+
+# ===============================
+# SÉRIES PARA GRÁFICOS
+# ===============================
+def test_indices_lttb_mantem_pontas_e_picos():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 25.0
+    indices = analise.indices_lttb(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert 437 in indices
+
+
+def test_indices_lttb_serie_curta_fica_inteira():
+    assert analise.indices_lttb(np.arange(5), np.arange(5), 10).tolist() == [0, 1, 2, 3, 4]
+    assert analise.indices_lttb(np.arange(5), np.arange(5), 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_reduzir_serie_respeita_o_limite():
+    df = pd.DataFrame({"data": pd.date_range("2024-01-01", periods=5000, freq="h"),
+                       "a": np.random.default_rng(1).normal(size=5000),
+                       "b": np.random.default_rng(2).normal(size=5000)})
+    reduzida = analise.reduzir_serie(df, "data", ["a", "b"], 500)
+
+    assert len(reduzida) <= 500
+    assert reduzida["data"].is_monotonic_increasing
+    assert reduzida.index[0] == 0 and reduzida.index[-1] == 4999
+    assert len(analise.reduzir_serie(df.head(100), "data", "a", 500)) == 100
@@ -0,0 +1,99 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import analise
+import app
+
+
+def _inserir(linhas):
+    with app.transacao() as conn:
+        app._inserir_lote(conn, "producao", pd.DataFrame(linhas))
+        app.incrementar_versao(conn, "producao")
+
+
+def _producao_aleatoria(n=400, semente=3):
+    rng = np.random.default_rng(semente)
+    datas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D")
+    df = pd.DataFrame({
+        "data": datas.strftime("%Y-%m-%d"),
+        "area": rng.choice(["Estufa 1", "Estufa 2", "Campo 1"], n),
+        "cultura": rng.choice(["Tomate", "Pepino"], n),
+        "caixas": rng.integers(0, 40, n).astype(float),
+        "caixas_segunda": rng.integers(0, 5, n).astype(float),
+        "temperatura": rng.normal(25, 4, n),
+        "umidade": rng.normal(70, 10, n),
+        "chuva": rng.exponential(2, n),
+    })
+    df.loc[::9, "umidade"] = np.nan
+    return df
+
+
+def test_ids_seguem_a_sequencia_entre_particoes(banco):
+    _inserir({"data": ["2023-12-31", "2024-01-01", None], "area": ["A"] * 3, "cultura": ["Tomate"] * 3})
+    _inserir({"data": ["2024-06-01"], "area": ["A"], "cultura": ["Tomate"]})
+
+    df = app.carregar_tabela("producao").sort_values("id")
+    assert df["id"].tolist() == [1, 2, 3, 4]
+    assert set(app.listar_particoes("producao")) >= {"2023", "2024", app.SEM_DATA}
+
+
+def test_paginas_incluem_linhas_sem_data(banco):
+    _inserir({"data": ["2024-01-01", None, "2024-01-03", None, "2024-01-02"],
+              "area": ["A"] * 5, "cultura": ["Tomate"] * 5})
+
+    for tamanho in (1, 2, 3):
+        vistos, cursor = [], None
+        while True:
+            pagina = app.carregar_pagina("producao", tamanho + 1, cursor)
+            tem_proxima = len(pagina) > tamanho
+            pagina = pagina.head(tamanho)
+            vistos += pagina["id"].tolist()
+            if not tem_proxima:
+                break
+            ultima = pagina["data"].iloc[-1]
+            cursor = (None if pd.isna(ultima) else ultima, int(pagina["id"].iloc[-1]))
+        assert vistos == [3, 5, 1, 4, 2]
+
+
+def test_ultimo_registro_sem_umidade_vem_como_nan(banco):
+    _inserir({"data": ["2024-05-01"], "area": ["A"], "cultura": ["Tomate"], "caixas": [3],
+              "temperatura": [None], "umidade": [None]})
+
+    registro = app.carregar_ultimo_registro("producao")
+    assert np.isnan(registro["umidade"]) and not registro["umidade"] > 85
+    assert app.gerar_recomendacoes_clima("Tomate", {"temperatura": registro["temperatura"],
+                                                    "umidade": registro["umidade"]}) == []
+
+
+def test_gatilhos_mantem_as_estatisticas_de_clima(banco):
+    _inserir(_producao_aleatoria())
+    ids = app.carregar_tabela("producao")["id"].sample(60, random_state=1).tolist()
+    app.excluir_linhas("producao", ids=ids)
+
+    consulta = "SELECT * FROM estatisticas_clima ORDER BY mes, area, cultura"
+    mantidas = pd.read_sql(consulta, app.obter_conexao())
+    app.reconstruir_resumos()
+    pd.testing.assert_frame_equal(mantidas, pd.read_sql(consulta, app.obter_conexao()),
+                                  check_dtype=False, rtol=1e-9, atol=1e-6)
+
+
+def test_correlacao_do_periodo_igual_as_linhas(banco):
+    _inserir(_producao_aleatoria())
+    df = app.carregar_tabela("producao")
+    df["dia"] = pd.to_datetime(df["data"])
+
+    # Período com meses inteiros e pontas parciais, filtrado por área
+    inicio, fim, areas = date(2024, 1, 10), date(2024, 3, 20), ["Estufa 1", "Campo 1"]
+    totais = app.carregar_estatisticas_clima(inicio, fim, areas=areas)
+    filtrado = df[(df["dia"] >= pd.Timestamp(inicio)) & (df["dia"] <= pd.Timestamp(fim)) & df["area"].isin(areas)]
+
+    pd.testing.assert_frame_equal(analise.matriz_correlacao(totais),
+                                  filtrado[analise.COLUNAS_CLIMA].corr(), rtol=1e-7)
+
+    # Defasagem: cada colheita com o clima da mesma área 7 dias antes
+    antes = df[["dia", "area", "umidade"]].assign(dia=df["dia"] + pd.Timedelta(days=7))
+    pares = filtrado[["dia", "area", "caixas"]].merge(antes, on=["dia", "area"]).dropna()
+    defasada = analise.correlacao_defasada(totais)
+    assert np.isclose(defasada.loc["umidade", "7 dias antes"], pares["caixas"].corr(pares["umidade"]))
@@ -0,0 +1,112 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+RESPOSTAS = {
+    "weather": {
+        "campinas": (200, {"main": {"temp": 24.5, "humidity": 70}, "rain": {"1h": 1.2}}),
+        "jundiai": (200, {"main": {"temp": 21.0, "humidity": 88}}),
+    },
+    "forecast": {
+        "campinas": (200, {"cod": "200", "list": [
+            {"dt_txt": "2024-05-01 12:00:00", "main": {"temp": 25.0, "temp_min": 22.0, "temp_max": 28.0, "humidity": 65}},
+            {"dt_txt": "2024-05-01 15:00:00", "main": {"temp": 27.0, "temp_min": 26.0, "temp_max": 30.0, "humidity": 60}},
+        ]}),
+        # Previsão fora do ar para esta cidade (404 não entra nas novas tentativas da sessão)
+        "jundiai": (404, {"cod": "404", "message": "city not found"}),
+    },
+}
+
+
+class _Stub(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        endpoint = url.path.rsplit("/", 1)[-1]
+        cidade = urllib.parse.parse_qs(url.query)["q"][0].lower()
+        self.server.chamadas.append((endpoint, cidade))
+        status, corpo = RESPOSTAS.get(endpoint, {}).get(cidade, (404, {"cod": "404"}))
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_clima(banco, monkeypatch):
+    """Servidor HTTP local no lugar da OpenWeatherMap, com o cache de clima vazio"""
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    servidor.chamadas = []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, "OPENWEATHER_URL", f"http://127.0.0.1:{servidor.server_address[1]}/data/2.5")
+    for estado in (app._cache_clima, app._clima_falhas, app._clima_sem_previsao):
+        estado.clear()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_buscar_clima_cidades_junta_atual_e_previsao(api_clima):
+    df = app.buscar_clima_cidades(["Campinas", "Jundiai", "Cidade Inexistente"])
+
+    assert list(df.columns) == app.COLUNAS_CLIMA_CIDADES
+    atual = df[df["Tipo"] == "Atual"].set_index("Cidade")
+    assert sorted(atual.index) == ["Campinas", "Jundiai"]
+    assert atual.loc["Campinas", "Temp Real (°C)"] == 24.5
+    assert atual.loc["Campinas", "Chuva (mm)"] == 1.2
+    assert atual.loc["Jundiai", "Umidade (%)"] == 88
+    assert atual.loc["Jundiai", "Chuva (mm)"] == 0.0
+
+    previsao = df[df["Tipo"] == "Previsão"]
+    assert previsao["Cidade"].tolist() == ["Campinas", "Campinas"]
+    assert previsao["Temp Média (°C)"].tolist() == [25.0, 28.0]
+
+
+def test_previsao_que_falhou_nao_fica_no_cache(api_clima):
+    app.buscar_clima_cidades(["Campinas", "Jundiai"])
+    api_clima.chamadas.clear()
+
+    # Campinas veio completa e é servida do cache; Jundiai fica com validade curta
+    app.buscar_clima_cidades(["Campinas", "Jundiai"])
+    assert api_clima.chamadas == []
+    assert app._clima_vencido("jundiai", app.time.time() - app.CLIMA_FALHA_ESPERA_S - 1)
+    assert not app._clima_vencido("campinas", app.time.time() - app.CLIMA_FALHA_ESPERA_S - 1)
+
+    # Nada da previsão que falhou vai para o banco
+    cidades = [linha[0] for linha in app.obter_conexao().execute("SELECT cidade FROM cache_clima")]
+    assert cidades == ["campinas"]
+
+
+def test_previsao_api_devolve_none_na_falha(api_clima, monkeypatch):
+    assert app._previsao_api("Jundiai") is None
+    assert len(app._previsao_api("Campinas")) == 2
+
+    monkeypatch.setattr(app, "OPENWEATHER_URL", "http://127.0.0.1:9/data/2.5")
+    monkeypatch.setattr(app, "CLIMA_TIMEOUT_S", 0.5)
+    assert app._previsao_api("Campinas") is None
+
+
+def test_falha_so_da_previsao_mantem_a_previsao_anterior(api_clima, monkeypatch):
+    _, previsao = app.buscar_clima("Campinas")
+    assert len(previsao) == 2
+
+    # Nova consulta com a previsão fora do ar: o atual é renovado e os alertas seguem com a anterior
+    monkeypatch.setitem(RESPOSTAS["forecast"], "campinas", (404, {"cod": "404"}))
+    monkeypatch.setitem(RESPOSTAS["weather"], "campinas", (200, {"main": {"temp": 30.0, "humidity": 50}}))
+    atual, previsao = app._atualizar_clima("Campinas")
+    assert atual["temp"] == 30.0
+    assert len(previsao) == 2
+
+    atual, previsao = app.buscar_clima("Campinas")
+    assert atual["temp"] == 30.0
+    assert previsao["Temp Média (°C)"].tolist() == [25.0, 28.0]
+    assert app._clima_vencido("campinas", app.time.time() - app.CLIMA_FALHA_ESPERA_S - 1)